@@ -0,0 +1,96 @@
+"""
+Circuit breakers for calls to a degraded dependency (SQS queues)
+"""
+
+import threading
+import time
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+class CircuitBreaker:
+    """
+    Classic three-state breaker.
+
+    CLOSED: calls flow; `failure_threshold` consecutive failures open it.
+    OPEN: calls are rejected until `reset_timeout` seconds have passed.
+    HALF_OPEN: a single probe call is allowed; success closes, failure reopens.
+    A probe that never reports back is abandoned after `reset_timeout`.
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0,
+                 clock=time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._clock = clock
+        self._state = CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._probe_started = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        """Current state, moving OPEN to HALF_OPEN once the timeout expires"""
+        with self._lock:
+            self._maybe_half_open()
+            return self._state
+
+    def _maybe_half_open(self):
+        now = self._clock()
+        if self._state == OPEN and now - self._opened_at >= self.reset_timeout:
+            self._state = HALF_OPEN
+            self._probe_in_flight = False
+        elif (self._state == HALF_OPEN and self._probe_in_flight
+              and now - self._probe_started >= self.reset_timeout):
+            self._probe_in_flight = False
+
+    def allow_request(self) -> bool:
+        """Whether a call may be attempted now"""
+        with self._lock:
+            self._maybe_half_open()
+            if self._state == CLOSED:
+                return True
+            if self._state == HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                self._probe_started = self._clock()
+                return True
+            return False
+
+    def record_success(self):
+        """Report a successful call"""
+        with self._lock:
+            self._state = CLOSED
+            self._failures = 0
+            self._probe_in_flight = False
+
+    def record_failure(self):
+        """Report a failed call"""
+        with self._lock:
+            self._failures += 1
+            if self._state == HALF_OPEN or self._failures >= self.failure_threshold:
+                self._state = OPEN
+                self._opened_at = self._clock()
+                self._probe_in_flight = False
+
+
+class CircuitBreakerMap:
+    """
+    One breaker per key (e.g. per SQS queue URL), created on first use,
+    so a failing dependency does not short-circuit healthy ones
+    """
+
+    def __init__(self, **breaker_kwargs):
+        self._breaker_kwargs = breaker_kwargs
+        self._breakers = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> CircuitBreaker:
+        breaker = self._breakers.get(key)
+        if breaker is None:
+            with self._lock:
+                breaker = self._breakers.setdefault(key, CircuitBreaker(**self._breaker_kwargs))
+        return breaker
@@ -6,14 +6,25 @@ Receives email data via REST API, validates token and data, then publishes to SQ
 import os
 import logging
 import json
+import math
+import hashlib
+import threading
+from contextlib import asynccontextmanager
 from typing import Optional
-from fastapi import FastAPI, HTTPException, Request
-from fastapi.responses import JSONResponse
+from fastapi import FastAPI, HTTPException, Request, Header
+from fastapi.responses import JSONResponse, PlainTextResponse
 from pydantic import BaseModel, Field, ValidationError
-import boto3
-from botocore.exceptions import ClientError
-from prometheus_client import Counter, Histogram, generate_latest, CONTENT_TYPE_LATEST
+from botocore.exceptions import ClientError, BotoCoreError
+from prometheus_client import (
+    Counter, Histogram, Gauge, CollectorRegistry, generate_latest, multiprocess, CONTENT_TYPE_LATEST
+)
 from starlette.responses import Response
+from starlette.concurrency import run_in_threadpool
+from app import transport, envelope, circuit_breaker, tracing, profiler
+from app.spool import Spool, claim_slot
+from app.ratelimit import TokenBucketLimiter
+from app.routing import LaneRouter, UnknownLaneError
+from app.fifo import fifo_parameters, is_fifo_queue
 
 # Configure logging
 logging.basicConfig(
@@ -22,11 +33,38 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Open pooled AWS connections before serving traffic"""
+    if SQS_QUEUE_URL:
+        await run_in_threadpool(
+            transport.prewarm,
+            sqs_client,
+            lambda c: c.get_queue_attributes(QueueUrl=SQS_QUEUE_URL, AttributeNames=['QueueArn'])
+        )
+    await run_in_threadpool(
+        transport.prewarm,
+        ssm_client,
+        lambda c: c.get_parameter(Name=SSM_TOKEN_PARAMETER, WithDecryption=True),
+        1
+    )
+    stop_replayer = start_spool_replayer()
+    stop_hot_keys = start_hot_key_refresher()
+    yield
+    if stop_replayer is not None:
+        stop_replayer.set()
+    if stop_hot_keys is not None:
+        stop_hot_keys.set()
+    if spool is not None:
+        spool.close()
+
+
 # Initialize FastAPI app
 app = FastAPI(
     title="Email API Service",
     description="REST API service for receiving and processing email data",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # Prometheus metrics
@@ -48,19 +86,158 @@ VALIDATION_ERROR_COUNT = Counter(
     ['error_type']
 )
 
-# AWS clients
-sqs_client = boto3.client('sqs', region_name=os.getenv('AWS_REGION', 'us-west-1'))
-ssm_client = boto3.client('ssm', region_name=os.getenv('AWS_REGION', 'us-west-1'))
+# Gauges declare how worker values combine when PROMETHEUS_MULTIPROC_DIR is set
+SQS_CIRCUIT_STATE = Gauge(
+    'api_sqs_circuit_state',
+    'SQS publish circuit breaker state per queue (0=closed, 1=open, 2=half_open)',
+    ['queue'],
+    multiprocess_mode='livemax'
+)
+
+SPOOLED_MESSAGES = Counter(
+    'api_spooled_messages_total',
+    'Total number of messages written to the local spool instead of SQS'
+)
+
+SPOOL_REPLAYED_MESSAGES = Counter(
+    'api_spool_replayed_messages_total',
+    'Total number of spooled messages replayed into SQS'
+)
+
+SPOOL_REJECTED_MESSAGES = Counter(
+    'api_spool_rejected_messages_total',
+    'Total number of spooled messages SQS rejected as invalid and set aside'
+)
+
+RATE_LIMITED_COUNT = Counter(
+    'api_rate_limited_total',
+    'Total number of requests rejected by rate limiting',
+    ['limit']
+)
+
+RATE_LIMIT_HOT_KEY_REJECTIONS = Gauge(
+    'api_rate_limit_hot_key_rejections',
+    'Rejections of the most rate-limited keys over the last refresh interval',
+    ['limit', 'key'],
+    multiprocess_mode='livesum'
+)
+
+LANE_PUBLISHED_COUNT = Counter(
+    'api_lane_messages_published_total',
+    'Total number of messages accepted per priority lane',
+    ['lane']
+)
+
+SPOOL_PENDING_BYTES = Gauge(
+    'api_spool_pending_bytes',
+    'Bytes in the local spool waiting to be replayed',
+    multiprocess_mode='livesum'
+)
+
+SPOOL_QUARANTINED_BYTES = Gauge(
+    'api_spool_quarantined_bytes',
+    'Bytes of unreadable (corrupt) spool data moved aside during replay',
+    multiprocess_mode='livesum'
+)
+
+# SQS calls sit on the request path: a brownout should reach the circuit
+# breaker (and the spool) quickly instead of stalling in botocore retries
+SQS_PUBLISH_MAX_ATTEMPTS = int(os.getenv('SQS_PUBLISH_MAX_ATTEMPTS', '2'))
+SQS_PUBLISH_READ_TIMEOUT = float(os.getenv('SQS_PUBLISH_READ_TIMEOUT', '2'))
+
+# AWS clients (shared, tuned transport); gunicorn imports the app in each
+# worker (preload_app = False), so every worker builds its own
+sqs_client = transport.get_client(
+    'sqs', max_attempts=SQS_PUBLISH_MAX_ATTEMPTS, read_timeout=SQS_PUBLISH_READ_TIMEOUT
+)
+ssm_client = transport.get_client('ssm')
 
 # Environment variables
 SQS_QUEUE_URL = os.getenv('SQS_QUEUE_URL')
 SSM_TOKEN_PARAMETER = os.getenv('SSM_TOKEN_PARAMETER', '/devops-exam/prod/api/token')
+# Priority lanes: extra queues as JSON [{"name": "<lane>", "queue_url": "<url>"}] (same
+# schema as the consumer's SQS_LANES); SQS_QUEUE_URL is the default lane
+SQS_LANES = os.getenv('SQS_LANES', '')
+SQS_DEFAULT_LANE = os.getenv('SQS_DEFAULT_LANE', 'default')
+# Routing rules as JSON [{"lane": "high", "sender": "<regex>", "subject": "<regex>"}]
+PRIORITY_RULES = os.getenv('PRIORITY_RULES', '')
+# FIFO queues (.fifo URLs): senders hashed onto this many message groups (0 = one group per sender)
+SQS_FIFO_PARTITIONS = int(os.getenv('SQS_FIFO_PARTITIONS', '0'))
+# Admin value for /debug routes; admin routes are disabled when unset
+SSM_ADMIN_TOKEN_PARAMETER = os.getenv('SSM_ADMIN_TOKEN_PARAMETER')
 AWS_REGION = os.getenv('AWS_REGION', 'us-west-1')
+# 'json' (legacy body) or 'envelope' (compact JSON, zlib for large bodies, see app/envelope.py)
+MESSAGE_FORMAT = os.getenv('MESSAGE_FORMAT', 'json')
+SQS_CIRCUIT_FAILURE_THRESHOLD = int(os.getenv('SQS_CIRCUIT_FAILURE_THRESHOLD', '5'))
+SQS_CIRCUIT_RESET_TIMEOUT = float(os.getenv('SQS_CIRCUIT_RESET_TIMEOUT', '30'))
+SPOOL_ENABLED = os.getenv('SPOOL_ENABLED', 'false').lower() == 'true'
+SPOOL_DIR = os.getenv('SPOOL_DIR', '/tmp/api-service-spool')
+SPOOL_SEGMENT_BYTES = int(os.getenv('SPOOL_SEGMENT_BYTES', str(16 * 1024 * 1024)))
+SPOOL_FSYNC_BATCH = int(os.getenv('SPOOL_FSYNC_BATCH', '64'))
+SPOOL_FSYNC_INTERVAL = float(os.getenv('SPOOL_FSYNC_INTERVAL', '0.05'))
+SPOOL_REPLAY_INTERVAL = float(os.getenv('SPOOL_REPLAY_INTERVAL', '1'))
+SPOOL_REPLAY_BATCH_SIZE = int(os.getenv('SPOOL_REPLAY_BATCH_SIZE', '10'))
+# SQS limit on the total payload of one send_message_batch call
+SQS_BATCH_MAX_BYTES = 256 * 1024
+# Token-bucket rate limits per auth value and per sender (rate 0 disables)
+RATE_LIMIT_TOKEN_RATE = float(os.getenv('RATE_LIMIT_TOKEN_RATE', '0'))
+RATE_LIMIT_TOKEN_BURST = float(os.getenv('RATE_LIMIT_TOKEN_BURST', '100'))
+RATE_LIMIT_SENDER_RATE = float(os.getenv('RATE_LIMIT_SENDER_RATE', '0'))
+RATE_LIMIT_SENDER_BURST = float(os.getenv('RATE_LIMIT_SENDER_BURST', '20'))
+RATE_LIMIT_MAX_KEYS = int(os.getenv('RATE_LIMIT_MAX_KEYS', '100000'))
+RATE_LIMIT_HOT_KEYS = int(os.getenv('RATE_LIMIT_HOT_KEYS', '10'))
+RATE_LIMIT_HOT_KEYS_INTERVAL = float(os.getenv('RATE_LIMIT_HOT_KEYS_INTERVAL', '15'))
+RATE_LIMIT_LOG_INTERVAL = float(os.getenv('RATE_LIMIT_LOG_INTERVAL', '10'))
+OTEL_EXPORT_ENABLED = os.getenv('OTEL_EXPORT_ENABLED', 'false').lower() == 'true'
+ENVELOPE_COMPRESS_MIN_BYTES = int(os.getenv('ENVELOPE_COMPRESS_MIN_BYTES', str(envelope.DEFAULT_COMPRESS_MIN_BYTES)))
 
 # Cache for SSM auth value (refresh every 5 minutes); no secrets in code
 _auth_cache = None
 _auth_cache_time = 0
 AUTH_CACHE_TTL = 300  # 5 minutes
+_admin_cache = None
+_admin_cache_time = 0
+
+# Circuit breaker per SQS queue; local spool used while a queue's circuit is open
+sqs_breakers = circuit_breaker.CircuitBreakerMap(
+    failure_threshold=SQS_CIRCUIT_FAILURE_THRESHOLD,
+    reset_timeout=SQS_CIRCUIT_RESET_TIMEOUT
+)
+spool = None
+
+# Optional OpenTelemetry export of request stage spans
+if OTEL_EXPORT_ENABLED:
+    _otel_hook = tracing.opentelemetry_exporter()
+    if _otel_hook is not None:
+        tracing.register_exporter(_otel_hook)
+
+# Lane router (None when no queue is configured)
+lane_router = LaneRouter.from_config(
+    SQS_QUEUE_URL, SQS_DEFAULT_LANE, SQS_LANES, PRIORITY_RULES
+) if (SQS_QUEUE_URL or SQS_LANES) else None
+
+# Rate limiters (None when disabled)
+token_limiter = TokenBucketLimiter(
+    RATE_LIMIT_TOKEN_RATE, RATE_LIMIT_TOKEN_BURST, RATE_LIMIT_MAX_KEYS
+) if RATE_LIMIT_TOKEN_RATE > 0 else None
+sender_limiter = TokenBucketLimiter(
+    RATE_LIMIT_SENDER_RATE, RATE_LIMIT_SENDER_BURST, RATE_LIMIT_MAX_KEYS
+) if RATE_LIMIT_SENDER_RATE > 0 else None
+_hot_key_series = set()
+# Rejection log throttling: last log time and rejections not logged since
+_rate_limit_log = {'last': float('-inf'), 'suppressed': 0}
+_rate_limit_log_lock = threading.Lock()
+
+_CIRCUIT_STATE_VALUES = {
+    circuit_breaker.CLOSED: 0,
+    circuit_breaker.OPEN: 1,
+    circuit_breaker.HALF_OPEN: 2
+}
+
+
+def export_circuit_state(queue_url: str, breaker: circuit_breaker.CircuitBreaker):
+    """Set the circuit state gauge for a queue (labelled by queue name)"""
+    SQS_CIRCUIT_STATE.labels(queue=queue_url.rsplit('/', 1)[-1]).set(_CIRCUIT_STATE_VALUES[breaker.state])
 
 
 class EmailData(BaseModel):
@@ -75,6 +252,15 @@ class EmailRequest(BaseModel):
     """Request model for email API"""
     data: EmailData
     token: str = Field(..., min_length=1, description="Auth value (must match SSM)")
+    priority: Optional[str] = Field(None, description="Priority lane (optional; rules/default otherwise)")
+
+
+def auth_cache_valid() -> bool:
+    """
+    Whether the cached auth value is fresh (no SSM call needed)
+    """
+    import time
+    return bool(_auth_cache) and (time.time() - _auth_cache_time) < AUTH_CACHE_TTL
 
 
 def get_token_from_ssm() -> Optional[str]:
@@ -119,6 +305,120 @@ def validate_token(token: str) -> bool:
         return False
 
 
+def validate_admin_token(token: Optional[str]) -> bool:
+    """
+    Validate an admin value against SSM_ADMIN_TOKEN_PARAMETER (cached like the API value)
+    """
+    global _admin_cache, _admin_cache_time
+    import time
+    
+    if not SSM_ADMIN_TOKEN_PARAMETER or not token:
+        return False
+    
+    current_time = time.time()
+    if not _admin_cache or (current_time - _admin_cache_time) >= AUTH_CACHE_TTL:
+        try:
+            response = ssm_client.get_parameter(
+                Name=SSM_ADMIN_TOKEN_PARAMETER,
+                WithDecryption=True
+            )
+        except ClientError as e:
+            logger.error(f"Error retrieving admin value from SSM: {e}")
+            return False
+        _admin_cache = response['Parameter']['Value']
+        _admin_cache_time = current_time
+    return token == _admin_cache
+
+
+def metric_label(value: str) -> str:
+    """Short SHA-256 prefix, so auth values and addresses never appear in metrics"""
+    return hashlib.sha256(value.encode('utf-8')).hexdigest()[:12]
+
+
+def refresh_hot_key_metrics():
+    """
+    Export the most rejected keys of each limiter since the last refresh as
+    gauges; keys that are no longer hot are removed
+    """
+    current = {}
+    for limit, limiter in (('token', token_limiter), ('sender', sender_limiter)):
+        if limiter is not None:
+            for key, rejections in limiter.hot_keys(RATE_LIMIT_HOT_KEYS):
+                current[(limit, key)] = rejections
+    for series in _hot_key_series - current.keys():
+        # Zero first: in multiprocess mode the value stays in this worker's file
+        RATE_LIMIT_HOT_KEY_REJECTIONS.labels(*series).set(0)
+        RATE_LIMIT_HOT_KEY_REJECTIONS.remove(*series)
+    for series, rejections in current.items():
+        RATE_LIMIT_HOT_KEY_REJECTIONS.labels(*series).set(rejections)
+    _hot_key_series.clear()
+    _hot_key_series.update(current.keys())
+
+
+def hot_key_metrics_loop(stop_event: threading.Event):
+    """Background loop refreshing the hot-key gauges every RATE_LIMIT_HOT_KEYS_INTERVAL"""
+    while not stop_event.wait(RATE_LIMIT_HOT_KEYS_INTERVAL):
+        try:
+            refresh_hot_key_metrics()
+        except Exception as e:
+            logger.error(f"Error refreshing hot key metrics: {e}")
+
+
+def start_hot_key_refresher() -> Optional[threading.Event]:
+    """
+    Start the hot-key refresher thread when a rate limit is enabled
+    Returns the event that stops it
+    """
+    if token_limiter is None and sender_limiter is None:
+        return None
+    stop_event = threading.Event()
+    threading.Thread(target=hot_key_metrics_loop, args=(stop_event,), name='hot-keys', daemon=True).start()
+    return stop_event
+
+
+def log_rate_limited(limit: str, label: str):
+    """
+    Log a rejection at most once per RATE_LIMIT_LOG_INTERVAL, so a flood
+    does not turn into a log flood; key labels are hashed like the metrics
+    """
+    import time
+    now = time.monotonic()
+    with _rate_limit_log_lock:
+        if now - _rate_limit_log['last'] < RATE_LIMIT_LOG_INTERVAL:
+            _rate_limit_log['suppressed'] += 1
+            return
+        suppressed = _rate_limit_log['suppressed']
+        _rate_limit_log['last'] = now
+        _rate_limit_log['suppressed'] = 0
+    logger.warning(f"Rate limit exceeded for {limit} {label} ({suppressed} more rejections not logged)")
+
+
+def check_rate_limits(token: str, sender: str) -> float:
+    """
+    Apply per-sender and per-token token buckets
+    The sender bucket is checked first and a rejected sender is not charged
+    to the token bucket, so one flooding sender cannot use up the budget of
+    every sender sharing its auth value.
+    Returns 0 if allowed, otherwise seconds until the request may be retried
+    """
+    if sender_limiter is not None:
+        sender_key = sender.strip().lower()
+        label = metric_label(sender_key)
+        wait = sender_limiter.acquire(sender_key, label=label)
+        if wait:
+            RATE_LIMITED_COUNT.labels(limit='sender').inc()
+            log_rate_limited('sender', label)
+            return wait
+    if token_limiter is not None:
+        label = metric_label(token)
+        wait = token_limiter.acquire(token, label=label)
+        if wait:
+            RATE_LIMITED_COUNT.labels(limit='token').inc()
+            log_rate_limited('token', label)
+            return wait
+    return 0.0
+
+
 def validate_email_data(data: EmailData) -> tuple[bool, Optional[str]]:
     """
     Validate that email data has all required fields
@@ -138,35 +438,233 @@ def validate_email_data(data: EmailData) -> tuple[bool, Optional[str]]:
     return True, None
 
 
-def publish_to_sqs(data: EmailData) -> bool:
+def build_message(data: EmailData) -> tuple[str, dict]:
     """
-    Publish email data to SQS queue
+    Serialize email data into an SQS body and message attributes
+    according to MESSAGE_FORMAT
     """
-    if not SQS_QUEUE_URL:
+    if MESSAGE_FORMAT == 'envelope':
+        return envelope.encode(data.model_dump(), compress_min_bytes=ENVELOPE_COMPRESS_MIN_BYTES)
+    
+    message_body = json.dumps(data.model_dump())
+    message_attributes = {
+        'email_sender': {
+            'StringValue': data.email_sender,
+            'DataType': 'String'
+        },
+        'email_subject': {
+            'StringValue': data.email_subject,
+            'DataType': 'String'
+        }
+    }
+    return message_body, message_attributes
+
+
+def publish_to_sqs(data: EmailData, queue_url: Optional[str] = None) -> bool:
+    """
+    Publish email data to SQS queue (the default queue unless a lane queue is given)
+    """
+    queue_url = queue_url or SQS_QUEUE_URL
+    if not queue_url:
         logger.error("SQS_QUEUE_URL not configured")
         return False
     
+    with tracing.span('serialization'):
+        message_body, message_attributes = build_message(data)
+        # Per-sender ordering on FIFO queues
+        fifo_params = fifo_parameters(queue_url, data.email_sender, data.model_dump(), SQS_FIFO_PARTITIONS)
+    
+    # Fail fast while this queue is degraded
+    sqs_breaker = sqs_breakers.get(queue_url)
+    if not sqs_breaker.allow_request():
+        return spool_or_fail(message_body, message_attributes, queue_url)
+    
     try:
-        message_body = json.dumps(data.model_dump())
-        response = sqs_client.send_message(
-            QueueUrl=SQS_QUEUE_URL,
-            MessageBody=message_body,
-            MessageAttributes={
-                'email_sender': {
-                    'StringValue': data.email_sender,
-                    'DataType': 'String'
-                },
-                'email_subject': {
-                    'StringValue': data.email_subject,
-                    'DataType': 'String'
-                }
-            }
-        )
+        with tracing.span('sqs_send'):
+            response = sqs_client.send_message(
+                QueueUrl=queue_url,
+                MessageBody=message_body,
+                MessageAttributes=message_attributes,
+                **fifo_params
+            )
+        sqs_breaker.record_success()
+        export_circuit_state(queue_url, sqs_breaker)
         logger.info(f"Message published to SQS: {response['MessageId']}")
         return True
-    except ClientError as e:
+    except (ClientError, BotoCoreError) as e:
+        sqs_breaker.record_failure()
+        export_circuit_state(queue_url, sqs_breaker)
         logger.error(f"Error publishing to SQS: {e}")
+        return spool_or_fail(message_body, message_attributes, queue_url)
+
+
+def spool_or_fail(message_body: str, message_attributes: dict, queue_url: str) -> bool:
+    """
+    Spool a message that could not be sent. FIFO queues are never spooled:
+    messages sent directly after the circuit closes would overtake the
+    spooled ones and break per-group ordering, so the client must retry.
+    """
+    if is_fifo_queue(queue_url):
+        logger.error(f"Not spooling message for FIFO queue {queue_url}")
+        return False
+    return spool_message(message_body, message_attributes, queue_url)
+
+
+def spool_message(message_body: str, message_attributes: dict, queue_url: Optional[str] = None) -> bool:
+    """
+    Append a message to the local spool for later replay into SQS
+    Returns False if spooling is disabled or fails
+    """
+    if spool is None:
+        return False
+    try:
+        with tracing.span('spool_write'):
+            spool.append({
+                'body': message_body,
+                'attributes': message_attributes,
+                'queue_url': queue_url or SQS_QUEUE_URL
+            })
+        SPOOLED_MESSAGES.inc()
+        return True
+    except OSError as e:
+        logger.error(f"Error writing message to spool: {e}")
+        return False
+
+
+def spooled_record_size(record: dict) -> int:
+    """SQS-billed size of a spooled record: body plus attribute names, types and values"""
+    size = len(record['body'].encode('utf-8'))
+    for name, value in record['attributes'].items():
+        size += len(name) + len(value['DataType']) + len(value.get('StringValue', '').encode('utf-8'))
+    return size
+
+
+# Errors meaning the request content is invalid: retrying the same records cannot
+# succeed, so they are set aside. Anything else (auth, missing queue, 5xx) keeps them.
+SQS_INVALID_REQUEST_CODES = {
+    'BatchRequestTooLong', 'InvalidMessageContents', 'MessageTooLong', 'InvalidParameterValue',
+    'InvalidAttributeName', 'InvalidAttributeValue', 'InvalidBatchEntryId', 'BatchEntryIdsNotDistinct',
+    'TooManyEntriesInBatchRequest', 'EmptyBatchRequest'
+}
+
+
+def is_invalid_request_error(error: ClientError) -> bool:
+    """Check whether SQS rejected the request content itself (see SQS_INVALID_REQUEST_CODES)"""
+    code = error.response.get('Error', {}).get('Code', '')
+    # Query-compatible codes may carry a prefix, e.g. AWS.SimpleQueueService.BatchRequestTooLong
+    return code.rsplit('.', 1)[-1] in SQS_INVALID_REQUEST_CODES
+
+
+def _send_spooled_entries(queue_url: str, records: list) -> bool:
+    sqs_breaker = sqs_breakers.get(queue_url)
+    if not sqs_breaker.allow_request():
+        # Keep spool order: stop replay until this queue recovers
+        return False
+    entries = [
+        {
+            'Id': str(i),
+            'MessageBody': record['body'],
+            'MessageAttributes': record['attributes']
+        }
+        for i, record in enumerate(records)
+    ]
+    try:
+        response = sqs_client.send_message_batch(QueueUrl=queue_url, Entries=entries)
+    except ClientError as e:
+        if not is_invalid_request_error(e):
+            sqs_breaker.record_failure()
+            logger.error(f"Error replaying spooled messages to SQS: {e}")
+            return False
+        # SQS answered: the queue is healthy, the request content is not
+        sqs_breaker.record_success()
+        if len(records) > 1:
+            # Isolate the invalid record(s) by sending one at a time
+            return all(_send_spooled_entries(queue_url, [record]) for record in records)
+        logger.error(f"SQS rejected a spooled message, setting it aside: {e}")
+        spool.set_aside(records, str(e))
+        SPOOL_REJECTED_MESSAGES.inc()
+        return True
+    except BotoCoreError as e:
+        sqs_breaker.record_failure()
+        logger.error(f"Error replaying spooled messages to SQS: {e}")
+        return False
+    finally:
+        export_circuit_state(queue_url, sqs_breaker)
+    
+    failed = response.get('Failed', [])
+    if any(not f.get('SenderFault') for f in failed):
+        # Server-side failures: the batch is retried; duplicates are harmless for the consumer
+        sqs_breaker.record_failure()
+        logger.error(f"{len(failed)} spooled messages failed in SQS, will retry")
         return False
+    sqs_breaker.record_success()
+    if failed:
+        rejected = [records[int(f['Id'])] for f in failed]
+        logger.error(f"SQS rejected {len(rejected)} spooled messages, setting them aside: {failed[0].get('Message')}")
+        spool.set_aside(rejected, failed[0].get('Message', 'rejected'))
+        SPOOL_REJECTED_MESSAGES.inc(len(rejected))
+    SPOOL_REPLAYED_MESSAGES.inc(len(records) - len(failed))
+    return True
+
+
+def send_spooled_batch(records: list) -> bool:
+    """
+    Send a batch of spooled records to SQS with send_message_batch
+    (one call per destination queue). Records SQS rejects as invalid are
+    set aside rather than retried, and do not count against the circuit.
+    """
+    by_queue = {}
+    for record in records:
+        by_queue.setdefault(record.get('queue_url') or SQS_QUEUE_URL, []).append(record)
+    
+    for queue_url, queue_records in by_queue.items():
+        if not _send_spooled_entries(queue_url, queue_records):
+            return False
+    return True
+
+
+def replay_spool_loop(stop_event: threading.Event):
+    """
+    Background loop draining the spool into SQS; replay stops at the first
+    record whose queue circuit is open
+    """
+    while not stop_event.wait(SPOOL_REPLAY_INTERVAL):
+        try:
+            pending = spool.pending_bytes()
+            SPOOL_PENDING_BYTES.set(pending)
+            SPOOL_QUARANTINED_BYTES.set(spool.quarantined_bytes())
+            if pending:
+                sent = spool.replay(
+                    send_spooled_batch,
+                    batch_size=SPOOL_REPLAY_BATCH_SIZE,
+                    max_batch_bytes=SQS_BATCH_MAX_BYTES,
+                    record_size=spooled_record_size
+                )
+                if sent:
+                    logger.info(f"Replayed {sent} spooled messages to SQS")
+                SPOOL_PENDING_BYTES.set(spool.pending_bytes())
+        except Exception as e:
+            logger.error(f"Error replaying spool: {e}")
+
+
+def start_spool_replayer() -> Optional[threading.Event]:
+    """
+    Open the spool and start its replayer thread when SPOOL_ENABLED
+    Returns the event that stops the replayer
+    """
+    global spool
+    if not SPOOL_ENABLED or not SQS_QUEUE_URL:
+        return None
+    spool = Spool(
+        claim_slot(SPOOL_DIR),
+        segment_bytes=SPOOL_SEGMENT_BYTES,
+        fsync_batch=SPOOL_FSYNC_BATCH,
+        fsync_interval=SPOOL_FSYNC_INTERVAL
+    )
+    stop_event = threading.Event()
+    threading.Thread(target=replay_spool_loop, args=(stop_event,), name='spool-replayer', daemon=True).start()
+    logger.info(f"Spool enabled at {spool.directory}")
+    return stop_event
 
 
 @app.middleware("http")
@@ -204,48 +702,104 @@ async def health_check():
 
 @app.get("/metrics")
 async def metrics():
-    """Prometheus metrics endpoint"""
+    """Prometheus metrics endpoint (aggregated across workers in multiprocess mode)"""
+    if os.getenv('PROMETHEUS_MULTIPROC_DIR'):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return Response(content=generate_latest(registry), media_type=CONTENT_TYPE_LATEST)
     return Response(content=generate_latest(), media_type=CONTENT_TYPE_LATEST)
 
 
+@app.get("/debug/profile")
+async def debug_profile(seconds: float = 10, x_admin_token: Optional[str] = Header(None)):
+    """
+    Admin-only: sample this worker's stacks for N seconds, return collapsed stacks
+    """
+    if not SSM_ADMIN_TOKEN_PARAMETER:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not validate_admin_token(x_admin_token):
+        raise HTTPException(status_code=403, detail="Invalid admin value")
+    
+    try:
+        # Sample from a worker thread so the event loop keeps serving (and is profiled)
+        output = await run_in_threadpool(profiler.profile, seconds)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except profiler.ProfilerBusy as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return PlainTextResponse(output)
+
+
 @app.post("/api/email")
 async def receive_email(request: EmailRequest):
     """
     Receive email data, validate token and data, then publish to SQS
     """
-    # Validate auth value (from SSM; no secrets in code)
-    if not validate_token(request.token):
-        VALIDATION_ERROR_COUNT.labels(error_type='invalid_token').inc()
-        logger.warning("Invalid auth value provided")
-        raise HTTPException(
-            status_code=401,
-            detail="Invalid authentication value"
-        )
+    with tracing.request_trace('POST /api/email'):
+        # Validate auth value (from SSM; no secrets in code)
+        # A cache miss calls SSM: keep the blocking call off the event loop
+        if auth_cache_valid():
+            with tracing.span('token_validation_cached'):
+                token_valid = validate_token(request.token)
+        else:
+            with tracing.span('token_validation_ssm'):
+                token_valid = await run_in_threadpool(validate_token, request.token)
+        if not token_valid:
+            VALIDATION_ERROR_COUNT.labels(error_type='invalid_token').inc()
+            logger.warning("Invalid auth value provided")
+            raise HTTPException(
+                status_code=401,
+                detail="Invalid authentication value"
+            )
     
-    # Validate email data
-    is_valid, error_message = validate_email_data(request.data)
-    if not is_valid:
-        VALIDATION_ERROR_COUNT.labels(error_type='invalid_data').inc()
-        logger.warning(f"Invalid email data: {error_message}")
-        raise HTTPException(
-            status_code=400,
-            detail=error_message
-        )
+        # Per-token / per-sender rate limits
+        with tracing.span('rate_limit'):
+            retry_after = check_rate_limits(request.token, request.data.email_sender)
+        if retry_after:
+            raise HTTPException(
+                status_code=429,
+                detail="Rate limit exceeded",
+                headers={'Retry-After': str(math.ceil(retry_after))}
+            )
     
-    # Publish to SQS
-    if not publish_to_sqs(request.data):
-        logger.error("Failed to publish message to SQS")
-        raise HTTPException(
-            status_code=500,
-            detail="Failed to process email data"
-        )
+        # Validate email data
+        with tracing.span('data_validation'):
+            is_valid, error_message = validate_email_data(request.data)
+        if not is_valid:
+            VALIDATION_ERROR_COUNT.labels(error_type='invalid_data').inc()
+            logger.warning(f"Invalid email data: {error_message}")
+            raise HTTPException(
+                status_code=400,
+                detail=error_message
+            )
     
-    logger.info(f"Email data processed successfully: {request.data.email_subject}")
-    return {
-        "status": "success",
-        "message": "Email data received and queued successfully",
-        "email_subject": request.data.email_subject
-    }
+        # Pick the priority lane
+        lane, queue_url = None, None
+        if lane_router is not None:
+            try:
+                lane, queue_url = lane_router.route(
+                    request.data.email_sender, request.data.email_subject, request.priority
+                )
+            except UnknownLaneError as e:
+                VALIDATION_ERROR_COUNT.labels(error_type='invalid_priority').inc()
+                raise HTTPException(status_code=400, detail=str(e))
+        
+        # Publish to SQS (blocking boto3 call and spool fsync: keep them off the event loop)
+        if not await run_in_threadpool(publish_to_sqs, request.data, queue_url):
+            logger.error("Failed to publish message to SQS")
+            raise HTTPException(
+                status_code=500,
+                detail="Failed to process email data"
+            )
+        if lane is not None:
+            LANE_PUBLISHED_COUNT.labels(lane=lane).inc()
+    
+        logger.info(f"Email data processed successfully: {request.data.email_subject}")
+        return {
+            "status": "success",
+            "message": "Email data received and queued successfully",
+            "email_subject": request.data.email_subject
+        }
 
 
 @app.exception_handler(ValidationError)
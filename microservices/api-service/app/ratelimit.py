@@ -0,0 +1,77 @@
+"""
+In-memory token-bucket rate limiting with a bounded, LRU-evicted key table
+"""
+
+import heapq
+import threading
+import time
+from collections import OrderedDict
+
+# Bucket entry layout (a plain list keeps entries small)
+_TOKENS, _UPDATED, _REJECTED, _LABEL = range(4)
+
+
+class TokenBucketLimiter:
+    """
+    Per-key token buckets refilled at `rate` tokens/second up to `burst`.
+
+    Keys are stored by hash, so memory is bounded by `max_keys` entries no
+    matter how long or numerous the keys are. The least recently used key
+    is evicted when the table is full; an evicted key simply starts again
+    with a full bucket. A label is only kept for keys that were rejected,
+    for hot-key reporting.
+    """
+
+    def __init__(self, rate: float, burst: float, max_keys: int = 100_000,
+                 clock=time.monotonic):
+        if rate <= 0 or burst < 1:
+            raise ValueError("TokenBucketLimiter requires rate > 0 and burst >= 1")
+        self.rate = rate
+        self.burst = float(burst)
+        self.max_keys = max_keys
+        self._clock = clock
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+    def acquire(self, key: str, label: str = None) -> float:
+        """
+        Take one token for key. Returns 0 if allowed, otherwise the
+        number of seconds until a token will be available.
+        """
+        slot = hash(key)
+        now = self._clock()
+        with self._lock:
+            entry = self._buckets.get(slot)
+            if entry is None:
+                entry = [self.burst, now, 0, None]
+                self._buckets[slot] = entry
+                if len(self._buckets) > self.max_keys:
+                    self._buckets.popitem(last=False)
+            else:
+                self._buckets.move_to_end(slot)
+                entry[_TOKENS] = min(self.burst, entry[_TOKENS] + (now - entry[_UPDATED]) * self.rate)
+                entry[_UPDATED] = now
+
+            if entry[_TOKENS] >= 1:
+                entry[_TOKENS] -= 1
+                return 0.0
+            entry[_REJECTED] += 1
+            entry[_LABEL] = label if label is not None else key
+            return (1 - entry[_TOKENS]) / self.rate
+
+    def hot_keys(self, n: int, reset: bool = True) -> list:
+        """
+        Top n (label, rejections) since the last reset, most rejected first
+        """
+        with self._lock:
+            rejected = [e for e in self._buckets.values() if e[_REJECTED]]
+            top = heapq.nlargest(n, rejected, key=lambda e: e[_REJECTED])
+            result = [(e[_LABEL], e[_REJECTED]) for e in top]
+            if reset:
+                for e in rejected:
+                    e[_REJECTED] = 0
+                    e[_LABEL] = None
+        return result
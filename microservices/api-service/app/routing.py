@@ -0,0 +1,80 @@
+"""
+Priority lane routing
+Chooses the SQS queue for a message from an explicit priority or sender/subject rules.
+FIFO message group / deduplication ids are in app.fifo.
+"""
+
+import json
+import re
+from typing import NamedTuple, Optional
+
+
+class Route(NamedTuple):
+    """Destination lane and queue for a message"""
+    lane: str
+    queue_url: str
+
+
+class RoutingRule(NamedTuple):
+    """Sends matching messages to a lane; unset patterns match anything"""
+    lane: str
+    sender: Optional[re.Pattern]
+    subject: Optional[re.Pattern]
+
+    def matches(self, sender: str, subject: str) -> bool:
+        return ((self.sender is None or self.sender.search(sender) is not None)
+                and (self.subject is None or self.subject.search(subject) is not None))
+
+
+class UnknownLaneError(ValueError):
+    """Raised when a message asks for a lane that is not configured"""
+
+
+class LaneRouter:
+    """
+    Maps messages to lanes. An explicit priority wins, then the first
+    matching rule, then the default lane.
+    """
+
+    def __init__(self, queues: dict, default_lane: str, rules: list = ()):
+        if default_lane not in queues:
+            raise ValueError(f"Default lane '{default_lane}' has no queue")
+        for rule in rules:
+            if rule.lane not in queues:
+                raise ValueError(f"Routing rule targets unknown lane '{rule.lane}'")
+        self.queues = dict(queues)
+        self.default_lane = default_lane
+        self.rules = list(rules)
+
+    @classmethod
+    def from_config(cls, default_queue_url: Optional[str], default_lane: str = 'default',
+                    lanes_json: str = '', rules_json: str = '') -> 'LaneRouter':
+        """
+        Build a router from env-style JSON (lanes use the consumer's SQS_LANES
+        schema; weight only matters to the consumer and is ignored here):
+        lanes_json: [{"name": "high", "queue_url": "<queue url>", "weight": 6}, ...]
+        rules_json: [{"lane": "high", "sender": "<regex>", "subject": "<regex>"}]
+        """
+        queues = {lane['name']: lane['queue_url'] for lane in (json.loads(lanes_json) if lanes_json else [])}
+        if default_queue_url and default_lane not in queues:
+            queues[default_lane] = default_queue_url
+        rules = [
+            RoutingRule(
+                lane=r['lane'],
+                sender=re.compile(r['sender'], re.IGNORECASE) if r.get('sender') else None,
+                subject=re.compile(r['subject'], re.IGNORECASE) if r.get('subject') else None
+            )
+            for r in (json.loads(rules_json) if rules_json else [])
+        ]
+        return cls(queues, default_lane, rules)
+
+    def route(self, sender: str, subject: str, priority: Optional[str] = None) -> Route:
+        """Pick the lane and queue for a message"""
+        if priority:
+            if priority not in self.queues:
+                raise UnknownLaneError(f"Unknown priority: {priority}")
+            return Route(priority, self.queues[priority])
+        for rule in self.rules:
+            if rule.matches(sender, subject):
+                return Route(rule.lane, self.queues[rule.lane])
+        return Route(self.default_lane, self.queues[self.default_lane])
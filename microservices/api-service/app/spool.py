@@ -0,0 +1,286 @@
+"""
+Durable local spool for messages that could not be published to SQS
+Append-only segment files with batched fsync; drained back to SQS by a replayer.
+"""
+
+import os
+import fcntl
+import json
+import logging
+import struct
+import threading
+import zlib
+from typing import Callable, Iterator
+
+logger = logging.getLogger(__name__)
+
+# Record framing: 4-byte length, 4-byte CRC32, JSON payload
+_HEADER = struct.Struct('>II')
+_SEGMENT_PREFIX = 'segment-'
+_SEGMENT_SUFFIX = '.log'
+_CHECKPOINT_SUFFIX = '.offset'
+# Records the destination refused outright, kept for inspection instead of retried
+REJECTED_FILE = 'rejected.jsonl'
+# Unreadable remainder of a segment (after a corrupt or torn record), kept for inspection
+_QUARANTINE_SUFFIX = '.corrupt'
+
+# Lock files held for the life of the process (see claim_slot)
+_slot_locks = []
+
+
+def claim_slot(base_dir: str, max_slots: int = 256) -> str:
+    """
+    Claim an exclusive spool directory under base_dir for this process.
+    Each server worker gets its own slot-N directory, held with a flock;
+    slots left by exited workers are reclaimed and drained by their successor.
+    """
+    os.makedirs(base_dir, exist_ok=True)
+    for i in range(max_slots):
+        slot_dir = os.path.join(base_dir, f"slot-{i}")
+        os.makedirs(slot_dir, exist_ok=True)
+        fd = os.open(os.path.join(slot_dir, '.lock'), os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            os.close(fd)
+            continue
+        _slot_locks.append(fd)
+        return slot_dir
+    raise RuntimeError(f"No free spool slot under {base_dir}")
+
+
+class Spool:
+    """
+    Append-only on-disk queue made of numbered segment files.
+
+    Appends are written immediately and fsynced once `fsync_batch` records
+    are pending or every `fsync_interval` seconds, whichever comes first.
+    A crash can lose at most that window. The active segment is rolled once
+    it reaches `segment_bytes`; replay drains sealed segments oldest first.
+    """
+
+    def __init__(self, directory: str, segment_bytes: int = 16 * 1024 * 1024,
+                 fsync_batch: int = 64, fsync_interval: float = 0.05):
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.fsync_batch = fsync_batch
+        self.fsync_interval = fsync_interval
+        os.makedirs(directory, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._replay_lock = threading.Lock()
+        self._active = None
+        self._active_path = None
+        self._active_size = 0
+        self._unsynced = 0
+        self._next_seq = max((self._segment_seq(p) for p in self._segment_paths()), default=0) + 1
+
+        self._stopped = threading.Event()
+        self._flusher = threading.Thread(target=self._flush_loop, name='spool-fsync', daemon=True)
+        self._flusher.start()
+
+    def _segment_paths(self) -> list:
+        names = [n for n in os.listdir(self.directory)
+                 if n.startswith(_SEGMENT_PREFIX) and n.endswith(_SEGMENT_SUFFIX)]
+        return [os.path.join(self.directory, n) for n in sorted(names)]
+
+    @staticmethod
+    def _segment_seq(path: str) -> int:
+        name = os.path.basename(path)
+        return int(name[len(_SEGMENT_PREFIX):-len(_SEGMENT_SUFFIX)])
+
+    def _sealed_segments(self) -> list:
+        with self._lock:
+            active = self._active_path
+        return [p for p in self._segment_paths() if p != active]
+
+    def pending_bytes(self) -> int:
+        """Bytes on disk not yet replayed (approximate)"""
+        total = 0
+        for path in self._segment_paths():
+            try:
+                total += os.path.getsize(path) - self._read_checkpoint(path)
+            except OSError:
+                pass
+        return total
+
+    def quarantined_bytes(self) -> int:
+        """Bytes of unreadable segment data moved aside by replay"""
+        total = 0
+        for name in os.listdir(self.directory):
+            if name.endswith(_QUARANTINE_SUFFIX):
+                try:
+                    total += os.path.getsize(os.path.join(self.directory, name))
+                except OSError:
+                    pass
+        return total
+
+    def has_pending(self) -> bool:
+        """Whether any spooled records are waiting for replay"""
+        return self.pending_bytes() > 0
+
+    def append(self, record: dict):
+        """Append one record (a JSON-serializable dict)"""
+        payload = json.dumps(record, separators=(',', ':')).encode('utf-8')
+        frame = _HEADER.pack(len(payload), zlib.crc32(payload)) + payload
+        with self._lock:
+            if self._active is None:
+                self._active_path = os.path.join(
+                    self.directory, f"{_SEGMENT_PREFIX}{self._next_seq:012d}{_SEGMENT_SUFFIX}"
+                )
+                self._next_seq += 1
+                self._active = open(self._active_path, 'ab')
+                self._active_size = 0
+            self._active.write(frame)
+            self._active.flush()
+            self._active_size += len(frame)
+            self._unsynced += 1
+            if self._unsynced >= self.fsync_batch:
+                self._fsync_locked()
+            if self._active_size >= self.segment_bytes:
+                self._roll_locked()
+
+    def _fsync_locked(self):
+        if self._active is not None and self._unsynced:
+            os.fsync(self._active.fileno())
+            self._unsynced = 0
+
+    def _roll_locked(self):
+        if self._active is None:
+            return
+        self._fsync_locked()
+        self._active.close()
+        self._active = None
+        self._active_path = None
+        self._active_size = 0
+
+    def roll(self):
+        """Seal the active segment so it can be replayed"""
+        with self._lock:
+            self._roll_locked()
+
+    def _flush_loop(self):
+        while not self._stopped.wait(self.fsync_interval):
+            with self._lock:
+                try:
+                    self._fsync_locked()
+                except OSError as e:
+                    logger.error(f"Error syncing spool segment: {e}")
+
+    def close(self):
+        """Stop the fsync thread and seal the active segment"""
+        self._stopped.set()
+        self._flusher.join(timeout=1)
+        self.roll()
+
+    def _read_checkpoint(self, path: str) -> int:
+        try:
+            with open(path + _CHECKPOINT_SUFFIX) as f:
+                return int(f.read().strip() or 0)
+        except (OSError, ValueError):
+            return 0
+
+    def _write_checkpoint(self, path: str, offset: int):
+        tmp = path + _CHECKPOINT_SUFFIX + '.tmp'
+        with open(tmp, 'w') as f:
+            f.write(str(offset))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path + _CHECKPOINT_SUFFIX)
+
+    def _remove_segment(self, path: str):
+        for p in (path, path + _CHECKPOINT_SUFFIX):
+            try:
+                os.remove(p)
+            except FileNotFoundError:
+                pass
+
+    def _quarantine(self, path: str, offset: int):
+        """Copy the unreadable rest of a segment (from offset) aside before it is removed"""
+        with open(path, 'rb') as src, open(path + _QUARANTINE_SUFFIX, 'wb') as dst:
+            src.seek(offset)
+            dst.write(src.read())
+            dst.flush()
+            os.fsync(dst.fileno())
+        logger.error(f"Quarantined unreadable spool data from {path} at offset {offset} "
+                     f"to {path + _QUARANTINE_SUFFIX}")
+
+    @staticmethod
+    def _iter_records(path: str, offset: int) -> Iterator[tuple]:
+        """Yield (record, end_offset); stops at a torn or corrupt record"""
+        with open(path, 'rb') as f:
+            f.seek(offset)
+            while True:
+                header = f.read(_HEADER.size)
+                if len(header) < _HEADER.size:
+                    if header:
+                        logger.warning(f"Truncated record header in spool segment {path}")
+                    return
+                length, crc = _HEADER.unpack(header)
+                payload = f.read(length)
+                if len(payload) < length or zlib.crc32(payload) != crc:
+                    logger.warning(f"Corrupt record in spool segment {path} at offset {offset}")
+                    return
+                offset += _HEADER.size + length
+                yield json.loads(payload), offset
+
+    def set_aside(self, records: list, reason: str):
+        """
+        Move records the destination rejected (they would fail on every
+        retry) to the rejected file, so replay can continue past them
+        """
+        with self._lock, open(os.path.join(self.directory, REJECTED_FILE), 'a') as f:
+            for record in records:
+                f.write(json.dumps({'reason': reason, 'record': record}, separators=(',', ':')) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+
+    def replay(self, send_batch: Callable[[list], bool], batch_size: int = 10,
+               max_batch_bytes: int = 0, record_size: Callable[[dict], int] = None) -> int:
+        """
+        Drain spooled records oldest first through send_batch(records) -> bool.
+        Batches hold at most batch_size records and, when max_batch_bytes is
+        set, at most that many bytes as measured by record_size(record).
+        Progress is checkpointed per batch; stops at the first failed batch.
+        A segment is removed once drained; if a corrupt record stops reading
+        before its end, the rest is quarantined (see quarantined_bytes) rather
+        than silently dropped. Delivery is at-least-once. Returns the number
+        of records sent.
+        """
+        sent = 0
+        with self._replay_lock:
+            self.roll()
+            for path in self._sealed_segments():
+                offset = self._read_checkpoint(path)
+                batch = []
+                batch_bytes = 0
+                batch_end = offset
+                read_end = offset
+                for record, end in self._iter_records(path, offset):
+                    read_end = end
+                    size = record_size(record) if max_batch_bytes and record_size else 0
+                    if batch and max_batch_bytes and batch_bytes + size > max_batch_bytes:
+                        if not send_batch(batch):
+                            return sent
+                        sent += len(batch)
+                        self._write_checkpoint(path, batch_end)
+                        batch = []
+                        batch_bytes = 0
+                    batch.append(record)
+                    batch_bytes += size
+                    batch_end = end
+                    if len(batch) >= batch_size:
+                        if not send_batch(batch):
+                            return sent
+                        sent += len(batch)
+                        self._write_checkpoint(path, batch_end)
+                        batch = []
+                        batch_bytes = 0
+                if batch:
+                    if not send_batch(batch):
+                        return sent
+                    sent += len(batch)
+                if read_end < os.path.getsize(path):
+                    self._quarantine(path, read_end)
+                self._remove_segment(path)
+        return sent
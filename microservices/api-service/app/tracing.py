@@ -0,0 +1,126 @@
+"""
+Lightweight per-stage span timing for request handling
+Spans feed a labelled Prometheus histogram, slow requests log a structured
+breakdown, and optional exporter hooks (e.g. OpenTelemetry) receive finished traces.
+"""
+
+import os
+import json
+import logging
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Optional
+from prometheus_client import Histogram
+
+logger = logging.getLogger(__name__)
+
+SLOW_REQUEST_THRESHOLD_MS = float(os.getenv('SLOW_REQUEST_THRESHOLD_MS', '500'))
+
+STAGE_DURATION = Histogram(
+    'api_request_stage_duration_seconds',
+    'Time spent in each stage of request handling',
+    ['stage'],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+)
+
+_current_trace: ContextVar = ContextVar('current_trace', default=None)
+
+# Exporter hooks: fn(trace: RequestTrace) called when a request trace finishes
+_exporters: list = []
+
+
+class RequestTrace:
+    """Spans recorded while handling one request"""
+    __slots__ = ('name', 'start_ns', 'end_ns', 'spans')
+
+    def __init__(self, name: str):
+        self.name = name
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+        self.spans = []  # (stage, start_ns, duration_seconds)
+
+    @property
+    def duration(self) -> float:
+        """Total trace duration in seconds"""
+        end_ns = self.end_ns if self.end_ns is not None else time.time_ns()
+        return (end_ns - self.start_ns) / 1e9
+
+    def breakdown(self) -> dict:
+        """Structured per-stage breakdown in milliseconds"""
+        return {
+            'request': self.name,
+            'total_ms': round(self.duration * 1000, 3),
+            'stages': [
+                {'stage': stage, 'ms': round(seconds * 1000, 3)}
+                for stage, _, seconds in self.spans
+            ]
+        }
+
+
+def register_exporter(hook: Callable[[RequestTrace], None]):
+    """Register a hook receiving every finished request trace"""
+    _exporters.append(hook)
+
+
+@contextmanager
+def span(stage: str):
+    """
+    Time a stage; recorded in the histogram and the current request trace
+    """
+    start_ns = time.time_ns()
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - start
+        STAGE_DURATION.labels(stage=stage).observe(seconds)
+        trace = _current_trace.get()
+        if trace is not None:
+            trace.spans.append((stage, start_ns, seconds))
+
+
+@contextmanager
+def request_trace(name: str, slow_threshold_ms: Optional[float] = None):
+    """
+    Collect spans for one request; log a breakdown if it is slow
+    """
+    trace = RequestTrace(name)
+    token = _current_trace.set(trace)
+    try:
+        yield trace
+    finally:
+        _current_trace.reset(token)
+        trace.end_ns = time.time_ns()
+        threshold = SLOW_REQUEST_THRESHOLD_MS if slow_threshold_ms is None else slow_threshold_ms
+        if trace.duration * 1000 >= threshold:
+            logger.warning(f"Slow request: {json.dumps(trace.breakdown())}")
+        for hook in _exporters:
+            try:
+                hook(trace)
+            except Exception as e:
+                logger.error(f"Trace exporter failed: {e}")
+
+
+def opentelemetry_exporter() -> Optional[Callable[[RequestTrace], None]]:
+    """
+    Build a hook replaying traces as OpenTelemetry spans, or None if the
+    opentelemetry API is not installed (it is an optional dependency)
+    """
+    try:
+        from opentelemetry import trace as otel_trace
+    except ImportError:
+        logger.warning("opentelemetry-api not installed; OpenTelemetry export disabled")
+        return None
+
+    tracer = otel_trace.get_tracer('api-service')
+
+    def export(trace: RequestTrace):
+        parent = tracer.start_span(trace.name, start_time=trace.start_ns)
+        context = otel_trace.set_span_in_context(parent)
+        for stage, start_ns, seconds in trace.spans:
+            child = tracer.start_span(stage, context=context, start_time=start_ns)
+            child.end(end_time=start_ns + int(seconds * 1e9))
+        parent.end(end_time=trace.end_ns)
+
+    return export
@@ -0,0 +1,57 @@
+"""
+Worker count derivation for multi-process serving
+Respects the container CPU quota (cgroup v2/v1) rather than the host CPU count.
+"""
+
+import math
+import os
+
+
+def _cgroup_cpu_quota():
+    """
+    CPU quota in cores from cgroup limits, or None if unlimited/unknown
+    """
+    try:
+        # cgroup v2: "<quota> <period>" or "max <period>"
+        with open('/sys/fs/cgroup/cpu.max') as f:
+            quota, period = f.read().split()
+        if quota != 'max':
+            return int(quota) / int(period)
+        return None
+    except (OSError, ValueError):
+        pass
+    try:
+        # cgroup v1
+        with open('/sys/fs/cgroup/cpu/cpu.cfs_quota_us') as f:
+            quota = int(f.read())
+        with open('/sys/fs/cgroup/cpu/cpu.cfs_period_us') as f:
+            period = int(f.read())
+        if quota > 0 and period > 0:
+            return quota / period
+    except (OSError, ValueError):
+        pass
+    return None
+
+
+def available_cpus() -> int:
+    """
+    CPUs usable by this process: affinity mask capped by the cgroup quota
+    """
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cpus = os.cpu_count() or 1
+    quota = _cgroup_cpu_quota()
+    if quota is not None:
+        cpus = min(cpus, max(1, math.ceil(quota)))
+    return max(1, cpus)
+
+
+def worker_count() -> int:
+    """
+    Number of server workers: WEB_CONCURRENCY if set, else one per available CPU
+    """
+    configured = os.getenv('WEB_CONCURRENCY')
+    if configured:
+        return max(1, int(configured))
+    return available_cpus()
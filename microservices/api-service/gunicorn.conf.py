@@ -0,0 +1,32 @@
+"""
+Gunicorn configuration for multi-worker api-service
+Run with: gunicorn -c gunicorn.conf.py app.main:app
+"""
+
+import os
+import shutil
+from prometheus_client import multiprocess
+from app.workers import worker_count
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
+workers = worker_count()
+worker_class = 'uvicorn_worker.UvicornWorker'
+# Import the app in each worker so every worker builds its own AWS clients
+preload_app = False
+graceful_timeout = int(os.getenv('GRACEFUL_TIMEOUT', '30'))
+keepalive = int(os.getenv('KEEPALIVE', '5'))
+
+
+def on_starting(server):
+    """Start each deployment with an empty Prometheus multiprocess directory"""
+    multiproc_dir = os.getenv('PROMETHEUS_MULTIPROC_DIR')
+    if multiproc_dir:
+        shutil.rmtree(multiproc_dir, ignore_errors=True)
+        os.makedirs(multiproc_dir, exist_ok=True)
+    server.log.info(f"Starting api-service with {workers} workers")
+
+
+def child_exit(server, worker):
+    """Drop live gauges of a worker that exited"""
+    if os.getenv('PROMETHEUS_MULTIPROC_DIR'):
+        multiprocess.mark_process_dead(worker.pid)
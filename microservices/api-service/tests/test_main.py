@@ -145,6 +145,21 @@ class TestPublishToSQS:
         assert result is True
         mock_sqs.send_message.assert_called_once()
     
+    @patch('app.main.MESSAGE_FORMAT', 'envelope')
+    @patch('app.main.SQS_QUEUE_URL', 'https://sqs.us-west-1.amazonaws.com/123456789/test-queue')
+    @patch('app.main.sqs_client')
+    def test_publish_to_sqs_envelope(self, mock_sqs, valid_email_data):
+        """Test envelope format publishes a decodable body"""
+        from app import envelope
+        mock_sqs.send_message.return_value = {'MessageId': 'test-msg-id'}
+        
+        assert publish_to_sqs(EmailData(**valid_email_data)) is True
+        kwargs = mock_sqs.send_message.call_args.kwargs
+        assert set(kwargs['MessageAttributes']) == {envelope.CONTENT_TYPE_ATTRIBUTE}
+        assert envelope.decode_message(
+            {'Body': kwargs['MessageBody'], 'MessageAttributes': kwargs['MessageAttributes']}
+        ).data == valid_email_data
+    
     @patch('app.main.sqs_client')
     def test_publish_to_sqs_failure(self, mock_sqs, valid_email_data):
         """Test failed SQS publish"""
@@ -205,6 +220,32 @@ class TestEmailAPI:
         response = client.post("/api/email", json=valid_request)
         assert response.status_code == 400
     
+    @patch('app.main.validate_token', return_value=True)
+    @patch('app.main.sqs_client')
+    def test_concurrent_requests_do_not_serialize(self, mock_sqs, mock_validate_token, valid_request):
+        """Test blocking SQS calls run in the threadpool, not on the event loop"""
+        import asyncio
+        import time
+        import httpx
+        
+        def slow_send(**kwargs):
+            time.sleep(0.2)
+            return {'MessageId': 'test-msg-id'}
+        
+        mock_sqs.send_message.side_effect = slow_send
+        
+        async def post_all():
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url='http://test') as http:
+                return await asyncio.gather(*(http.post('/api/email', json=valid_request) for _ in range(10)))
+        
+        with patch('app.main.SQS_QUEUE_URL', 'https://sqs.us-west-1.amazonaws.com/123456789/test-queue'):
+            start = time.monotonic()
+            responses = asyncio.run(post_all())
+            elapsed = time.monotonic() - start
+        assert [r.status_code for r in responses] == [200] * 10
+        assert elapsed < 1.0  # 2s if the ten sends were serialized
+    
     def test_post_email_missing_fields(self):
         """Test email submission with missing request fields"""
         incomplete_request = {
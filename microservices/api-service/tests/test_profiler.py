@@ -0,0 +1,47 @@
+"""
+Unit tests for the /debug/profile route
+"""
+
+from unittest.mock import patch
+from fastapi.testclient import TestClient
+from app import profiler
+from app.main import app
+
+client = TestClient(app)
+
+
+class TestDebugProfile:
+    """Test admin-only profiling endpoint"""
+    
+    @patch('app.main.SSM_ADMIN_TOKEN_PARAMETER', None)
+    def test_disabled_without_admin_parameter(self):
+        """Test the route is hidden when no admin parameter is configured"""
+        response = client.get("/debug/profile?seconds=0.01")
+        assert response.status_code == 404
+    
+    @patch('app.main.SSM_ADMIN_TOKEN_PARAMETER', '/test/admin')
+    @patch('app.main.ssm_client')
+    def test_invalid_admin_value(self, mock_ssm):
+        """Test a wrong admin value is rejected"""
+        mock_ssm.get_parameter.return_value = {'Parameter': {'Value': 'mock-admin'}}
+        response = client.get("/debug/profile?seconds=0.01", headers={'X-Admin-Token': 'wrong'})
+        assert response.status_code == 403
+    
+    @patch('app.main.SSM_ADMIN_TOKEN_PARAMETER', '/test/admin')
+    @patch('app.main.validate_admin_token', return_value=True)
+    def test_profile_returns_collapsed_stacks(self, mock_validate):
+        """Test a valid request returns collapsed stack lines"""
+        response = client.get("/debug/profile?seconds=0.05", headers={'X-Admin-Token': 'mock-admin'})
+        assert response.status_code == 200
+        assert "text/plain" in response.headers["content-type"]
+        for line in response.text.splitlines():
+            assert line.rsplit(' ', 1)[1].isdigit()
+    
+    @patch('app.main.SSM_ADMIN_TOKEN_PARAMETER', '/test/admin')
+    @patch('app.main.validate_admin_token', return_value=True)
+    def test_profile_busy_and_bad_input(self, mock_validate):
+        """Test concurrent and out-of-range profiles are refused"""
+        headers = {'X-Admin-Token': 'mock-admin'}
+        assert client.get("/debug/profile?seconds=0", headers=headers).status_code == 400
+        with profiler._profile_lock:
+            assert client.get("/debug/profile?seconds=0.01", headers=headers).status_code == 409
@@ -0,0 +1,122 @@
+"""
+Unit tests for token-bucket rate limiting
+"""
+
+import pytest
+from unittest.mock import patch
+from fastapi.testclient import TestClient
+from prometheus_client import REGISTRY
+from app.ratelimit import TokenBucketLimiter
+from app.main import app, metric_label, refresh_hot_key_metrics
+
+client = TestClient(app)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def valid_request():
+    """Valid request payload"""
+    return {
+        "data": {
+            "email_subject": "Test Email",
+            "email_sender": "flood@example.com",
+            "email_timestamp": "1693561101",
+            "email_content": "This is a test email content"
+        },
+        "token": "mock-auth-value"
+    }
+
+
+class TestTokenBucketLimiter:
+    """Test bucket behaviour"""
+    
+    def test_burst_then_refill(self):
+        """Test burst is allowed, then requests wait for refill"""
+        clock = FakeClock()
+        limiter = TokenBucketLimiter(rate=2, burst=3, clock=clock)
+        assert [limiter.acquire('k') for _ in range(3)] == [0, 0, 0]
+        assert limiter.acquire('k') == pytest.approx(0.5)
+        clock.now = 0.5
+        assert limiter.acquire('k') == 0
+    
+    def test_keys_are_independent(self):
+        """Test one key's exhaustion does not affect another"""
+        limiter = TokenBucketLimiter(rate=1, burst=1, clock=FakeClock())
+        assert limiter.acquire('a') == 0
+        assert limiter.acquire('a') > 0
+        assert limiter.acquire('b') == 0
+    
+    def test_table_is_bounded_lru(self):
+        """Test the table never exceeds max_keys and evicts least recently used"""
+        limiter = TokenBucketLimiter(rate=1, burst=1, max_keys=2, clock=FakeClock())
+        limiter.acquire('a')
+        limiter.acquire('b')
+        limiter.acquire('a')  # 'a' is now most recent (and rejected)
+        limiter.acquire('c')  # evicts 'b'
+        assert len(limiter) == 2
+        assert limiter.acquire('a') > 0
+        assert limiter.acquire('b') == 0
+    
+    def test_hot_keys(self):
+        """Test hot keys report rejection counts and reset"""
+        limiter = TokenBucketLimiter(rate=1, burst=1, clock=FakeClock())
+        for _ in range(4):
+            limiter.acquire('noisy')
+        limiter.acquire('quiet')
+        limiter.acquire('quiet')
+        assert limiter.hot_keys(1) == [('noisy', 3)]
+        assert limiter.hot_keys(5) == []
+
+
+class TestRateLimitedEndpoint:
+    """Test 429 responses from /api/email"""
+    
+    @patch('app.main.publish_to_sqs', return_value=True)
+    @patch('app.main.validate_token', return_value=True)
+    def test_sender_limit_returns_429(self, mock_validate_token, mock_publish, valid_request):
+        """Test a flooding sender gets 429 with Retry-After and is reported hot"""
+        limiter = TokenBucketLimiter(rate=0.5, burst=2)
+        labels = {'limit': 'sender', 'key': metric_label('flood@example.com')}
+        with patch('app.main.sender_limiter', limiter):
+            statuses = [client.post("/api/email", json=valid_request) for _ in range(3)]
+            assert [r.status_code for r in statuses] == [200, 200, 429]
+            assert statuses[2].headers['Retry-After'] == '2'
+            assert mock_publish.call_count == 2
+            refresh_hot_key_metrics()
+            assert REGISTRY.get_sample_value('api_rate_limit_hot_key_rejections', labels) == 1
+            # No rejections since the last refresh: the series is removed
+            refresh_hot_key_metrics()
+            assert REGISTRY.get_sample_value('api_rate_limit_hot_key_rejections', labels) is None
+    
+    @patch('app.main.publish_to_sqs', return_value=True)
+    @patch('app.main.validate_token', return_value=True)
+    def test_flooding_sender_does_not_drain_token_bucket(self, mock_validate_token, mock_publish, valid_request):
+        """Test sender rejections are not charged to the shared auth value bucket"""
+        token_limiter = TokenBucketLimiter(rate=0.01, burst=3)
+        sender_limiter = TokenBucketLimiter(rate=0.01, burst=1)
+        with patch('app.main.token_limiter', token_limiter), patch('app.main.sender_limiter', sender_limiter):
+            statuses = [client.post("/api/email", json=valid_request).status_code for _ in range(5)]
+            assert statuses == [200, 429, 429, 429, 429]
+            other = dict(valid_request, data=dict(valid_request['data'], email_sender='other@example.com'))
+            assert client.post("/api/email", json=other).status_code == 200
+    
+    @patch('app.main.publish_to_sqs', return_value=True)
+    @patch('app.main.validate_token', return_value=True)
+    def test_rejections_logged_hashed_and_throttled(self, mock_validate_token, mock_publish, valid_request, caplog):
+        """Test rejection logs carry only the hashed sender, once per interval"""
+        limiter = TokenBucketLimiter(rate=0.01, burst=1)
+        with patch('app.main.sender_limiter', limiter), \
+                patch.dict('app.main._rate_limit_log', {'last': float('-inf'), 'suppressed': 0}):
+            with caplog.at_level('WARNING', logger='app.main'):
+                for _ in range(4):
+                    client.post("/api/email", json=valid_request)
+        messages = [r.getMessage() for r in caplog.records if 'Rate limit' in r.getMessage()]
+        assert messages == [f"Rate limit exceeded for sender {metric_label('flood@example.com')} (0 more rejections not logged)"]
+        assert 'flood@example.com' not in caplog.text
@@ -0,0 +1,130 @@
+"""
+Unit tests for priority lane routing
+"""
+
+import json
+import pytest
+from unittest.mock import MagicMock, patch
+from fastapi.testclient import TestClient
+from app.routing import LaneRouter, UnknownLaneError
+from app.fifo import fifo_parameters, message_group_id, deduplication_id
+from app.main import app
+
+client = TestClient(app)
+
+QUEUES = {
+    'high': 'https://sqs.us-west-1.amazonaws.com/123456789/high',
+    'low': 'https://sqs.us-west-1.amazonaws.com/123456789/low'
+}
+DEFAULT_URL = 'https://sqs.us-west-1.amazonaws.com/123456789/test-queue'
+
+
+@pytest.fixture
+def router():
+    """Router with high/low lanes and sender/subject rules"""
+    rules = [
+        {'lane': 'high', 'subject': r'^urgent'},
+        {'lane': 'low', 'sender': r'@bulk\.example\.com$'}
+    ]
+    lanes = [{'name': name, 'queue_url': url, 'weight': 1} for name, url in QUEUES.items()]
+    return LaneRouter.from_config(DEFAULT_URL, 'default', json.dumps(lanes), json.dumps(rules))
+
+
+class TestLaneRouter:
+    """Test lane selection"""
+    
+    def test_explicit_priority_wins(self, router):
+        """Test an explicit priority overrides rules"""
+        assert router.route('news@bulk.example.com', 'Urgent: hi', 'high').lane == 'high'
+    
+    def test_rules_then_default(self, router):
+        """Test first matching rule, else the default lane"""
+        assert router.route('a@example.com', 'URGENT outage').lane == 'high'
+        assert router.route('news@bulk.example.com', 'Weekly digest') == ('low', QUEUES['low'])
+        assert router.route('a@example.com', 'Hello') == ('default', DEFAULT_URL)
+    
+    def test_unknown_priority(self, router):
+        """Test an unconfigured priority is rejected"""
+        with pytest.raises(UnknownLaneError):
+            router.route('a@example.com', 'Hello', 'critical')
+    
+    def test_rule_for_unknown_lane(self):
+        """Test misconfigured rules fail fast"""
+        with pytest.raises(ValueError):
+            LaneRouter.from_config(DEFAULT_URL, rules_json=json.dumps([{'lane': 'nope'}]))
+
+
+class TestLaneEndpoint:
+    """Test /api/email lane routing"""
+    
+    @patch('app.main.publish_to_sqs', return_value=True)
+    @patch('app.main.validate_token', return_value=True)
+    def test_priority_routes_to_lane_queue(self, mock_validate_token, mock_publish, router):
+        """Test the lane queue is passed to publish_to_sqs"""
+        payload = {
+            "data": {
+                "email_subject": "Hello",
+                "email_sender": "a@example.com",
+                "email_timestamp": "1693561101",
+                "email_content": "Content"
+            },
+            "token": "mock-auth-value",
+            "priority": "high"
+        }
+        with patch('app.main.lane_router', router):
+            assert client.post("/api/email", json=payload).status_code == 200
+            assert mock_publish.call_args.args[1] == QUEUES['high']
+            payload['priority'] = 'critical'
+            assert client.post("/api/email", json=payload).status_code == 400
+
+
+class TestFifoParameters:
+    """Test FIFO group and deduplication ids"""
+    
+    def test_standard_queue_has_no_fifo_parameters(self):
+        """Test standard queues get no FIFO parameters"""
+        assert fifo_parameters(DEFAULT_URL, 'a@example.com', {'x': 1}) == {}
+    
+    def test_group_is_stable_per_sender(self):
+        """Test the same sender always maps to the same group"""
+        assert message_group_id('A@Example.com') == message_group_id('a@example.com ')
+        assert message_group_id('a@example.com') != message_group_id('b@example.com')
+        assert message_group_id('a@example.com', partitions=8).startswith('p-')
+        assert int(message_group_id('a@example.com', partitions=8)[2:]) < 8
+    
+    def test_dedup_id_from_content(self):
+        """Test deduplication ids depend only on content"""
+        assert deduplication_id({'a': 1, 'b': 2}) == deduplication_id({'b': 2, 'a': 1})
+        assert deduplication_id({'a': 1}) != deduplication_id({'a': 2})
+    
+    @patch('app.main.sqs_client')
+    def test_publish_to_fifo_queue(self, mock_sqs):
+        """Test publish_to_sqs sets group and dedup ids for .fifo queues"""
+        from app.main import EmailData, publish_to_sqs
+        mock_sqs.send_message.return_value = {'MessageId': 'test-msg-id'}
+        data = EmailData(
+            email_subject="Hello", email_sender="a@example.com",
+            email_timestamp="1693561101", email_content="Content"
+        )
+        assert publish_to_sqs(data, 'https://sqs.us-west-1.amazonaws.com/123456789/emails.fifo') is True
+        kwargs = mock_sqs.send_message.call_args.kwargs
+        assert kwargs['MessageGroupId'] == message_group_id('a@example.com')
+        assert kwargs['MessageDeduplicationId'] == deduplication_id(data.model_dump())
+    
+    @patch('app.main.sqs_client')
+    def test_fifo_failure_is_not_spooled(self, mock_sqs):
+        """Test failed FIFO publishes are returned as errors instead of spooled (ordering)"""
+        from botocore.exceptions import ClientError
+        from app.circuit_breaker import CircuitBreakerMap
+        from app.main import EmailData, publish_to_sqs
+        mock_sqs.send_message.side_effect = ClientError({'Error': {'Code': 'ServiceUnavailable'}}, 'SendMessage')
+        data = EmailData(
+            email_subject="Hello", email_sender="a@example.com",
+            email_timestamp="1693561101", email_content="Content"
+        )
+        spool = MagicMock()
+        with patch('app.main.spool', spool), patch('app.main.sqs_breakers', CircuitBreakerMap(failure_threshold=1)):
+            # Failed send, then short-circuited by the open breaker
+            for _ in range(2):
+                assert publish_to_sqs(data, 'https://sqs.us-west-1.amazonaws.com/123456789/emails.fifo') is False
+        spool.append.assert_not_called()
@@ -0,0 +1,290 @@
+"""
+Unit tests for the SQS circuit breaker and local spool
+"""
+
+import json
+import os
+import pytest
+from unittest.mock import patch
+from botocore.exceptions import ClientError
+from app.circuit_breaker import CircuitBreaker, CircuitBreakerMap, CLOSED, OPEN, HALF_OPEN
+from app.spool import Spool
+from app.main import EmailData, SQS_BATCH_MAX_BYTES, publish_to_sqs, send_spooled_batch, spooled_record_size
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def spool(tmp_path):
+    """Spool in a temporary directory"""
+    s = Spool(str(tmp_path), segment_bytes=200, fsync_batch=2)
+    yield s
+    s.close()
+
+
+@pytest.fixture
+def valid_email_data():
+    """Valid email data"""
+    return {
+        "email_subject": "Test Email",
+        "email_sender": "test@example.com",
+        "email_timestamp": "1693561101",
+        "email_content": "This is a test email content"
+    }
+
+
+class TestCircuitBreaker:
+    """Test breaker state transitions"""
+    
+    def test_opens_after_threshold(self):
+        """Test consecutive failures open the circuit"""
+        breaker = CircuitBreaker(failure_threshold=3, reset_timeout=10, clock=FakeClock())
+        for _ in range(2):
+            breaker.record_failure()
+        assert breaker.state == CLOSED
+        breaker.record_failure()
+        assert breaker.state == OPEN
+        assert breaker.allow_request() is False
+    
+    def test_half_open_single_probe(self):
+        """Test one probe is allowed after the reset timeout"""
+        clock = FakeClock()
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=10, clock=clock)
+        breaker.record_failure()
+        clock.now = 10
+        assert breaker.state == HALF_OPEN
+        assert breaker.allow_request() is True
+        assert breaker.allow_request() is False
+        breaker.record_success()
+        assert breaker.state == CLOSED
+    
+    def test_failed_probe_reopens(self):
+        """Test a failed probe reopens the circuit"""
+        clock = FakeClock()
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=10, clock=clock)
+        breaker.record_failure()
+        clock.now = 10
+        assert breaker.allow_request() is True
+        breaker.record_failure()
+        assert breaker.state == OPEN
+
+
+class TestSpool:
+    """Test spool append and replay"""
+    
+    def test_replay_in_order_across_segments(self, spool):
+        """Test records are replayed oldest first and segments removed"""
+        for i in range(10):
+            spool.append({'body': f'message-{i}', 'attributes': {}})
+        batches = []
+        sent = spool.replay(lambda batch: batches.append(batch) or True, batch_size=3)
+        assert sent == 10
+        assert [r['body'] for b in batches for r in b] == [f'message-{i}' for i in range(10)]
+        assert spool.has_pending() is False
+        assert os.listdir(spool.directory) == []
+    
+    def test_replay_resumes_after_failure(self, tmp_path):
+        """Test a failed batch stops replay and is retried from the checkpoint"""
+        spool = Spool(str(tmp_path), fsync_batch=1)
+        for i in range(5):
+            spool.append({'body': f'message-{i}', 'attributes': {}})
+        calls = []
+        
+        def flaky(batch):
+            calls.append([r['body'] for r in batch])
+            return len(calls) != 2
+        
+        assert spool.replay(flaky, batch_size=2) == 2
+        assert spool.has_pending() is True
+        assert spool.replay(lambda batch: calls.append([r['body'] for r in batch]) or True, batch_size=2) == 3
+        assert calls[2] == ['message-2', 'message-3']
+        spool.close()
+    
+    def test_corrupt_record_quarantines_rest_of_segment(self, tmp_path):
+        """Test records after a corrupt one are moved aside instead of deleted"""
+        spool = Spool(str(tmp_path), fsync_batch=1)
+        for i in range(3):
+            spool.append({'body': f'message-{i}', 'attributes': {}})
+        spool.roll()
+        segment = os.path.join(spool.directory, sorted(os.listdir(spool.directory))[0])
+        with open(segment, 'r+b') as f:
+            data = f.read()
+            second = data.index(b'message-1')
+            f.seek(second)
+            f.write(b'X')
+        received = []
+        assert spool.replay(lambda batch: received.extend(batch) or True) == 1
+        assert [r['body'] for r in received] == ['message-0']
+        assert spool.has_pending() is False
+        quarantined = [n for n in os.listdir(spool.directory) if n.endswith('.corrupt')]
+        assert len(quarantined) == 1
+        with open(os.path.join(spool.directory, quarantined[0]), 'rb') as f:
+            assert b'message-2' in f.read()
+        assert spool.quarantined_bytes() > 0
+        spool.close()
+    
+    def test_torn_tail_is_ignored(self, spool):
+        """Test a partially written record does not break replay"""
+        spool.append({'body': 'ok', 'attributes': {}})
+        spool.roll()
+        segment = os.path.join(spool.directory, sorted(os.listdir(spool.directory))[0])
+        with open(segment, 'ab') as f:
+            f.write(b'\x00\x00\x01')
+        received = []
+        spool.replay(lambda batch: received.extend(batch) or True)
+        assert [r['body'] for r in received] == ['ok']
+
+
+QUEUE_URL = 'https://sqs.us-west-1.amazonaws.com/123456789/test-queue'
+
+
+class TestSpooledReplay:
+    """Test spooled records are replayed within SQS batch limits"""
+    
+    @staticmethod
+    def replay(spool):
+        return spool.replay(
+            send_spooled_batch, batch_size=10,
+            max_batch_bytes=SQS_BATCH_MAX_BYTES, record_size=spooled_record_size
+        )
+    
+    @patch('app.main.sqs_client')
+    def test_large_records_are_split_by_bytes(self, mock_sqs, tmp_path):
+        """Test batches of large records stay under the 256 KiB request limit"""
+        spool = Spool(str(tmp_path), fsync_batch=1)
+        for i in range(10):
+            spool.append({'body': 'x' * 30000, 'attributes': {}, 'queue_url': QUEUE_URL})
+        spool.roll()
+        mock_sqs.send_message_batch.return_value = {'Successful': []}
+        with patch('app.main.spool', spool), patch('app.main.sqs_breakers', CircuitBreakerMap()):
+            assert self.replay(spool) == 10
+        calls = mock_sqs.send_message_batch.call_args_list
+        assert len(calls) == 2
+        for call in calls:
+            assert sum(len(e['MessageBody']) for e in call.kwargs['Entries']) <= SQS_BATCH_MAX_BYTES
+        assert spool.has_pending() is False
+        spool.close()
+    
+    @patch('app.main.sqs_client')
+    def test_rejected_entry_is_set_aside(self, mock_sqs, spool):
+        """Test a SenderFault entry is set aside without failing the batch or the circuit"""
+        for i in range(3):
+            spool.append({'body': f'message-{i}', 'attributes': {}, 'queue_url': QUEUE_URL})
+        spool.roll()
+        mock_sqs.send_message_batch.side_effect = lambda QueueUrl, Entries: {
+            'Successful': [{'Id': e['Id']} for e in Entries if e['MessageBody'] != 'message-1'],
+            'Failed': [
+                {'Id': e['Id'], 'SenderFault': True, 'Code': 'InvalidMessageContents', 'Message': 'bad'}
+                for e in Entries if e['MessageBody'] == 'message-1'
+            ]
+        }
+        breakers = CircuitBreakerMap(failure_threshold=1)
+        breaker = breakers.get(QUEUE_URL)
+        with patch('app.main.spool', spool), patch('app.main.sqs_breakers', breakers):
+            assert self.replay(spool) == 3
+        assert breaker.state == CLOSED
+        assert spool.has_pending() is False
+        with open(os.path.join(spool.directory, 'rejected.jsonl')) as f:
+            assert [json.loads(line)['record']['body'] for line in f] == ['message-1']
+    
+    @patch('app.main.sqs_client')
+    def test_auth_error_keeps_records(self, mock_sqs, spool):
+        """Test auth or queue errors fail the replay and keep the spool instead of setting records aside"""
+        for i in range(3):
+            spool.append({'body': f'message-{i}', 'attributes': {}, 'queue_url': QUEUE_URL})
+        spool.roll()
+        mock_sqs.send_message_batch.side_effect = ClientError(
+            {'Error': {'Code': 'ExpiredToken'}, 'ResponseMetadata': {'HTTPStatusCode': 403}},
+            'SendMessageBatch'
+        )
+        breakers = CircuitBreakerMap(failure_threshold=1)
+        with patch('app.main.spool', spool), patch('app.main.sqs_breakers', breakers):
+            assert self.replay(spool) == 0
+        assert breakers.get(QUEUE_URL).state == OPEN
+        assert spool.has_pending() is True
+        assert not os.path.exists(os.path.join(spool.directory, 'rejected.jsonl'))
+    
+    @patch('app.main.sqs_client')
+    def test_rejected_batch_is_isolated(self, mock_sqs, spool):
+        """Test a batch-level client error is retried per record and only the bad one set aside"""
+        def send(QueueUrl, Entries):
+            if len(Entries) > 1 or Entries[0]['MessageBody'] == 'message-1':
+                raise ClientError(
+                    {'Error': {'Code': 'BatchRequestTooLong'}, 'ResponseMetadata': {'HTTPStatusCode': 400}},
+                    'SendMessageBatch'
+                )
+            return {'Successful': [{'Id': '0'}]}
+        
+        for i in range(3):
+            spool.append({'body': f'message-{i}', 'attributes': {}, 'queue_url': QUEUE_URL})
+        spool.roll()
+        mock_sqs.send_message_batch.side_effect = send
+        breakers = CircuitBreakerMap(failure_threshold=1)
+        breaker = breakers.get(QUEUE_URL)
+        with patch('app.main.spool', spool), patch('app.main.sqs_breakers', breakers):
+            assert self.replay(spool) == 3
+        assert breaker.state == CLOSED
+        assert spool.has_pending() is False
+
+
+class TestPublishWithSpool:
+    """Test publish_to_sqs falls back to the spool"""
+    
+    def test_publish_client_fails_fast(self):
+        """Test the SQS client has a short read timeout and few attempts"""
+        from app import main
+        config = main.sqs_client.meta.config
+        assert config.read_timeout == main.SQS_PUBLISH_READ_TIMEOUT
+        assert config.retries['total_max_attempts'] == main.SQS_PUBLISH_MAX_ATTEMPTS
+    
+    @patch('app.main.SQS_QUEUE_URL', 'https://sqs.us-west-1.amazonaws.com/123456789/test-queue')
+    @patch('app.main.sqs_client')
+    def test_failed_publish_is_spooled_and_circuit_opens(self, mock_sqs, spool, valid_email_data):
+        """Test SQS errors spool the message and open the circuit"""
+        mock_sqs.send_message.side_effect = ClientError(
+            {'Error': {'Code': 'ServiceUnavailable'}}, 'SendMessage'
+        )
+        breakers = CircuitBreakerMap(failure_threshold=2, reset_timeout=60)
+        breaker = breakers.get('https://sqs.us-west-1.amazonaws.com/123456789/test-queue')
+        with patch('app.main.spool', spool), patch('app.main.sqs_breakers', breakers):
+            for _ in range(3):
+                assert publish_to_sqs(EmailData(**valid_email_data)) is True
+        # Third call short-circuits without touching SQS
+        assert mock_sqs.send_message.call_count == 2
+        assert breaker.state == OPEN
+        assert spool.has_pending() is True
+    
+    @patch('app.main.sqs_client')
+    def test_circuit_is_per_queue(self, mock_sqs, spool, valid_email_data):
+        """Test a failing lane queue does not short-circuit the others"""
+        bad = 'https://sqs.us-west-1.amazonaws.com/123456789/low'
+        
+        def send_message(QueueUrl, **kwargs):
+            if QueueUrl == bad:
+                raise ClientError({'Error': {'Code': 'ServiceUnavailable'}}, 'SendMessage')
+            return {'MessageId': 'm'}
+        
+        mock_sqs.send_message.side_effect = send_message
+        breakers = CircuitBreakerMap(failure_threshold=1, reset_timeout=60)
+        with patch('app.main.spool', spool), patch('app.main.sqs_breakers', breakers):
+            assert publish_to_sqs(EmailData(**valid_email_data), queue_url=bad) is True
+            assert publish_to_sqs(EmailData(**valid_email_data), queue_url=QUEUE_URL) is True
+        assert breakers.get(bad).state == OPEN
+        assert breakers.get(QUEUE_URL).state == CLOSED
+        assert mock_sqs.send_message.call_count == 2
+    
+    @patch('app.main.SQS_QUEUE_URL', 'https://sqs.us-west-1.amazonaws.com/123456789/test-queue')
+    @patch('app.main.sqs_client')
+    def test_failed_publish_without_spool(self, mock_sqs, valid_email_data):
+        """Test failures still return False when spooling is disabled"""
+        mock_sqs.send_message.side_effect = ClientError(
+            {'Error': {'Code': 'ServiceUnavailable'}}, 'SendMessage'
+        )
+        with patch('app.main.sqs_breakers', CircuitBreakerMap()):
+            assert publish_to_sqs(EmailData(**valid_email_data)) is False
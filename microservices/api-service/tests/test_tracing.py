@@ -0,0 +1,80 @@
+"""
+Unit tests for request stage timing
+"""
+
+import logging
+import pytest
+from unittest.mock import patch
+from fastapi.testclient import TestClient
+from prometheus_client import REGISTRY
+from app import tracing
+from app.main import app
+
+client = TestClient(app)
+
+
+@pytest.fixture
+def valid_request():
+    """Valid request payload"""
+    return {
+        "data": {
+            "email_subject": "Test Email",
+            "email_sender": "test@example.com",
+            "email_timestamp": "1693561101",
+            "email_content": "This is a test email content"
+        },
+        "token": "mock-auth-value"
+    }
+
+
+def stage_count(stage):
+    return REGISTRY.get_sample_value(
+        'api_request_stage_duration_seconds_count', {'stage': stage}
+    ) or 0
+
+
+class TestSpans:
+    """Test span recording"""
+    
+    def test_spans_recorded_in_trace_and_histogram(self):
+        """Test spans land in the current trace and the histogram"""
+        before = stage_count('unit_stage')
+        with tracing.request_trace('unit', slow_threshold_ms=10_000) as trace:
+            with tracing.span('unit_stage'):
+                pass
+        assert [s[0] for s in trace.spans] == ['unit_stage']
+        assert stage_count('unit_stage') == before + 1
+    
+    def test_slow_request_logs_breakdown(self, caplog):
+        """Test a request over the threshold logs its stages"""
+        with caplog.at_level(logging.WARNING, logger='app.tracing'):
+            with tracing.request_trace('slow', slow_threshold_ms=0):
+                with tracing.span('work'):
+                    pass
+        assert 'Slow request' in caplog.text
+        assert '"stage": "work"' in caplog.text
+    
+    def test_exporter_hook_receives_trace(self):
+        """Test registered exporters get finished traces"""
+        received = []
+        with patch.object(tracing, '_exporters', [received.append]):
+            with tracing.request_trace('hooked', slow_threshold_ms=10_000):
+                with tracing.span('a'):
+                    pass
+        assert received[0].name == 'hooked'
+        assert received[0].end_ns is not None
+
+
+class TestReceiveEmailStages:
+    """Test /api/email stage instrumentation"""
+    
+    @patch('app.main.publish_to_sqs', return_value=True)
+    @patch('app.main.validate_token', return_value=True)
+    def test_stages_observed(self, mock_validate_token, mock_publish, valid_request):
+        """Test token and data validation stages are timed"""
+        token_before = stage_count('token_validation_ssm')
+        data_before = stage_count('data_validation')
+        response = client.post("/api/email", json=valid_request)
+        assert response.status_code == 200
+        assert stage_count('token_validation_ssm') == token_before + 1
+        assert stage_count('data_validation') == data_before + 1
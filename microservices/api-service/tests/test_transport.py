@@ -0,0 +1,70 @@
+"""
+Unit tests for the AWS transport layer
+"""
+
+import io
+from unittest.mock import Mock
+import pytest
+from botocore.awsrequest import AWSResponse
+from botocore.exceptions import ClientError
+from app import transport
+
+
+class _RawResponse(io.BytesIO):
+    def stream(self, **kwargs):
+        yield self.read()
+
+
+class TestTransport:
+    """Test client construction and pre-warming"""
+    
+    def test_client_config(self):
+        """Test tuned pool, retry and keepalive settings"""
+        config = transport.client_config()
+        assert config.max_pool_connections == transport.AWS_MAX_POOL_CONNECTIONS
+        assert config.retries['mode'] == transport.AWS_RETRY_MODE
+        assert config.tcp_keepalive == transport.AWS_TCP_KEEPALIVE
+        assert config.read_timeout > 20
+        assert transport.client_config(read_timeout=1.5).read_timeout == 1.5
+    
+    def test_retry_override_sends_once(self, monkeypatch):
+        """Test a single-attempt client sends one HTTP request for a 503"""
+        monkeypatch.setenv('AWS_ACCESS_KEY_ID', 'testing')
+        monkeypatch.setenv('AWS_SECRET_ACCESS_KEY', 'testing')
+        transport.reset_clients()
+        sends = []
+        
+        def respond_503(request, **kwargs):
+            sends.append(request.url)
+            body = b'<Error><Code>SlowDown</Code><Message>Reduce your request rate.</Message></Error>'
+            return AWSResponse(request.url, 503, {}, _RawResponse(body))
+        
+        client = transport.get_client('s3', max_attempts=1)
+        assert client is transport.get_client('s3', max_attempts=1)
+        assert client is not transport.get_client('s3')
+        client.meta.events.register('before-send.s3.PutObject', respond_503)
+        with pytest.raises(ClientError):
+            client.put_object(Bucket='bucket', Key='key', Body=b'x')
+        assert len(sends) == 1
+        transport.reset_clients()
+    
+    def test_get_client_is_cached(self):
+        """Test clients are shared per service and rebuilt after reset"""
+        first = transport.get_client('sqs')
+        assert transport.get_client('sqs') is first
+        assert first.meta.config.max_pool_connections == transport.AWS_MAX_POOL_CONNECTIONS
+        transport.reset_clients()
+        assert transport.get_client('sqs') is not first
+    
+    def test_prewarm_issues_concurrent_calls(self):
+        """Test pre-warm calls once per connection and tolerates failures"""
+        client = Mock()
+        call = Mock(side_effect=[None, Exception("boom"), None])
+        transport.prewarm(client, call, connections=3)
+        assert call.call_count == 3
+    
+    def test_prewarm_disabled(self):
+        """Test zero connections skips pre-warming"""
+        call = Mock()
+        transport.prewarm(Mock(), call, connections=0)
+        call.assert_not_called()
@@ -0,0 +1,61 @@
+"""
+Unit tests for multi-worker support
+"""
+
+import os
+import subprocess
+import sys
+from unittest.mock import patch
+from app import workers
+from app.spool import claim_slot
+
+SERVICE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class TestWorkerCount:
+    """Test worker count derivation"""
+    
+    @patch.dict(os.environ, {'WEB_CONCURRENCY': '3'})
+    def test_explicit_worker_count(self):
+        """Test WEB_CONCURRENCY overrides CPU detection"""
+        assert workers.worker_count() == 3
+    
+    @patch.dict(os.environ, {'WEB_CONCURRENCY': ''})
+    @patch('app.workers._cgroup_cpu_quota', return_value=1.5)
+    def test_cgroup_quota_caps_cpus(self, mock_quota):
+        """Test container CPU quota caps the worker count"""
+        assert workers.worker_count() == min(2, len(os.sched_getaffinity(0)))
+
+
+class TestSpoolSlots:
+    """Test per-worker spool directories"""
+    
+    def test_slots_are_exclusive(self, tmp_path):
+        """Test each claim gets a distinct slot"""
+        first = claim_slot(str(tmp_path))
+        second = claim_slot(str(tmp_path))
+        assert first != second
+
+
+class TestMultiprocessMetrics:
+    """Test /metrics aggregates all workers"""
+    
+    def test_metrics_aggregated_across_processes(self, tmp_path):
+        """Test counters from separate worker processes are summed"""
+        env = dict(os.environ, PROMETHEUS_MULTIPROC_DIR=str(tmp_path))
+        increment = (
+            "from app.main import REQUEST_COUNT\n"
+            "REQUEST_COUNT.labels(method='GET', endpoint='/agg', status='200').inc()\n"
+        )
+        for _ in range(2):
+            subprocess.run([sys.executable, '-c', increment], cwd=SERVICE_DIR, env=env, check=True)
+        scrape = (
+            "from fastapi.testclient import TestClient\n"
+            "from app.main import app\n"
+            "print(TestClient(app).get('/metrics').text)\n"
+        )
+        output = subprocess.run(
+            [sys.executable, '-c', scrape], cwd=SERVICE_DIR, env=env,
+            check=True, capture_output=True, text=True
+        ).stdout
+        assert 'api_requests_total{endpoint="/agg",method="GET",status="200"} 2.0' in output
@@ -0,0 +1,95 @@
+"""
+Versioned message envelope for API -> SQS -> S3 messages
+The body is compact JSON, so it is decoded as cheaply as a legacy body and
+stored by the consumer exactly as received. Bodies of at least
+compress_min_bytes are zlib-compressed (base64 text so it fits an SQS body)
+when that makes them smaller. The content_type message attribute carries
+the version and encoding; it replaces the legacy per-field attributes.
+Kept identical in api-service and sqs-consumer.
+"""
+
+import base64
+import json
+import zlib
+from typing import NamedTuple
+
+# Message attribute used to negotiate the body format.
+# Messages without it are legacy JSON bodies.
+CONTENT_TYPE_ATTRIBUTE = 'content_type'
+JSON_CONTENT_TYPE = 'email/v2+json'
+ZLIB_CONTENT_TYPE = 'email/v2+json+zlib'
+
+SCHEMA_VERSION = 2
+
+# SQS bills requests per 64 KiB chunk; smaller bodies are not worth the
+# compression CPU on either side
+DEFAULT_COMPRESS_MIN_BYTES = 64 * 1024
+# Fast compression: most of the size win on email text at a fraction of level 6's cost
+ZLIB_LEVEL = 1
+
+_ATTRIBUTES = {
+    content_type: {CONTENT_TYPE_ATTRIBUTE: {'StringValue': content_type, 'DataType': 'String'}}
+    for content_type in (JSON_CONTENT_TYPE, ZLIB_CONTENT_TYPE)
+}
+
+
+class EnvelopeError(ValueError):
+    """Raised when a message body cannot be decoded"""
+
+
+class Envelope(NamedTuple):
+    """Decoded message: data and the JSON bytes to store"""
+    version: int  # 0 for legacy JSON bodies
+    data: dict
+    payload: bytes
+
+
+def encode(data: dict, compress_min_bytes: int = DEFAULT_COMPRESS_MIN_BYTES) -> tuple:
+    """
+    Encode data into an SQS (body, message attributes) pair
+    The attributes dict is shared; callers must not modify it.
+    """
+    body = json.dumps(data, separators=(',', ':'))
+    if compress_min_bytes and len(body) >= compress_min_bytes:
+        compressed = base64.b64encode(zlib.compress(body.encode('utf-8'), ZLIB_LEVEL)).decode('ascii')
+        if len(compressed) < len(body):
+            return compressed, _ATTRIBUTES[ZLIB_CONTENT_TYPE]
+    return body, _ATTRIBUTES[JSON_CONTENT_TYPE]
+
+
+def decode(body: str, content_type: str = JSON_CONTENT_TYPE) -> Envelope:
+    """
+    Decode an envelope body produced by encode()
+    """
+    try:
+        if content_type == JSON_CONTENT_TYPE:
+            data = json.loads(body)
+            payload = body.encode('utf-8')
+        elif content_type == ZLIB_CONTENT_TYPE:
+            payload = zlib.decompress(base64.b64decode(body, validate=True))
+            data = json.loads(payload)
+        else:
+            raise EnvelopeError(f"Unsupported envelope content type: {content_type}")
+    except EnvelopeError:
+        raise
+    except Exception as e:
+        raise EnvelopeError(f"Malformed envelope: {e}") from e
+    if not isinstance(data, dict):
+        raise EnvelopeError("Envelope payload is not a mapping")
+    return Envelope(SCHEMA_VERSION, data, payload)
+
+
+def decode_message(message: dict) -> Envelope:
+    """
+    Decode an SQS message, negotiating envelope vs legacy JSON bodies
+    Raises EnvelopeError or json.JSONDecodeError on malformed bodies.
+    """
+    attributes = message.get('MessageAttributes')
+    content_type = attributes.get(CONTENT_TYPE_ATTRIBUTE, {}).get('StringValue') if attributes else None
+    if content_type is not None:
+        return decode(message['Body'], content_type)
+    body = message['Body']
+    data = json.loads(body)
+    if not isinstance(data, dict):
+        raise json.JSONDecodeError("Message body is not a JSON object", body, 0)
+    return Envelope(0, data, body.encode('utf-8'))
@@ -0,0 +1,45 @@
+"""
+SQS FIFO message group / deduplication ids
+Shared by the api-service publisher and the sqs-consumer replay tool so a
+replayed message lands in the same group as the original.
+Kept identical in api-service and sqs-consumer.
+"""
+
+import hashlib
+import json
+from typing import Optional
+
+
+def is_fifo_queue(queue_url: Optional[str]) -> bool:
+    """SQS FIFO queue URLs end with .fifo"""
+    return isinstance(queue_url, str) and queue_url.endswith('.fifo')
+
+
+def message_group_id(sender: str, partitions: int = 0) -> str:
+    """
+    Stable FIFO MessageGroupId for a sender.
+    With partitions > 0, senders are hashed onto that many groups
+    (bounded parallelism); otherwise every sender is its own group.
+    """
+    digest = hashlib.sha256(sender.strip().lower().encode('utf-8')).hexdigest()
+    if partitions > 0:
+        return f"p-{int(digest[:16], 16) % partitions}"
+    return f"s-{digest[:32]}"
+
+
+def deduplication_id(data: dict) -> str:
+    """FIFO MessageDeduplicationId derived from the message content"""
+    canonical = json.dumps(data, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+def fifo_parameters(queue_url: Optional[str], sender: str, data: dict, partitions: int = 0) -> dict:
+    """
+    send_message(_batch) parameters for FIFO queues; empty for standard queues
+    """
+    if not is_fifo_queue(queue_url):
+        return {}
+    return {
+        'MessageGroupId': message_group_id(sender, partitions),
+        'MessageDeduplicationId': deduplication_id(data)
+    }
@@ -0,0 +1,118 @@
+"""
+Hedged requests for tail-latency reduction
+A duplicate request is started when the original is slower than a tracked latency percentile
+"""
+
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, wait
+from typing import Optional
+
+
+class LatencyTracker:
+    """
+    Rolling window of request latencies with a cached percentile.
+
+    The percentile is recomputed every `refresh_every` samples so the
+    hot path only pays for a deque append.
+    """
+
+    def __init__(self, percentile: float = 95.0, window: int = 1000,
+                 min_samples: int = 20, refresh_every: int = 50):
+        self.percentile = percentile
+        self.min_samples = min_samples
+        self.refresh_every = refresh_every
+        self._samples = deque(maxlen=window)
+        self._since_refresh = 0
+        self._threshold = None
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float):
+        """Add a latency sample"""
+        with self._lock:
+            self._samples.append(seconds)
+            self._since_refresh += 1
+            if self._threshold is None or self._since_refresh >= self.refresh_every:
+                self._refresh()
+
+    def _refresh(self):
+        self._since_refresh = 0
+        if len(self._samples) < self.min_samples:
+            self._threshold = None
+            return
+        ordered = sorted(self._samples)
+        index = min(len(ordered) - 1, int(len(ordered) * self.percentile / 100.0))
+        self._threshold = ordered[index]
+
+    def threshold(self) -> Optional[float]:
+        """Current percentile latency, or None until enough samples exist"""
+        return self._threshold
+
+
+class HedgeBudget:
+    """
+    Token budget capping hedges to a fraction of requests.
+
+    Each request earns `ratio` tokens (up to `burst`); each hedge spends one.
+    """
+
+    def __init__(self, ratio: float = 0.05, burst: float = 10.0):
+        self.ratio = ratio
+        self.burst = burst
+        self._tokens = burst
+        self._lock = threading.Lock()
+
+    def on_request(self):
+        """Credit the budget for one primary request"""
+        with self._lock:
+            self._tokens = min(self.burst, self._tokens + self.ratio)
+
+    def try_spend(self) -> bool:
+        """Spend one token for a hedge if available"""
+        with self._lock:
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return True
+            return False
+
+
+def _timed_call(tracker: LatencyTracker, fn, kwargs):
+    # Timed in the worker so executor queueing is not counted as latency
+    start = time.monotonic()
+    result = fn(**kwargs)
+    tracker.record(time.monotonic() - start)
+    return result
+
+
+def _timed_submit(executor, tracker: LatencyTracker, fn, kwargs):
+    return executor.submit(_timed_call, tracker, fn, kwargs)
+
+
+def hedged_call(executor, tracker: LatencyTracker, budget: HedgeBudget, fn, **kwargs):
+    """
+    Run fn(**kwargs) on the executor, firing one duplicate if it has not
+    finished by the tracker's threshold and the budget allows it.
+    fn must be idempotent. Returns (result, hedge_fired, hedge_won);
+    raises the primary's error if every attempt fails.
+    """
+    budget.on_request()
+    primary = _timed_submit(executor, tracker, fn, kwargs)
+
+    threshold = tracker.threshold()
+    if threshold is None:
+        return primary.result(), False, False
+
+    done, _ = wait([primary], timeout=threshold)
+    if done or not budget.try_spend():
+        return primary.result(), False, False
+
+    hedge = _timed_submit(executor, tracker, fn, kwargs)
+    pending = {primary, hedge}
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            if future.exception() is None:
+                return future.result(), True, future is hedge
+    # Both attempts failed: surface the original error
+    return primary.result(), True, False
@@ -0,0 +1,112 @@
+"""
+Time range and sender queries over the manifest index
+Lists the writers of each day partition in the range under manifests/,
+then reads their HEAD, compacted index and deltas; no ListObjects on the
+email archive.
+
+Usage:
+  python -m app.lookup --start 2023-09-01T00:00:00 --end 2023-09-02T00:00:00 \
+      [--sender alice@example.com] [--writer <writer id> ...]
+"""
+
+import argparse
+import json
+import os
+import sys
+from datetime import datetime, timedelta
+from typing import Iterable, Iterator, Optional
+from app import transport
+from app.manifest import (
+    MANIFEST_PREFIX, decode_entries, dedupe, delta_key, index_key, partition_for, read_head,
+    sender_hash, read_object
+)
+
+
+def partitions_between(start_ts: int, end_ts: int) -> list:
+    """Day partitions (YYYY/MM/DD) covering [start_ts, end_ts]"""
+    day = datetime.fromtimestamp(start_ts).replace(hour=0, minute=0, second=0, microsecond=0)
+    last = partition_for(end_ts)
+    partitions = []
+    while True:
+        partition = day.strftime('%Y/%m/%d')
+        partitions.append(partition)
+        if partition >= last:
+            return partitions
+        day += timedelta(days=1)
+
+
+def list_writers(s3, bucket: str, partition: str) -> list:
+    """Writer ids with a manifest in a day partition (one listing of manifests/YYYY/MM/DD/)"""
+    prefix = f"{MANIFEST_PREFIX}/{partition}/"
+    writers = []
+    for page in s3.get_paginator('list_objects_v2').paginate(Bucket=bucket, Prefix=prefix, Delimiter='/'):
+        writers.extend(p['Prefix'][len(prefix):].rstrip('/') for p in page.get('CommonPrefixes', []))
+    return writers
+
+
+def _load_writer(s3, bucket: str, partition: str, writer: str) -> Optional[list]:
+    head = read_head(s3, bucket, partition, writer)
+    keys = [delta_key(partition, writer, seq) for seq in range(head['index'] + 1, head['next'])]
+    if head['index'] >= 0:
+        keys.insert(0, index_key(partition, writer, head['index']))
+    entries = []
+    for key in keys:
+        data = read_object(s3, bucket, key)
+        if data is None:
+            return None  # compacted while reading
+        entries.extend(decode_entries(data))
+    return entries
+
+
+def load_partition(s3, bucket: str, partition: str, writers: Optional[Iterable[str]] = None) -> list:
+    """All manifest entries of a day partition (of every writer unless writers are given)"""
+    entries = []
+    for writer in (writers if writers is not None else list_writers(s3, bucket, partition)):
+        loaded = _load_writer(s3, bucket, partition, writer)
+        if loaded is None:
+            # A compaction replaced the objects HEAD pointed at; HEAD is now newer
+            loaded = _load_writer(s3, bucket, partition, writer) or []
+        entries.extend(loaded)
+    return entries
+
+
+def find(s3, bucket: str, start_ts: int, end_ts: int, sender: Optional[str] = None,
+         writers: Optional[Iterable[str]] = None) -> Iterator[dict]:
+    """
+    Entries with start_ts <= timestamp <= end_ts (optionally from one
+    sender), partition by partition in time order.
+    Each entry is {'h': sender hash, 't': timestamp, 'k': key, 's': size}.
+    """
+    wanted = sender_hash(sender) if sender is not None else None
+    for partition in partitions_between(start_ts, end_ts):
+        yield from dedupe([
+            e for e in load_partition(s3, bucket, partition, writers)
+            if start_ts <= e['t'] <= end_ts and (wanted is None or e['h'] == wanted)
+        ])
+
+
+def _parse_time(value: str) -> int:
+    return int(value) if value.isdigit() else int(datetime.fromisoformat(value).timestamp())
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Query the archived email manifest index")
+    parser.add_argument('--start', required=True, help="Epoch seconds or ISO time")
+    parser.add_argument('--end', required=True, help="Epoch seconds or ISO time")
+    parser.add_argument('--sender')
+    parser.add_argument('--writer', action='append', dest='writers',
+                        help="Only read this manifest writer id; repeatable (default: every writer)")
+    parser.add_argument('--bucket', default=os.getenv('S3_BUCKET_NAME'))
+    args = parser.parse_args(argv)
+    if not args.bucket:
+        parser.error("--bucket or S3_BUCKET_NAME is required")
+
+    s3 = transport.get_client('s3')
+    for entry in find(s3, args.bucket, _parse_time(args.start), _parse_time(args.end),
+                      args.sender, args.writers):
+        sys.stdout.write(json.dumps(entry) + '\n')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
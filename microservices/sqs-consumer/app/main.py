@@ -6,13 +6,25 @@ Polls SQS messages and uploads them to S3
 import os
 import json
 import logging
+import signal
+import threading
 import time
-from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 from typing import Optional
-import boto3
-from botocore.exceptions import ClientError
-from prometheus_client import Counter, Histogram, Gauge, start_http_server, generate_latest
+from botocore.exceptions import ClientError, ConnectionError as BotoConnectionError, HTTPClientError
+from socketserver import ThreadingMixIn
+from urllib.parse import parse_qs
+from wsgiref.simple_server import make_server, WSGIServer, WSGIRequestHandler
+from prometheus_client import Counter, Histogram, Gauge, make_wsgi_app, generate_latest
 from prometheus_client.core import CollectorRegistry
+from app import transport, envelope, profiler
+from app.throttle import AIMDLimiter, backoff_delay
+from app.hedge import LatencyTracker, HedgeBudget, hedged_call
+from app.lanes import Lane, load_lanes, WeightedLaneScheduler
+from app.partitions import PartitionScheduler
+from app.manifest import ManifestWriter, default_writer_id
+from app.record import EmailRecord, build_s3_key
 
 # Configure logging
 logging.basicConfig(
@@ -26,27 +38,78 @@ SQS_QUEUE_URL = os.getenv('SQS_QUEUE_URL')
 S3_BUCKET_NAME = os.getenv('S3_BUCKET_NAME')
 SQS_POLL_INTERVAL = int(os.getenv('SQS_POLL_INTERVAL', '30'))
 AWS_REGION = os.getenv('AWS_REGION', 'us-west-1')
+# Priority lanes as JSON [{"name": "high", "queue_url": "<url>", "weight": 6}];
+# SQS_QUEUE_URL is polled as the default lane
+SQS_LANES = os.getenv('SQS_LANES', '')
+SQS_DEFAULT_LANE = os.getenv('SQS_DEFAULT_LANE', 'default')
+# Long-poll wait per receive when polling several lanes (keeps lanes from starving each other)
+SQS_LANE_WAIT_SECONDS = int(os.getenv('SQS_LANE_WAIT_SECONDS', '1'))
+CONSUMER_WORKERS = int(os.getenv('CONSUMER_WORKERS', '10'))
+# FIFO lanes: max messages queued across groups before the next receive
+FIFO_MAX_PENDING = int(os.getenv('FIFO_MAX_PENDING', str(CONSUMER_WORKERS * 10)))
+S3_MIN_CONCURRENCY = int(os.getenv('S3_MIN_CONCURRENCY', '1'))
+S3_MAX_CONCURRENCY = int(os.getenv('S3_MAX_CONCURRENCY', '10'))
+S3_MAX_ATTEMPTS = int(os.getenv('S3_MAX_ATTEMPTS', '4'))
+S3_RETRY_BASE_DELAY = float(os.getenv('S3_RETRY_BASE_DELAY', '0.1'))
+S3_RETRY_MAX_DELAY = float(os.getenv('S3_RETRY_MAX_DELAY', '5'))
+S3_HEDGE_ENABLED = os.getenv('S3_HEDGE_ENABLED', 'false').lower() == 'true'
+S3_HEDGE_PERCENTILE = float(os.getenv('S3_HEDGE_PERCENTILE', '95'))
+S3_HEDGE_BUDGET = float(os.getenv('S3_HEDGE_BUDGET', '0.05'))
+# No hedges for this many seconds after S3 throttles
+S3_HEDGE_THROTTLE_PAUSE = float(os.getenv('S3_HEDGE_THROTTLE_PAUSE', '10'))
+# Per-partition manifest index of uploaded emails (see app/manifest.py)
+MANIFEST_ENABLED = os.getenv('MANIFEST_ENABLED', 'false').lower() == 'true'
+# Unique per task; defaults to the ECS task id or hostname (see default_writer_id)
+MANIFEST_WRITER_ID = os.getenv('MANIFEST_WRITER_ID', '')
+MANIFEST_FLUSH_ENTRIES = int(os.getenv('MANIFEST_FLUSH_ENTRIES', '500'))
+MANIFEST_FLUSH_SECONDS = float(os.getenv('MANIFEST_FLUSH_SECONDS', '30'))
+MANIFEST_COMPACT_EVERY = int(os.getenv('MANIFEST_COMPACT_EVERY', '20'))
+# Admin value for /debug routes on the metrics port; disabled when unset
+SSM_ADMIN_TOKEN_PARAMETER = os.getenv('SSM_ADMIN_TOKEN_PARAMETER')
+ADMIN_CACHE_TTL = 300  # 5 minutes
+
+# Error codes S3 uses to signal request-rate throttling
+S3_THROTTLE_ERROR_CODES = {'SlowDown', '503', 'ServiceUnavailable', 'RequestLimitExceeded',
+                           'Throttling', 'ThrottlingException', 'TooManyRequestsException'}
+# Transient S3 errors retried without shrinking the concurrency limit (plus any other 5xx)
+S3_TRANSIENT_ERROR_CODES = {'InternalError', 'RequestTimeout'}
 
 # AWS clients (initialized lazily to allow testing)
 sqs_client = None
 s3_client = None
+_client_lock = threading.Lock()
 
 
 def get_sqs_client():
     """Get or create SQS client"""
     global sqs_client
     if sqs_client is None:
-        sqs_client = boto3.client('sqs', region_name=AWS_REGION)
+        sqs_client = transport.get_client('sqs')
     return sqs_client
 
 
 def get_s3_client():
-    """Get or create S3 client"""
+    """
+    Get or create the S3 client for email PUTs
+    botocore retries are disabled: put_object_adaptive is the only retry
+    and backoff policy, so the AIMD limiter sees every throttle.
+    """
     global s3_client
     if s3_client is None:
-        s3_client = boto3.client('s3', region_name=AWS_REGION)
+        s3_client = transport.get_client('s3', max_attempts=1)
     return s3_client
 
+
+def prewarm_clients():
+    """
+    Open pooled SQS and S3 connections before the first poll
+    """
+    transport.prewarm(
+        get_sqs_client(),
+        lambda c: c.get_queue_attributes(QueueUrl=SQS_QUEUE_URL, AttributeNames=['QueueArn'])
+    )
+    transport.prewarm(get_s3_client(), lambda c: c.head_bucket(Bucket=S3_BUCKET_NAME))
+
 # Prometheus metrics
 REGISTRY = CollectorRegistry()
 
@@ -56,6 +119,12 @@ MESSAGES_PROCESSED = Counter(
     registry=REGISTRY
 )
 
+MESSAGES_REPLAY_SKIPPED = Counter(
+    'sqs_messages_replay_skipped_total',
+    'Total number of replayed archive messages not archived again',
+    registry=REGISTRY
+)
+
 MESSAGES_FAILED = Counter(
     'sqs_messages_failed_total',
     'Total number of messages that failed processing',
@@ -86,25 +155,132 @@ QUEUE_MESSAGES_VISIBLE = Gauge(
     registry=REGISTRY
 )
 
+STAGE_DURATION = Histogram(
+    'message_stage_duration_seconds',
+    'Time spent in each stage of the consumer pipeline',
+    ['stage'],
+    registry=REGISTRY
+)
+
+RECEIVED_BATCH_SIZE = Histogram(
+    'sqs_received_batch_size',
+    'Number of messages returned by a single receive call',
+    buckets=(0, 1, 2, 3, 4, 5, 6, 7, 8, 9, 10),
+    registry=REGISTRY
+)
+
+MESSAGES_IN_FLIGHT = Gauge(
+    'sqs_messages_in_flight',
+    'Number of messages currently being processed',
+    registry=REGISTRY
+)
+
+S3_THROTTLED = Counter(
+    's3_throttled_total',
+    'Total number of S3 PUTs rejected with a throttling response',
+    registry=REGISTRY
+)
+
+S3_CONCURRENCY_LIMIT = Gauge(
+    's3_concurrency_limit',
+    'Current adaptive concurrency limit for S3 writes',
+    registry=REGISTRY
+)
+
+S3_HEDGES_FIRED = Counter(
+    's3_hedges_fired_total',
+    'Total number of duplicate (hedged) S3 PUTs started',
+    registry=REGISTRY
+)
+
+S3_HEDGES_WON = Counter(
+    's3_hedges_won_total',
+    'Total number of hedged S3 PUTs that completed before the original',
+    registry=REGISTRY
+)
+
+LANE_MESSAGES_RECEIVED = Counter(
+    'sqs_lane_messages_received_total',
+    'Total number of messages received per priority lane',
+    ['lane'],
+    registry=REGISTRY
+)
+
+LANE_MESSAGES_PROCESSED = Counter(
+    'sqs_lane_messages_processed_total',
+    'Total number of messages processed per priority lane',
+    ['lane'],
+    registry=REGISTRY
+)
+
+LANE_MESSAGES_VISIBLE = Gauge(
+    'sqs_lane_messages_visible',
+    'Number of visible messages per priority lane queue',
+    ['lane'],
+    registry=REGISTRY
+)
+
+END_TO_END_LAG = Histogram(
+    'message_end_to_end_lag_seconds',
+    'Time from SQS SentTimestamp to S3 upload completion',
+    ['lane'],
+    buckets=(0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800, 3600),
+    registry=REGISTRY
+)
+
+# Adaptive (AIMD) limiter shared by all S3 writers
+s3_limiter = AIMDLimiter(
+    initial=S3_MAX_CONCURRENCY,
+    minimum=S3_MIN_CONCURRENCY,
+    maximum=S3_MAX_CONCURRENCY
+)
+S3_CONCURRENCY_LIMIT.set(s3_limiter.limit)
+
+# Hedging state (only used when S3_HEDGE_ENABLED)
+s3_latency_tracker = LatencyTracker(percentile=S3_HEDGE_PERCENTILE)
+s3_hedge_budget = HedgeBudget(ratio=S3_HEDGE_BUDGET)
+s3_hedge_executor = None
+s3_last_throttle = float('-inf')
+
+# Manifest writer (only used when MANIFEST_ENABLED)
+manifest_writer = None
+
+
+def get_manifest_writer() -> ManifestWriter:
+    """Get or create the manifest writer"""
+    global manifest_writer
+    if manifest_writer is None:
+        with _client_lock:
+            if manifest_writer is None:
+                manifest_writer = ManifestWriter(
+                    transport.get_client('s3'), S3_BUCKET_NAME, MANIFEST_WRITER_ID or default_writer_id(),
+                    flush_entries=MANIFEST_FLUSH_ENTRIES,
+                    flush_seconds=MANIFEST_FLUSH_SECONDS,
+                    compact_every=MANIFEST_COMPACT_EVERY
+                )
+    return manifest_writer
+
 
 def generate_s3_key(email_data: dict) -> str:
     """
     Generate S3 key for storing email data
     Format: emails/YYYY/MM/DD/email-{timestamp}-{sender_hash}.json
     """
+    return _s3_key(email_data.get('email_timestamp'), email_data.get('email_sender', 'unknown'))
+
+
+def generate_record_s3_key(record: EmailRecord) -> str:
+    """generate_s3_key from the key inputs EmailRecord read at parse time"""
+    return _s3_key(record.timestamp, record.sender)
+
+
+def _s3_key(timestamp: Optional[str], sender: str) -> str:
     try:
-        timestamp = email_data.get('email_timestamp', str(int(time.time())))
-        sender = email_data.get('email_sender', 'unknown')
-        
-        # Create date-based path
-        dt = datetime.fromtimestamp(int(timestamp))
-        date_path = dt.strftime('%Y/%m/%d')
-        
-        # Create unique filename
-        sender_hash = hash(sender) % 10000
-        filename = f"email-{timestamp}-{sender_hash}.json"
+        if timestamp is None:
+            timestamp = str(int(time.time()))
         
-        return f"emails/{date_path}/{filename}"
+        # Date path is cached per day
+        return build_s3_key(timestamp, sender)
     except Exception as e:
         logger.error(f"Error generating S3 key: {e}")
         # Fallback to timestamp-based key
@@ -112,26 +288,116 @@ def generate_s3_key(email_data: dict) -> str:
         return f"emails/{timestamp}/email-{timestamp}.json"
 
 
-def upload_to_s3(data: dict, s3_key: str) -> bool:
+def is_throttle_error(error: ClientError) -> bool:
+    """
+    Check whether a ClientError is an S3 throttling (SlowDown/503) response
+    """
+    code = error.response.get('Error', {}).get('Code')
+    status = error.response.get('ResponseMetadata', {}).get('HTTPStatusCode')
+    return code in S3_THROTTLE_ERROR_CODES or status == 503
+
+
+def is_transient_error(error: ClientError) -> bool:
+    """
+    Check whether a non-throttle ClientError is worth retrying (5xx, RequestTimeout)
+    """
+    code = error.response.get('Error', {}).get('Code')
+    status = error.response.get('ResponseMetadata', {}).get('HTTPStatusCode') or 0
+    return code in S3_TRANSIENT_ERROR_CODES or status >= 500
+
+
+def put_object_adaptive(**kwargs):
+    """
+    Call S3 put_object under the AIMD limiter. botocore retries are off for
+    this client, so this loop is the only retry: throttle responses shrink
+    the limit, and throttles, transient 5xx and connection errors are
+    retried with jittered backoff. Re-raises the final error.
+    """
+    global s3_last_throttle
+    for attempt in range(S3_MAX_ATTEMPTS):
+        with s3_limiter.slot() as epoch:
+            try:
+                response = put_object_hedged(**kwargs)
+            except ClientError as e:
+                if is_throttle_error(e):
+                    s3_last_throttle = time.monotonic()
+                    S3_THROTTLED.inc()
+                    s3_limiter.on_throttle(epoch)
+                    S3_CONCURRENCY_LIMIT.set(s3_limiter.limit)
+                elif not is_transient_error(e):
+                    raise
+                if attempt == S3_MAX_ATTEMPTS - 1:
+                    raise
+                logger.warning(
+                    f"S3 PUT failed on {kwargs.get('Key')} (attempt {attempt + 1}): {e}; "
+                    f"concurrency limit {s3_limiter.limit}"
+                )
+            except (BotoConnectionError, HTTPClientError) as e:
+                if attempt == S3_MAX_ATTEMPTS - 1:
+                    raise
+                logger.warning(f"S3 connection error on {kwargs.get('Key')} (attempt {attempt + 1}): {e}")
+            else:
+                s3_limiter.on_success()
+                S3_CONCURRENCY_LIMIT.set(s3_limiter.limit)
+                return response
+        # Back off outside the slot so other writers can proceed
+        time.sleep(backoff_delay(attempt, S3_RETRY_BASE_DELAY, S3_RETRY_MAX_DELAY))
+
+
+def get_hedge_executor() -> ThreadPoolExecutor:
+    """Get or create the executor running hedged S3 PUTs"""
+    global s3_hedge_executor
+    if s3_hedge_executor is None:
+        with _client_lock:
+            if s3_hedge_executor is None:
+                s3_hedge_executor = ThreadPoolExecutor(
+                    max_workers=2 * S3_MAX_CONCURRENCY,
+                    thread_name_prefix='s3-hedge'
+                )
+    return s3_hedge_executor
+
+
+def put_object_hedged(**kwargs):
+    """
+    One raw put_object attempt (called inside a limiter slot), with an
+    optional hedge once it exceeds the tracked PUT latency percentile.
+    Safe because S3 keys are deterministic. Hedging pauses while S3 is
+    throttling so duplicates never add load the limiter is shedding.
+    """
+    if not S3_HEDGE_ENABLED or time.monotonic() - s3_last_throttle < S3_HEDGE_THROTTLE_PAUSE:
+        return get_s3_client().put_object(**kwargs)
+    
+    response, fired, won = hedged_call(
+        get_hedge_executor(), s3_latency_tracker, s3_hedge_budget,
+        get_s3_client().put_object, **kwargs
+    )
+    if fired:
+        S3_HEDGES_FIRED.inc()
+    if won:
+        S3_HEDGES_WON.inc()
+    return response
+
+
+def upload_to_s3(data: dict, s3_key: str, payload: Optional[bytes] = None) -> bool:
     """
     Upload email data to S3 bucket
+    payload: the JSON bytes to store; serialized from data when not given
     """
     try:
-        # Convert data to JSON string
-        json_data = json.dumps(data, indent=2)
+        if payload is None:
+            payload = json.dumps(data, indent=2).encode('utf-8')
         
         # Upload to S3
-        get_s3_client().put_object(
+        put_object_adaptive(
             Bucket=S3_BUCKET_NAME,
             Key=s3_key,
-            Body=json_data.encode('utf-8'),
+            Body=payload,
             ContentType='application/json',
             ServerSideEncryption='AES256'
         )
         
         logger.info(f"Successfully uploaded to S3: s3://{S3_BUCKET_NAME}/{s3_key}")
         S3_UPLOADS_SUCCESS.inc()
-        return True
     except ClientError as e:
         logger.error(f"Error uploading to S3: {e}")
         S3_UPLOADS_FAILED.inc()
@@ -140,28 +406,76 @@ def upload_to_s3(data: dict, s3_key: str) -> bool:
         logger.error(f"Unexpected error uploading to S3: {e}")
         S3_UPLOADS_FAILED.inc()
         return False
+    # Outside the try: the object is stored, so a manifest problem must
+    # not report the upload as failed
+    if MANIFEST_ENABLED:
+        record_manifest_entry(data, s3_key, len(payload))
+    return True
+
+
+def record_manifest_entry(data: dict, s3_key: str, size: int):
+    """
+    Add an uploaded email to the manifest index; never fails the upload
+    """
+    try:
+        get_manifest_writer().record(
+            s3_key, data.get('email_sender', 'unknown'), int(data['email_timestamp']), size
+        )
+    except Exception as e:
+        logger.warning(f"Skipping manifest entry for {s3_key}: {e}")
 
 
-def process_message(message: dict) -> bool:
+def observe_end_to_end_lag(record: EmailRecord, lane: str = SQS_DEFAULT_LANE):
+    """
+    Record the lag between the SQS SentTimestamp (epoch millis) and now
+    """
+    sent_timestamp = record.sent_timestamp
+    if not sent_timestamp:
+        return
+    try:
+        lag = time.time() - int(sent_timestamp) / 1000.0
+        END_TO_END_LAG.labels(lane=lane).observe(max(lag, 0.0))
+    except (TypeError, ValueError) as e:
+        logger.warning(f"Invalid SentTimestamp on message {record.message_id}: {e}")
+
+
+def process_message(message: dict, lane: str = SQS_DEFAULT_LANE) -> bool:
     """
     Process a single SQS message
     Returns True if successful, False otherwise
     """
+    with MESSAGES_IN_FLIGHT.track_inprogress():
+        return _process_message(message, lane)
+
+
+def _process_message(message: dict, lane: str) -> bool:
     start_time = time.time()
     
     try:
-        # Parse message body
-        body = json.loads(message['Body'])
+        # Parse message body (once; JSON bodies are uploaded as received)
+        with STAGE_DURATION.labels(stage='parse').time():
+            record = EmailRecord.from_message(message)
+        
+        if record.replayed:
+            # Already archived: writing it again would duplicate the object
+            # (and its manifest entry) under a new key
+            MESSAGES_REPLAY_SKIPPED.inc()
+            logger.info(f"Replayed message already archived, skipping upload: {message['MessageId']}")
+            return True
         
         # Generate S3 key
-        s3_key = generate_s3_key(body)
+        with STAGE_DURATION.labels(stage='key').time():
+            s3_key = generate_record_s3_key(record)
         
         # Upload to S3
-        success = upload_to_s3(body, s3_key)
+        with STAGE_DURATION.labels(stage='upload').time():
+            success = upload_to_s3(record.data, s3_key, record.payload)
         
         if success:
             duration = time.time() - start_time
             PROCESSING_DURATION.observe(duration)
+            observe_end_to_end_lag(record, lane)
+            LANE_MESSAGES_PROCESSED.labels(lane=lane).inc()
             MESSAGES_PROCESSED.inc()
             logger.info(f"Message processed successfully: {message['MessageId']}")
             return True
@@ -170,7 +484,7 @@ def process_message(message: dict) -> bool:
             logger.error(f"Failed to process message: {message['MessageId']}")
             return False
             
-    except json.JSONDecodeError as e:
+    except (json.JSONDecodeError, envelope.EnvelopeError) as e:
         logger.error(f"Error parsing message body: {e}")
         MESSAGES_FAILED.inc()
         return False
@@ -180,28 +494,29 @@ def process_message(message: dict) -> bool:
         return False
 
 
-def delete_message(receipt_handle: str) -> bool:
+def delete_message(receipt_handle: str, queue_url: Optional[str] = None) -> bool:
     """
     Delete processed message from SQS queue
     """
     try:
-        get_sqs_client().delete_message(
-            QueueUrl=SQS_QUEUE_URL,
-            ReceiptHandle=receipt_handle
-        )
+        with STAGE_DURATION.labels(stage='delete').time():
+            get_sqs_client().delete_message(
+                QueueUrl=queue_url or SQS_QUEUE_URL,
+                ReceiptHandle=receipt_handle
+            )
         return True
     except ClientError as e:
         logger.error(f"Error deleting message from SQS: {e}")
         return False
 
 
-def get_queue_attributes() -> dict:
+def get_queue_attributes(queue_url: Optional[str] = None) -> dict:
     """
     Get SQS queue attributes for monitoring
     """
     try:
         response = get_sqs_client().get_queue_attributes(
-            QueueUrl=SQS_QUEUE_URL,
+            QueueUrl=queue_url or SQS_QUEUE_URL,
             AttributeNames=['ApproximateNumberOfMessages']
         )
         return response.get('Attributes', {})
@@ -210,20 +525,43 @@ def get_queue_attributes() -> dict:
         return {}
 
 
-def poll_sqs() -> list:
+def handle_message(message: dict, lane: Optional[Lane] = None) -> bool:
+    """
+    Process a single message and delete it from its lane queue on success
+    """
+    lane_name = lane.name if lane else SQS_DEFAULT_LANE
+    success = process_message(message, lane_name)
+    
+    # Delete message if processed successfully
+    if success:
+        delete_message(message['ReceiptHandle'], lane.queue_url if lane else None)
+    else:
+        # If processing failed, message will become visible again after visibility timeout
+        logger.warning(f"Message processing failed, will retry: {message['MessageId']}")
+    return success
+
+
+def poll_sqs(queue_url: Optional[str] = None, wait_time_seconds: int = 20) -> list:
     """
     Poll SQS queue for messages
     Returns list of messages
     """
     try:
+        start_time = time.monotonic()
         response = get_sqs_client().receive_message(
-            QueueUrl=SQS_QUEUE_URL,
+            QueueUrl=queue_url or SQS_QUEUE_URL,
             MaxNumberOfMessages=10,
-            WaitTimeSeconds=20,  # Long polling
+            WaitTimeSeconds=wait_time_seconds,  # Long polling
+            AttributeNames=['SentTimestamp', 'MessageGroupId'],
             MessageAttributeNames=['All']
         )
         
         messages = response.get('Messages', [])
+        # An empty poll lasts the whole long-poll wait: keep it out of 'receive'
+        STAGE_DURATION.labels(stage='receive' if messages else 'receive_empty').observe(
+            time.monotonic() - start_time
+        )
+        RECEIVED_BATCH_SIZE.observe(len(messages))
         if messages:
             logger.info(f"Received {len(messages)} messages from SQS")
         
@@ -236,61 +574,171 @@ def poll_sqs() -> list:
         return []
 
 
+def _handle_sigterm(signum, frame):
+    # ECS stops tasks with SIGTERM: shut down as on Ctrl-C, flushing the manifest;
+    # a repeated SIGTERM must not interrupt that flush
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)
+    raise KeyboardInterrupt
+
+
 def process_messages():
     """
     Main processing loop: poll SQS, process messages, upload to S3
     """
     # Validate required environment variables
-    if not SQS_QUEUE_URL:
+    if not SQS_QUEUE_URL and not SQS_LANES:
         raise ValueError("SQS_QUEUE_URL environment variable is required")
     if not S3_BUCKET_NAME:
         raise ValueError("S3_BUCKET_NAME environment variable is required")
     
+    lanes = load_lanes(SQS_LANES, SQS_QUEUE_URL, SQS_DEFAULT_LANE)
+    scheduler = WeightedLaneScheduler(lanes)
+    # A single lane keeps full long polling; several lanes use short waits
+    wait_time_seconds = 20 if len(lanes) == 1 else SQS_LANE_WAIT_SECONDS
+    
     logger.info("Starting SQS consumer service")
     logger.info(f"SQS Queue URL: {SQS_QUEUE_URL}")
+    logger.info(f"Lanes: {lanes}")
     logger.info(f"S3 Bucket: {S3_BUCKET_NAME}")
     logger.info(f"Poll Interval: {SQS_POLL_INTERVAL} seconds")
+    logger.info(f"Workers: {CONSUMER_WORKERS}, S3 concurrency: {S3_MIN_CONCURRENCY}-{S3_MAX_CONCURRENCY}")
+    
+    signal.signal(signal.SIGTERM, _handle_sigterm)
+    prewarm_clients()
+    executor = ThreadPoolExecutor(max_workers=CONSUMER_WORKERS, thread_name_prefix='consumer')
+    partitions = PartitionScheduler(executor, lambda item: handle_message(*item))
     
     while True:
         try:
             # Update queue metrics
-            queue_attrs = get_queue_attributes()
-            visible_messages = int(queue_attrs.get('ApproximateNumberOfMessages', 0))
-            QUEUE_MESSAGES_VISIBLE.set(visible_messages)
+            visible_total = 0
+            for lane in lanes:
+                queue_attrs = get_queue_attributes(lane.queue_url)
+                visible_messages = int(queue_attrs.get('ApproximateNumberOfMessages', 0))
+                LANE_MESSAGES_VISIBLE.labels(lane=lane.name).set(visible_messages)
+                visible_total += visible_messages
+            QUEUE_MESSAGES_VISIBLE.set(visible_total)
             
-            # Poll for messages
-            messages = poll_sqs()
+            # Poll lanes in weighted fair order
+            for lane in scheduler.round():
+                messages = poll_sqs(lane.queue_url, wait_time_seconds)
+                if not messages:
+                    scheduler.mark_empty(lane)
+                    continue
+                LANE_MESSAGES_RECEIVED.labels(lane=lane.name).inc(len(messages))
+                
+                if lane.fifo:
+                    # Groups run concurrently, each group in order; don't wait for the batch
+                    for message in messages:
+                        group = message.get('Attributes', {}).get('MessageGroupId')
+                        partitions.submit(group, (message, lane))
+                    partitions.wait_for_capacity(FIFO_MAX_PENDING)
+                    continue
+                
+                # Process the batch concurrently; S3 writes are gated by the AIMD limiter
+                list(executor.map(partial(handle_message, lane=lane), messages))
             
-            if messages:
-                for message in messages:
-                    # Process message
-                    success = process_message(message)
-                    
-                    # Delete message if processed successfully
-                    if success:
-                        delete_message(message['ReceiptHandle'])
-                    else:
-                        # If processing failed, message will become visible again after visibility timeout
-                        logger.warning(f"Message processing failed, will retry: {message['MessageId']}")
+            if MANIFEST_ENABLED:
+                get_manifest_writer().maybe_flush()
             
             # Wait before next poll
             time.sleep(SQS_POLL_INTERVAL)
             
         except KeyboardInterrupt:
-            logger.info("Received interrupt signal, shutting down...")
+            logger.info("Received interrupt or termination signal, shutting down...")
+            executor.shutdown(wait=True)
+            if MANIFEST_ENABLED:
+                get_manifest_writer().flush()
             break
         except Exception as e:
             logger.error(f"Unexpected error in processing loop: {e}")
             time.sleep(SQS_POLL_INTERVAL)
 
 
+_admin_cache = None
+_admin_cache_time = 0
+
+
+def validate_admin_token(token: Optional[str]) -> bool:
+    """
+    Validate an admin value against SSM_ADMIN_TOKEN_PARAMETER (cached)
+    """
+    global _admin_cache, _admin_cache_time
+    if not SSM_ADMIN_TOKEN_PARAMETER or not token:
+        return False
+    
+    current_time = time.time()
+    if not _admin_cache or (current_time - _admin_cache_time) >= ADMIN_CACHE_TTL:
+        try:
+            response = transport.get_client('ssm').get_parameter(
+                Name=SSM_ADMIN_TOKEN_PARAMETER,
+                WithDecryption=True
+            )
+        except ClientError as e:
+            logger.error(f"Error retrieving admin value from SSM: {e}")
+            return False
+        _admin_cache = response['Parameter']['Value']
+        _admin_cache_time = current_time
+    return token == _admin_cache
+
+
+def debug_profile_app(environ, start_response):
+    """
+    WSGI handler for /debug/profile?seconds=N (admin-only)
+    Returns collapsed stacks sampled from this process
+    """
+    def respond(status, body):
+        start_response(status, [('Content-Type', 'text/plain; charset=utf-8')])
+        return [body.encode('utf-8')]
+    
+    if not SSM_ADMIN_TOKEN_PARAMETER:
+        return respond('404 Not Found', 'Not Found\n')
+    if not validate_admin_token(environ.get('HTTP_X_ADMIN_TOKEN')):
+        return respond('403 Forbidden', 'Invalid admin value\n')
+    
+    try:
+        query = parse_qs(environ.get('QUERY_STRING', ''))
+        seconds = float(query.get('seconds', ['10'])[0])
+        return respond('200 OK', profiler.profile(seconds))
+    except ValueError as e:
+        return respond('400 Bad Request', f"{e}\n")
+    except profiler.ProfilerBusy as e:
+        return respond('409 Conflict', f"{e}\n")
+
+
+def make_metrics_app():
+    """
+    WSGI app serving Prometheus metrics plus the /debug/profile trigger
+    """
+    metrics_app = make_wsgi_app(REGISTRY)
+    
+    def app(environ, start_response):
+        if environ.get('PATH_INFO') == '/debug/profile':
+            return debug_profile_app(environ, start_response)
+        return metrics_app(environ, start_response)
+    
+    return app
+
+
+class _ThreadingWSGIServer(ThreadingMixIn, WSGIServer):
+    """Serve each request in its own thread so profiling does not block scrapes"""
+    daemon_threads = True
+
+
+class _SilentHandler(WSGIRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
 def start_metrics_server():
     """
     Start Prometheus metrics server
     """
     try:
         metrics_port = int(os.getenv('METRICS_PORT', '9090'))
-        start_http_server(metrics_port, registry=REGISTRY)
+        httpd = make_server('', metrics_port, make_metrics_app(),
+                            _ThreadingWSGIServer, handler_class=_SilentHandler)
+        threading.Thread(target=httpd.serve_forever, daemon=True).start()
         logger.info(f"Prometheus metrics server started on port {metrics_port}")
     except Exception as e:
         logger.error(f"Error starting metrics server: {e}")
@@ -298,7 +746,6 @@ def start_metrics_server():
 
 if __name__ == "__main__":
     # Start metrics server in a separate thread
-    import threading
     metrics_thread = threading.Thread(target=start_metrics_server, daemon=True)
     metrics_thread.start()
     
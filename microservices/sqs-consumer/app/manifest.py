@@ -0,0 +1,266 @@
+"""
+Per-partition manifest index over archived emails
+Each day partition (emails/YYYY/MM/DD/) gets a manifest of
+(sender hash, timestamp, key, size) entries, so lookups read a few
+small objects instead of listing and fetching every email.
+
+Layout, per writer (one per consumer task; readers discover writers by
+listing manifests/YYYY/MM/DD/):
+  manifests/YYYY/MM/DD/{writer}/HEAD.json           {"index": i, "next": n}
+  manifests/YYYY/MM/DD/{writer}/index-{i:06d}.jsonl  compacted deltas 0..i, sorted by time
+  manifests/YYYY/MM/DD/{writer}/delta-{n:06d}.jsonl  entries flushed since the index
+
+Every object is immutable apart from HEAD, which is written last, so a
+reader following HEAD always sees a consistent set of objects.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import socket
+import threading
+import time
+import urllib.request
+from datetime import datetime
+from typing import Optional
+from botocore.exceptions import ClientError
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_PREFIX = 'manifests'
+
+
+def sender_hash(sender: str) -> str:
+    """
+    Stable sender hash for manifest entries. The hash in the email key
+    comes from Python's per-process hash(), so it cannot be recomputed.
+    """
+    return hashlib.sha256(sender.strip().lower().encode('utf-8')).hexdigest()[:16]
+
+
+def default_writer_id() -> str:
+    """
+    Writer id unique per running task, so overlapping deployments never
+    write the same HEAD: the ECS task id when the task metadata endpoint is
+    available, otherwise the hostname
+    """
+    metadata_uri = os.getenv('ECS_CONTAINER_METADATA_URI_V4')
+    if metadata_uri:
+        try:
+            with urllib.request.urlopen(f"{metadata_uri}/task", timeout=2) as response:
+                return json.load(response)['TaskARN'].rsplit('/', 1)[-1]
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning(f"Could not read the ECS task id, using the hostname: {e}")
+    return socket.gethostname()
+
+
+def partition_for(timestamp: int) -> str:
+    """Date partition (YYYY/MM/DD), matching generate_s3_key"""
+    return datetime.fromtimestamp(timestamp).strftime('%Y/%m/%d')
+
+
+def head_key(partition: str, writer: str) -> str:
+    return f"{MANIFEST_PREFIX}/{partition}/{writer}/HEAD.json"
+
+
+def index_key(partition: str, writer: str, seq: int) -> str:
+    return f"{MANIFEST_PREFIX}/{partition}/{writer}/index-{seq:06d}.jsonl"
+
+
+def delta_key(partition: str, writer: str, seq: int) -> str:
+    return f"{MANIFEST_PREFIX}/{partition}/{writer}/delta-{seq:06d}.jsonl"
+
+
+def encode_entries(entries: list) -> bytes:
+    """One compact JSON object per line"""
+    return ''.join(json.dumps(e, separators=(',', ':')) + '\n' for e in entries).encode('utf-8')
+
+
+def decode_entries(data: bytes) -> list:
+    return [json.loads(line) for line in data.decode('utf-8').splitlines() if line]
+
+
+def dedupe(entries: list) -> list:
+    """
+    One entry per key (a redelivered message overwrites the same object;
+    the latest entry wins), sorted by time
+    """
+    return sorted({e['k']: e for e in entries}.values(), key=lambda e: (e['t'], e['k']))
+
+
+def _is_missing(error: ClientError) -> bool:
+    return error.response.get('Error', {}).get('Code') in ('NoSuchKey', '404', 'NotFound')
+
+
+def read_object(s3, bucket: str, key: str) -> Optional[bytes]:
+    """Object body, or None if it does not exist"""
+    try:
+        return s3.get_object(Bucket=bucket, Key=key)['Body'].read()
+    except ClientError as e:
+        if _is_missing(e):
+            return None
+        raise
+
+
+def read_head(s3, bucket: str, partition: str, writer: str) -> dict:
+    """HEAD of a writer's manifest; index -1 means nothing compacted yet"""
+    data = read_object(s3, bucket, head_key(partition, writer))
+    return json.loads(data) if data else {'index': -1, 'next': 0}
+
+
+class _PartitionState:
+    __slots__ = ('buffer', 'index', 'next', 'last_write')
+
+    def __init__(self, now: float):
+        self.buffer = []
+        self.index = None  # None until HEAD has been read
+        self.next = None
+        self.last_write = now
+
+
+class ManifestWriter:
+    """
+    Buffers manifest entries per partition and flushes them as delta
+    objects; once a partition has `compact_every` deltas beyond its index
+    they are merged into a new index and the old objects are deleted.
+    Manifest failures are logged and retried on the next flush; they
+    never fail message processing.
+    """
+
+    def __init__(self, s3, bucket: str, writer: str, flush_entries: int = 500,
+                 flush_seconds: float = 30, compact_every: int = 20, clock=time.monotonic):
+        self.s3 = s3
+        self.bucket = bucket
+        self.writer = writer
+        self.flush_entries = flush_entries
+        self.flush_seconds = flush_seconds
+        self.compact_every = compact_every
+        self._clock = clock
+        self._partitions = {}
+        self._last_flush = clock()
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+
+    def record(self, key: str, sender: str, timestamp: int, size: int):
+        """Buffer an entry for an uploaded email (no I/O)"""
+        entry = {'h': sender_hash(sender), 't': timestamp, 'k': key, 's': size}
+        partition = partition_for(timestamp)
+        now = self._clock()
+        with self._lock:
+            state = self._partitions.get(partition)
+            if state is None:
+                state = self._partitions[partition] = _PartitionState(now)
+            state.buffer.append(entry)
+            state.last_write = now
+
+    def pending(self) -> int:
+        """Entries not yet flushed"""
+        with self._lock:
+            return sum(len(s.buffer) for s in self._partitions.values())
+
+    def flush_due(self) -> bool:
+        """Whether enough entries or time have accumulated for a flush"""
+        pending = self.pending()
+        return pending >= self.flush_entries or (
+            pending > 0 and self._clock() - self._last_flush >= self.flush_seconds
+        )
+
+    def maybe_flush(self):
+        """Flush if due; called from the poll loop"""
+        if self.flush_due():
+            self.flush()
+
+    def flush(self):
+        """Write buffered entries of every partition as deltas"""
+        with self._flush_lock:
+            self._last_flush = self._clock()
+            with self._lock:
+                partitions = list(self._partitions.items())
+            for partition, state in partitions:
+                self._flush_partition(partition, state)
+            self._forget_idle()
+
+    def _flush_partition(self, partition: str, state: _PartitionState):
+        with self._lock:
+            entries, state.buffer = state.buffer, []
+        if not entries:
+            return
+        try:
+            if state.index is None:
+                # First flush for this partition since start: resume its sequence
+                head = read_head(self.s3, self.bucket, partition, self.writer)
+                state.index, state.next = head['index'], head['next']
+            self._put(delta_key(partition, self.writer, state.next), encode_entries(entries))
+        except Exception as e:
+            logger.error(f"Error flushing manifest for {partition}: {e}")
+            with self._lock:
+                state.buffer[:0] = entries
+            return
+        state.next += 1
+        try:
+            self._put_head(partition, state.index, state.next)
+        except Exception as e:
+            # The delta is written; the next successful HEAD write covers it
+            logger.error(f"Error updating manifest head for {partition}: {e}")
+            return
+        if state.next - 1 - state.index >= self.compact_every:
+            self.compact(partition, state)
+
+    def compact(self, partition: str, state: _PartitionState):
+        """Merge the index and all deltas into a new index"""
+        try:
+            entries = []
+            if state.index >= 0:
+                entries.extend(decode_entries(
+                    read_object(self.s3, self.bucket, index_key(partition, self.writer, state.index)) or b''
+                ))
+            merged = range(state.index + 1, state.next)
+            for seq in merged:
+                data = read_object(self.s3, self.bucket, delta_key(partition, self.writer, seq))
+                if data:
+                    entries.extend(decode_entries(data))
+            entries = dedupe(entries)
+
+            old_index = state.index
+            new_index = state.next - 1
+            self._put(index_key(partition, self.writer, new_index), encode_entries(entries))
+            self._put_head(partition, new_index, state.next)
+            state.index = new_index
+        except Exception as e:
+            logger.error(f"Error compacting manifest for {partition}: {e}")
+            return
+
+        stale = [delta_key(partition, self.writer, seq) for seq in merged]
+        if old_index >= 0:
+            stale.append(index_key(partition, self.writer, old_index))
+        try:
+            for start in range(0, len(stale), 1000):
+                self.s3.delete_objects(
+                    Bucket=self.bucket,
+                    Delete={'Objects': [{'Key': k} for k in stale[start:start + 1000]], 'Quiet': True}
+                )
+        except Exception as e:
+            logger.warning(f"Error deleting compacted manifest objects for {partition}: {e}")
+        logger.info(f"Compacted manifest {partition}/{self.writer}: {len(entries)} entries")
+
+    def _forget_idle(self):
+        """Drop state for partitions with nothing buffered and no recent writes"""
+        cutoff = self._clock() - max(3600, 10 * self.flush_seconds)
+        with self._lock:
+            for partition in [p for p, s in self._partitions.items()
+                              if not s.buffer and s.last_write < cutoff]:
+                del self._partitions[partition]
+
+    def _put_head(self, partition: str, index: int, next_seq: int):
+        head = json.dumps({'index': index, 'next': next_seq}).encode('utf-8')
+        self._put(head_key(partition, self.writer), head)
+
+    def _put(self, key: str, body: bytes):
+        self.s3.put_object(
+            Bucket=self.bucket,
+            Key=key,
+            Body=body,
+            ContentType='application/x-ndjson',
+            ServerSideEncryption='AES256'
+        )
@@ -0,0 +1,78 @@
+"""
+Partition-aware scheduling for SQS FIFO queues
+Messages of one MessageGroupId run strictly in order; different groups run
+concurrently, so a slow or failing group never blocks the others.
+"""
+
+import logging
+import threading
+from collections import deque
+from typing import Callable, Hashable
+
+logger = logging.getLogger(__name__)
+
+
+class PartitionScheduler:
+    """
+    Runs handler(item) on an executor with per-group ordering.
+
+    Each group has its own queue and at most one drain task on the executor
+    at a time, so there is no head-of-line blocking between groups. When
+    the handler fails (returns False or raises) the rest of that group's
+    queued items are dropped without being handled: they were never
+    deleted, so SQS redelivers them in order after the visibility timeout.
+    """
+
+    def __init__(self, executor, handler: Callable[..., bool]):
+        self._executor = executor
+        self._handler = handler
+        self._queues = {}
+        self._pending = 0
+        self._cond = threading.Condition()
+
+    def submit(self, group: Hashable, item) -> None:
+        """Queue an item behind earlier items of the same group"""
+        with self._cond:
+            self._pending += 1
+            queue = self._queues.get(group)
+            if queue is not None:
+                queue.append(item)
+                return
+            self._queues[group] = deque([item])
+        self._executor.submit(self._drain, group)
+
+    def _drain(self, group: Hashable):
+        while True:
+            with self._cond:
+                queue = self._queues[group]
+                if not queue:
+                    del self._queues[group]
+                    return
+                item = queue.popleft()
+            try:
+                ok = self._handler(item)
+            except Exception as e:
+                logger.error(f"Handler failed for group {group}: {e}")
+                ok = False
+            with self._cond:
+                self._pending -= 1
+                if not ok and queue:
+                    logger.warning(f"Deferring {len(queue)} message(s) of group {group} to redelivery")
+                    self._pending -= len(queue)
+                    queue.clear()
+                self._cond.notify_all()
+
+    def pending(self) -> int:
+        """Items queued or being handled"""
+        with self._cond:
+            return self._pending
+
+    def active_groups(self) -> int:
+        """Groups with queued or running items"""
+        with self._cond:
+            return len(self._queues)
+
+    def wait_for_capacity(self, max_pending: int, timeout: float = None) -> bool:
+        """Block until at most max_pending items are outstanding"""
+        with self._cond:
+            return self._cond.wait_for(lambda: self._pending <= max_pending, timeout)
@@ -0,0 +1,78 @@
+"""
+On-demand statistical stack sampler
+Samples every thread's stack while a profile is requested and returns
+collapsed stacks ("frame;frame;frame count"), ready for flamegraph.pl or speedscope.
+Nothing runs between requests. Kept identical in api-service and sqs-consumer.
+"""
+
+import os
+import sys
+import threading
+import time
+from collections import Counter
+
+DEFAULT_INTERVAL = 0.005  # 200 Hz
+MAX_SECONDS = 60
+
+# Only one profile may run at a time
+_profile_lock = threading.Lock()
+
+
+class ProfilerBusy(RuntimeError):
+    """Raised when a profile is already running"""
+
+
+def _frame_label(code, cache: dict) -> str:
+    label = cache.get(code)
+    if label is None:
+        name = getattr(code, 'co_qualname', code.co_name)
+        label = f"{name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})".replace(';', ':')
+        cache[code] = label
+    return label
+
+
+def sample(seconds: float, interval: float = DEFAULT_INTERVAL) -> Counter:
+    """
+    Sample all thread stacks (except the sampler's own) for `seconds`
+    Returns a Counter of collapsed stack -> sample count
+    """
+    counts = Counter()
+    labels = {}
+    own_ident = threading.get_ident()
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        thread_names = {t.ident: t.name for t in threading.enumerate()}
+        for ident, frame in sys._current_frames().items():
+            if ident == own_ident:
+                continue
+            stack = []
+            while frame is not None:
+                stack.append(_frame_label(frame.f_code, labels))
+                frame = frame.f_back
+            stack.append(thread_names.get(ident, f"thread-{ident}").replace(';', ':'))
+            stack.reverse()
+            counts[';'.join(stack)] += 1
+        time.sleep(interval)
+    return counts
+
+
+def collapse(counts: Counter) -> str:
+    """
+    Render sample counts in collapsed-stack format, heaviest first
+    """
+    return ''.join(f"{stack} {count}\n" for stack, count in counts.most_common())
+
+
+def profile(seconds: float, interval: float = DEFAULT_INTERVAL) -> str:
+    """
+    Run one profile and return collapsed stacks
+    Raises ProfilerBusy if another profile is in progress, ValueError on bad input.
+    """
+    if not 0 < seconds <= MAX_SECONDS:
+        raise ValueError(f"seconds must be between 0 and {MAX_SECONDS}")
+    if not _profile_lock.acquire(blocking=False):
+        raise ProfilerBusy("A profile is already running")
+    try:
+        return collapse(sample(seconds, interval))
+    finally:
+        _profile_lock.release()
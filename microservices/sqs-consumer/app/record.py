@@ -0,0 +1,78 @@
+"""
+Compact per-message record for the consumer hot loop
+The SQS body is parsed once and its JSON bytes (legacy and envelope
+bodies alike) are uploaded as received, without a second json.dumps.
+"""
+
+from datetime import datetime, timedelta
+from typing import Optional
+from app import envelope
+
+
+class DatePartitionCache:
+    """
+    YYYY/MM/DD date paths (local time, as generate_s3_key has always used)
+    cached per day: timestamps within the cached day cost two comparisons
+    instead of a datetime construction and strftime
+    """
+    __slots__ = ('_day',)
+
+    def __init__(self):
+        self._day = (0, 0, '')  # (start, end, path); replaced as one tuple for thread safety
+
+    def path(self, timestamp: int) -> str:
+        start, end, path = self._day
+        if start <= timestamp < end:
+            return path
+        dt = datetime.fromtimestamp(timestamp)
+        midnight = datetime(dt.year, dt.month, dt.day)
+        path = midnight.strftime('%Y/%m/%d')
+        self._day = (int(midnight.timestamp()), int((midnight + timedelta(days=1)).timestamp()), path)
+        return path
+
+
+date_partitions = DatePartitionCache()
+
+# Message attribute set by app.replay on re-published archive emails
+REPLAY_ATTRIBUTE = 'replay'
+
+
+def build_s3_key(timestamp: str, sender: str) -> str:
+    """
+    emails/YYYY/MM/DD/email-{timestamp}-{sender_hash}.json
+    Raises ValueError/TypeError if the timestamp is not an integer.
+    """
+    return f"emails/{date_partitions.path(int(timestamp))}/email-{timestamp}-{hash(sender) % 10000}.json"
+
+
+class EmailRecord:
+    """
+    One received message: the fields the pipeline needs (including the S3
+    key inputs, read from the body once) and the JSON bytes to upload,
+    as received (decompressed for compressed envelopes).
+    """
+    __slots__ = ('message_id', 'sent_timestamp', 'data', 'payload', 'replayed', 'timestamp', 'sender')
+
+    def __init__(self, message_id: str, sent_timestamp: Optional[str], data: dict, payload: bytes,
+                 replayed: bool = False):
+        self.message_id = message_id
+        self.sent_timestamp = sent_timestamp
+        self.data = data
+        self.payload = payload
+        self.replayed = replayed
+        self.timestamp = data.get('email_timestamp')  # None when missing
+        self.sender = data.get('email_sender', 'unknown')
+
+    @classmethod
+    def from_message(cls, message: dict) -> 'EmailRecord':
+        """
+        Parse an SQS message (envelope or legacy JSON body)
+        Raises EnvelopeError or json.JSONDecodeError on malformed bodies.
+        """
+        decoded = envelope.decode_message(message)
+        data, payload = decoded.data, decoded.payload
+        attributes = message.get('MessageAttributes')
+        attrs = message.get('Attributes')
+        replayed = bool(attributes) and attributes.get(REPLAY_ATTRIBUTE, {}).get('StringValue') == 'true'
+        return cls(message.get('MessageId'), attrs.get('SentTimestamp') if attrs else None, data, payload,
+                   replayed)
@@ -0,0 +1,355 @@
+"""
+Replay / backfill archived emails from S3 back into SQS
+Streams the emails/YYYY/MM/DD/ partitions of a date range in key order,
+fetches objects in parallel (bounded), and re-publishes them with
+send_message_batch under a rate cap. Progress is checkpointed so an
+interrupted replay resumes after the last key known to be published.
+
+Usage:
+  python -m app.replay --start 2023-09-01 --end 2023-09-03 \
+      --queue-url <url> [--rate 500] [--concurrency 32] [--checkpoint replay.json] \
+      [--fifo-partitions 16]
+"""
+
+import argparse
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Iterator, Optional
+from botocore.exceptions import ClientError
+from app import transport
+from app.fifo import fifo_parameters
+from app.lookup import partitions_between
+from app.record import REPLAY_ATTRIBUTE
+from app.throttle import backoff_delay
+
+logger = logging.getLogger(__name__)
+
+EMAIL_PREFIX = 'emails'
+SQS_BATCH_MAX_ENTRIES = 10
+SQS_BATCH_MAX_BYTES = 256 * 1024
+SEND_ATTEMPTS = 5
+
+
+class ReplayError(RuntimeError):
+    """Raised when messages cannot be re-published; the checkpoint is kept"""
+
+
+class Checkpoint:
+    """
+    Resume position: every key up to and including `after` in `partition`
+    (and all earlier partitions) has been published
+    """
+
+    def __init__(self, path: Optional[str]):
+        self.path = path
+        self.partition = None
+        self.after = None
+        self.published = 0
+        if path and os.path.exists(path):
+            with open(path) as f:
+                state = json.load(f)
+            self.partition = state['partition']
+            self.after = state['after']
+            self.published = state.get('published', 0)
+
+    def advance(self, partition: str, key: str, count: int):
+        self.partition = partition
+        self.after = key
+        self.published += count
+
+    def save(self):
+        """Write atomically so a crash never leaves a torn checkpoint"""
+        if not self.path or self.partition is None:
+            return
+        tmp = f"{self.path}.tmp"
+        with open(tmp, 'w') as f:
+            json.dump({'partition': self.partition, 'after': self.after,
+                       'published': self.published}, f)
+        os.replace(tmp, self.path)
+
+
+class RatePacer:
+    """Caps the publish rate at `rate` messages/second (0 disables the cap)"""
+
+    def __init__(self, rate: float, clock=time.monotonic, sleep=time.sleep):
+        self.rate = rate
+        self._clock = clock
+        self._sleep = sleep
+        self._next = clock()
+
+    def acquire(self, n: int):
+        if self.rate <= 0:
+            return
+        now = self._clock()
+        if self._next > now:
+            self._sleep(self._next - now)
+        else:
+            self._next = now
+        self._next += n / self.rate
+
+
+class ThroughputReporter:
+    """Logs fetched/published rates every `interval` seconds"""
+
+    def __init__(self, interval: float, clock=time.monotonic):
+        self.interval = interval
+        self._clock = clock
+        self._start = self._last = clock()
+        self._lock = threading.Lock()
+        self.fetched = 0
+        self.fetched_bytes = 0
+        self.published = 0
+        self.skipped = 0
+        self._last_published = 0
+
+    def on_fetch(self, size: int):
+        with self._lock:
+            self.fetched += 1
+            self.fetched_bytes += size
+
+    def on_skip(self):
+        with self._lock:
+            self.skipped += 1
+
+    def on_publish(self, count: int):
+        with self._lock:
+            self.published += count
+
+    def maybe_report(self, partition: str) -> bool:
+        now = self._clock()
+        if now - self._last < self.interval:
+            return False
+        self.report(partition, now)
+        return True
+
+    def report(self, partition: str, now: Optional[float] = None):
+        now = self._clock() if now is None else now
+        with self._lock:
+            window = max(now - self._last, 1e-9)
+            elapsed = max(now - self._start, 1e-9)
+            rate = (self.published - self._last_published) / window
+            self._last, self._last_published = now, self.published
+            logger.info(
+                f"Replay {partition}: fetched {self.fetched} ({self.fetched_bytes / 1e6:.1f} MB), "
+                f"published {self.published}, skipped {self.skipped}, "
+                f"{rate:.0f} msg/s now, {self.published / elapsed:.0f} msg/s overall"
+            )
+
+
+def iter_keys(s3, bucket: str, partitions: list, checkpoint: Checkpoint) -> Iterator[tuple]:
+    """
+    (partition, key) for every archived email in the partitions, in key
+    order, starting after the checkpoint
+    """
+    paginator = s3.get_paginator('list_objects_v2')
+    for partition in partitions:
+        if checkpoint.partition is not None and partition < checkpoint.partition:
+            continue
+        params = {'Bucket': bucket, 'Prefix': f"{EMAIL_PREFIX}/{partition}/"}
+        if partition == checkpoint.partition and checkpoint.after:
+            params['StartAfter'] = checkpoint.after
+        for page in paginator.paginate(**params):
+            for obj in page.get('Contents', []):
+                yield partition, obj['Key']
+
+
+def fetch_email(s3, bucket: str, key: str) -> Optional[bytes]:
+    """Object body, or None if it was deleted after listing"""
+    try:
+        return s3.get_object(Bucket=bucket, Key=key)['Body'].read()
+    except ClientError as e:
+        if e.response.get('Error', {}).get('Code') in ('NoSuchKey', '404'):
+            logger.warning(f"Skipping {key}: no longer exists")
+            return None
+        raise
+
+
+def build_entry(raw: bytes, queue_url: str, partitions: int = 0) -> dict:
+    """
+    send_message_batch entry for an archived email, in the api-service's
+    JSON message format; the consumer does not archive it again.
+    FIFO group ids hash senders onto `partitions` groups as the api-service
+    does with the same SQS_FIFO_PARTITIONS.
+    """
+    data = json.loads(raw)
+    entry = {
+        'MessageBody': json.dumps(data),
+        'MessageAttributes': {
+            'email_sender': {'StringValue': str(data.get('email_sender', 'unknown')), 'DataType': 'String'},
+            'email_subject': {'StringValue': str(data.get('email_subject', '')), 'DataType': 'String'},
+            REPLAY_ATTRIBUTE: {'StringValue': 'true', 'DataType': 'String'}
+        }
+    }
+    entry.update(fifo_parameters(queue_url, str(data.get('email_sender', 'unknown')), data, partitions))
+    return entry
+
+
+def _entry_size(entry: dict) -> int:
+    attrs = entry['MessageAttributes']
+    return len(entry['MessageBody'].encode('utf-8')) + sum(
+        len(name) + len(a['StringValue'].encode('utf-8')) + len(a['DataType'])
+        for name, a in attrs.items()
+    )
+
+
+def send_batch(sqs, queue_url: str, entries: list):
+    """
+    send_message_batch, retrying entries that fail with a server-side
+    error. Raises ReplayError if entries are rejected or keep failing.
+    """
+    for attempt in range(SEND_ATTEMPTS):
+        response = sqs.send_message_batch(QueueUrl=queue_url, Entries=entries)
+        failed = response.get('Failed', [])
+        if not failed:
+            return
+        rejected = [f for f in failed if f.get('SenderFault')]
+        if rejected:
+            raise ReplayError(f"SQS rejected {len(rejected)} message(s): {rejected[0].get('Message')}")
+        failed_ids = {f['Id'] for f in failed}
+        entries = [e for e in entries if e['Id'] in failed_ids]
+        time.sleep(backoff_delay(attempt, 0.1, 5))
+    raise ReplayError(f"{len(entries)} message(s) still failing after {SEND_ATTEMPTS} attempts")
+
+
+def replay(s3, sqs, bucket: str, queue_url: str, partitions: list, checkpoint: Checkpoint,
+           concurrency: int = 32, send_concurrency: int = 4, rate: float = 0,
+           report_interval: float = 10, fifo_partitions: int = 0) -> ThroughputReporter:
+    """
+    Re-publish every archived email in the partitions. Fetches and sends
+    are consumed in key order, so the checkpoint only moves past keys
+    whose batch SQS has acknowledged. Delivery is at-least-once: batches
+    in flight when a replay stops are sent again on resume.
+    """
+    pacer = RatePacer(rate)
+    reporter = ThroughputReporter(report_interval)
+    fetcher = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='replay-fetch')
+    sender = ThreadPoolExecutor(max_workers=send_concurrency, thread_name_prefix='replay-send')
+    fetches = deque()  # (partition, key, future) in key order
+    sends = deque()    # (partition, last key, message count, future) in key order
+    batch = []
+    batch_bytes = 0
+    last = None  # (partition, key) of the last key covered by the batch
+    current = partitions[0] if partitions else ''
+
+    def fetch(key):
+        raw = fetch_email(s3, bucket, key)
+        if raw is not None:
+            reporter.on_fetch(len(raw))
+        return raw
+
+    def settle(block: bool):
+        # Advance the checkpoint over acknowledged batches, oldest first
+        while sends and (block or sends[0][3].done()):
+            partition, key, count, future = sends[0]
+            future.result()
+            sends.popleft()
+            reporter.on_publish(count)
+            checkpoint.advance(partition, key, count)
+            block = False
+
+    def submit_batch():
+        nonlocal batch, batch_bytes, last
+        if last is None:
+            return
+        if batch:
+            pacer.acquire(len(batch))
+            future = sender.submit(send_batch, sqs, queue_url, batch)
+        else:
+            # Only skipped keys: nothing to send, but the checkpoint still moves
+            future = sender.submit(lambda: None)
+        sends.append((last[0], last[1], len(batch), future))
+        batch, batch_bytes, last = [], 0, None
+        if len(sends) >= send_concurrency:
+            settle(block=True)
+
+    def add(partition, key, raw):
+        nonlocal batch_bytes, last, current
+        current = partition
+        if raw is None:
+            reporter.on_skip()
+        else:
+            entry = build_entry(raw, queue_url, fifo_partitions)
+            size = _entry_size(entry)
+            if batch and (len(batch) >= SQS_BATCH_MAX_ENTRIES or batch_bytes + size > SQS_BATCH_MAX_BYTES):
+                submit_batch()
+            entry['Id'] = str(len(batch))
+            batch.append(entry)
+            batch_bytes += size
+        last = (partition, key)
+
+    try:
+        # Keep up to 2x concurrency fetches in flight, consumed in key order
+        for partition, key in iter_keys(s3, bucket, partitions, checkpoint):
+            fetches.append((partition, key, fetcher.submit(fetch, key)))
+            if len(fetches) >= 2 * concurrency:
+                add(*fetches[0][:2], fetches.popleft()[2].result())
+                settle(block=False)
+                if reporter.maybe_report(current):
+                    checkpoint.save()
+        while fetches:
+            add(*fetches[0][:2], fetches.popleft()[2].result())
+        submit_batch()
+    finally:
+        fetcher.shutdown(wait=True, cancel_futures=True)
+        sender.shutdown(wait=True)
+        # Record every batch acknowledged before the first failure (if any)
+        while sends and sends[0][3].exception() is None:
+            partition, key, count, _ = sends.popleft()
+            reporter.on_publish(count)
+            checkpoint.advance(partition, key, count)
+        checkpoint.save()
+        reporter.report(current)
+    if sends:
+        sends[0][3].result()
+    return reporter
+
+
+def _parse_day(value: str) -> int:
+    return int(datetime.strptime(value, '%Y-%m-%d').timestamp())
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Replay archived emails from S3 into SQS")
+    parser.add_argument('--start', required=True, help="First day, YYYY-MM-DD")
+    parser.add_argument('--end', required=True, help="Last day (inclusive), YYYY-MM-DD")
+    parser.add_argument('--bucket', default=os.getenv('S3_BUCKET_NAME'))
+    parser.add_argument('--queue-url', default=os.getenv('SQS_QUEUE_URL'))
+    parser.add_argument('--concurrency', type=int, default=32, help="Parallel S3 fetches")
+    parser.add_argument('--send-concurrency', type=int, default=4, help="Batch sends in flight")
+    parser.add_argument('--rate', type=float, default=0, help="Max messages/second (0: unlimited)")
+    parser.add_argument('--checkpoint', help="Checkpoint file; an existing one is resumed")
+    parser.add_argument('--report-interval', type=float, default=10)
+    parser.add_argument('--fifo-partitions', type=int, default=int(os.getenv('SQS_FIFO_PARTITIONS', '0')),
+                        help="FIFO message groups senders are hashed onto, as the api-service's "
+                             "SQS_FIFO_PARTITIONS (0: one group per sender)")
+    args = parser.parse_args(argv)
+    if not args.bucket or not args.queue_url:
+        parser.error("--bucket/S3_BUCKET_NAME and --queue-url/SQS_QUEUE_URL are required")
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    partitions = partitions_between(_parse_day(args.start), _parse_day(args.end))
+    checkpoint = Checkpoint(args.checkpoint)
+    if checkpoint.partition:
+        logger.info(f"Resuming after {checkpoint.after} ({checkpoint.published} already published)")
+    try:
+        replay(transport.get_client('s3'), transport.get_client('sqs'), args.bucket, args.queue_url,
+               partitions, checkpoint, args.concurrency, args.send_concurrency, args.rate,
+               args.report_interval, args.fifo_partitions)
+    except (ReplayError, ClientError) as e:
+        logger.error(f"Replay stopped: {e}; rerun with the same --checkpoint to resume")
+        return 1
+    except KeyboardInterrupt:
+        logger.info("Interrupted; rerun with the same --checkpoint to resume")
+        return 130
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,99 @@
+"""
+Adaptive concurrency control for S3 writes
+AIMD: additive increase on success, multiplicative decrease on throttling
+"""
+
+import random
+import threading
+from contextlib import contextmanager
+from typing import Optional
+
+
+class AIMDLimiter:
+    """
+    Concurrency limiter whose limit adapts to throttling signals.
+
+    Each success grows the limit by `increase / limit`, i.e. roughly
+    `increase` per full window of successful requests. A throttle response
+    multiplies the limit by `decrease`, at most once per window: slots
+    carry the decrease epoch they were acquired in, and throttles from
+    requests that started before the last decrease are ignored (they were
+    sent at the old limit).
+    """
+
+    def __init__(self, initial: int, minimum: int = 1, maximum: int = 64,
+                 increase: float = 1.0, decrease: float = 0.5):
+        if minimum < 1 or maximum < minimum:
+            raise ValueError("AIMDLimiter requires 1 <= minimum <= maximum")
+        if not 0 < decrease < 1:
+            raise ValueError("AIMDLimiter decrease factor must be between 0 and 1")
+        self.minimum = minimum
+        self.maximum = maximum
+        self.increase = increase
+        self.decrease = decrease
+        self._limit = float(min(max(initial, minimum), maximum))
+        self._in_flight = 0
+        self._epoch = 0
+        self._cond = threading.Condition()
+
+    @property
+    def limit(self) -> int:
+        """Current effective concurrency limit"""
+        return int(self._limit)
+
+    @property
+    def in_flight(self) -> int:
+        """Number of slots currently held"""
+        return self._in_flight
+
+    def acquire(self) -> int:
+        """
+        Block until a slot is available under the current limit
+        Returns the decrease epoch to pass to on_throttle()
+        """
+        with self._cond:
+            while self._in_flight >= int(self._limit):
+                self._cond.wait()
+            self._in_flight += 1
+            return self._epoch
+
+    def release(self):
+        """Release a slot acquired with acquire()"""
+        with self._cond:
+            self._in_flight -= 1
+            self._cond.notify()
+
+    @contextmanager
+    def slot(self):
+        """Context manager wrapping acquire()/release(); yields the decrease epoch"""
+        epoch = self.acquire()
+        try:
+            yield epoch
+        finally:
+            self.release()
+
+    def on_success(self):
+        """Additively increase the limit after a successful request"""
+        with self._cond:
+            self._limit = min(self.maximum, self._limit + self.increase / self._limit)
+            self._cond.notify_all()
+
+    def on_throttle(self, epoch: Optional[int] = None) -> bool:
+        """
+        Multiplicatively decrease the limit after a throttle response
+        epoch: the value from acquire()/slot(); throttles from before the
+        last decrease are ignored. Returns whether the limit was decreased.
+        """
+        with self._cond:
+            if epoch is not None and epoch != self._epoch:
+                return False
+            self._epoch += 1
+            self._limit = max(self.minimum, self._limit * self.decrease)
+            return True
+
+
+def backoff_delay(attempt: int, base: float, cap: float) -> float:
+    """
+    Full-jitter exponential backoff delay for the given attempt (0-based)
+    """
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
@@ -0,0 +1,118 @@
+"""
+AWS transport layer
+Builds boto3 clients with tuned connection pooling, retries, timeouts and keepalive.
+Kept identical in api-service and sqs-consumer.
+"""
+
+import os
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional
+import boto3
+from botocore.config import Config
+
+logger = logging.getLogger(__name__)
+
+AWS_REGION = os.getenv('AWS_REGION', 'us-west-1')
+AWS_MAX_POOL_CONNECTIONS = int(os.getenv('AWS_MAX_POOL_CONNECTIONS', '50'))
+AWS_RETRY_MODE = os.getenv('AWS_RETRY_MODE', 'adaptive')
+AWS_MAX_ATTEMPTS = int(os.getenv('AWS_MAX_ATTEMPTS', '5'))
+AWS_CONNECT_TIMEOUT = float(os.getenv('AWS_CONNECT_TIMEOUT', '2'))
+# Must exceed the SQS long-poll wait (20s)
+AWS_READ_TIMEOUT = float(os.getenv('AWS_READ_TIMEOUT', '30'))
+AWS_TCP_KEEPALIVE = os.getenv('AWS_TCP_KEEPALIVE', 'true').lower() == 'true'
+AWS_PREWARM_CONNECTIONS = int(os.getenv('AWS_PREWARM_CONNECTIONS', '4'))
+
+# boto3's default session is not thread-safe, so clients are built from a
+# dedicated session under a lock and then shared (clients are thread-safe).
+_session = None
+_clients = {}
+_lock = threading.Lock()
+
+
+def client_config(max_attempts: Optional[int] = None, read_timeout: Optional[float] = None) -> Config:
+    """
+    Build the botocore Config from environment settings
+    max_attempts overrides the retry policy for callers that run their own
+    retry/backoff loop: it is the total number of HTTP attempts per call
+    (1 = no botocore retries), in 'standard' mode, which has no client-side
+    rate limiter to compete with theirs. botocore's own 'max_attempts' key
+    counts retries, so 'total_max_attempts' is used here.
+    read_timeout overrides AWS_READ_TIMEOUT for latency-sensitive callers.
+    """
+    if max_attempts is None:
+        retries = {'mode': AWS_RETRY_MODE, 'max_attempts': AWS_MAX_ATTEMPTS}
+    else:
+        retries = {'mode': 'standard', 'total_max_attempts': max_attempts}
+    return Config(
+        region_name=AWS_REGION,
+        max_pool_connections=AWS_MAX_POOL_CONNECTIONS,
+        retries=retries,
+        connect_timeout=AWS_CONNECT_TIMEOUT,
+        read_timeout=AWS_READ_TIMEOUT if read_timeout is None else read_timeout,
+        tcp_keepalive=AWS_TCP_KEEPALIVE
+    )
+
+
+def get_client(service_name: str, max_attempts: Optional[int] = None,
+               read_timeout: Optional[float] = None):
+    """
+    Get or create the shared client for an AWS service
+    (one client per service and retry/timeout override)
+    """
+    cache_key = (service_name, max_attempts, read_timeout)
+    client = _clients.get(cache_key)
+    if client is not None:
+        return client
+    with _lock:
+        global _session
+        if cache_key not in _clients:
+            if _session is None:
+                _session = boto3.session.Session(region_name=AWS_REGION)
+            _clients[cache_key] = _session.client(service_name, config=client_config(max_attempts, read_timeout))
+        return _clients[cache_key]
+
+
+def reset_clients():
+    """
+    Drop cached session and clients (e.g. in tests)
+    """
+    global _session
+    with _lock:
+        _session = None
+        _clients.clear()
+
+
+def _reset_after_fork():
+    # Connection pools must not be shared across processes; the lock may
+    # have been held by another thread at fork time, so replace it too.
+    global _session, _lock
+    _lock = threading.Lock()
+    _session = None
+    _clients.clear()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def prewarm(client, call: Callable, connections: int = AWS_PREWARM_CONNECTIONS):
+    """
+    Open pooled connections ahead of traffic by issuing `connections`
+    concurrent calls of `call(client)`. Failures are logged, not raised.
+    """
+    if connections <= 0:
+        return
+
+    def _warm(_):
+        try:
+            call(client)
+            return True
+        except Exception as e:
+            logger.warning(f"Connection pre-warm call failed: {e}")
+            return False
+
+    with ThreadPoolExecutor(max_workers=connections) as executor:
+        warmed = sum(executor.map(_warm, range(connections)))
+    logger.info(f"Pre-warmed {warmed}/{connections} connections for {client.meta.service_model.service_name}")
@@ -0,0 +1 @@
+# Consumer microbenchmarks
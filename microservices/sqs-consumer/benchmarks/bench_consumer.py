@@ -0,0 +1,90 @@
+"""
+Microbenchmark: the consumer's per-message path (parse, key, payload)
+Compares the previous dict path (json.loads, generate_s3_key with
+datetime/strftime per message, json.dumps(indent=2) for upload) with the
+EmailRecord path. S3 and metrics are left out; this is the CPU work only.
+Run from the service directory: python -m benchmarks.bench_consumer
+"""
+
+import json
+import time
+import timeit
+import tracemalloc
+from datetime import datetime
+from app import envelope
+from app.main import generate_record_s3_key
+from app.record import EmailRecord
+
+SAMPLES = {
+    'small': {
+        "email_subject": "Happy new year!",
+        "email_sender": "John doe",
+        "email_timestamp": "1693561101",
+        "email_content": "Just want to say... Happy new year!!!"
+    },
+    'large': {
+        "email_subject": "Quarterly report",
+        "email_sender": "reports@example.com",
+        "email_timestamp": "1693561101",
+        "email_content": "Revenue grew in every region this quarter. " * 200
+    }
+}
+
+
+def legacy_generate_s3_key(email_data: dict) -> str:
+    """generate_s3_key before the per-day date path cache"""
+    timestamp = email_data.get('email_timestamp', str(int(time.time())))
+    sender = email_data.get('email_sender', 'unknown')
+    date_path = datetime.fromtimestamp(int(timestamp)).strftime('%Y/%m/%d')
+    return f"emails/{date_path}/email-{timestamp}-{hash(sender) % 10000}.json"
+
+
+def legacy_path(message: dict):
+    data = envelope.decode_message(message).data
+    key = legacy_generate_s3_key(data)
+    payload = json.dumps(data, indent=2).encode('utf-8')
+    return key, payload
+
+
+def record_path(message: dict):
+    record = EmailRecord.from_message(message)
+    return generate_record_s3_key(record), record.payload
+
+
+def memory(fn, message: dict, number: int = 1000) -> tuple:
+    """
+    (blocks still allocated per call with the results kept,
+     peak traced bytes during one call, including transient buffers)
+    """
+    fn(message)
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    results = [fn(message) for _ in range(number)]
+    after = tracemalloc.take_snapshot()
+    del results
+    tracemalloc.reset_peak()
+    base = tracemalloc.get_traced_memory()[0]
+    fn(message)
+    peak = tracemalloc.get_traced_memory()[1] - base
+    tracemalloc.stop()
+    blocks = sum(s.count_diff for s in after.compare_to(before, 'filename') if s.count_diff > 0)
+    return blocks / number, peak
+
+
+def main(number: int = 20000):
+    print(f"{'payload':<8} {'path':<8} {'us/msg':>8} {'kept blocks':>12} {'peak bytes':>11} {'upload bytes':>13}")
+    for name, data in SAMPLES.items():
+        message = {
+            'MessageId': 'bench',
+            'ReceiptHandle': 'bench',
+            'Body': json.dumps(data),
+            'Attributes': {'SentTimestamp': '1693561101000'}
+        }
+        for label, fn in (('legacy', legacy_path), ('record', record_path)):
+            us = timeit.timeit(lambda: fn(message), number=number) / number * 1e6
+            blocks, peak = memory(fn, message)
+            print(f"{name:<8} {label:<8} {us:>8.2f} {blocks:>12.1f} {peak:>11} {len(fn(message)[1]):>13}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""
+Microbenchmark: legacy JSON bodies vs the envelope
+bytes is the SQS-billed size (body plus message attributes); decode is
+envelope.decode_message, the consumer's path for both formats.
+Run from the service directory: python -m benchmarks.bench_envelope
+"""
+
+import json
+import timeit
+from app import envelope
+
+SAMPLES = {
+    'small': {
+        "email_subject": "Happy new year!",
+        "email_sender": "John doe",
+        "email_timestamp": "1693561101",
+        "email_content": "Just want to say... Happy new year!!!"
+    },
+    'large': {
+        "email_subject": "Quarterly report",
+        "email_sender": "reports@example.com",
+        "email_timestamp": "1693561101",
+        "email_content": "Revenue grew in every region this quarter. " * 200
+    },
+    'huge': {
+        "email_subject": "Log export",
+        "email_sender": "exports@example.com",
+        "email_timestamp": "1693561101",
+        "email_content": "".join(f"{i:08d} GET /api/email 200 {i % 97}ms\n" for i in range(2500))
+    }
+}
+
+
+def message_size(body: str, attributes: dict) -> int:
+    """SQS-billed size: body plus attribute names, types and values"""
+    size = len(body.encode('utf-8'))
+    for name, value in attributes.items():
+        size += len(name) + len(value['DataType']) + len(value['StringValue'].encode('utf-8'))
+    return size
+
+
+def legacy_attributes(data: dict) -> dict:
+    return {
+        'email_sender': {'StringValue': data['email_sender'], 'DataType': 'String'},
+        'email_subject': {'StringValue': data['email_subject'], 'DataType': 'String'}
+    }
+
+
+def main(number: int = 20000):
+    print(f"{'payload':<8} {'format':<9} {'bytes':>7} {'encode us':>10} {'decode us':>10}")
+    for name, data in SAMPLES.items():
+        runs = number if name != 'huge' else number // 20
+        json_message = {'Body': json.dumps(data), 'MessageAttributes': legacy_attributes(data)}
+        env_body, env_attributes = envelope.encode(data)
+        env_message = {'Body': env_body, 'MessageAttributes': env_attributes}
+        rows = [
+            ('json', json_message, lambda: (json.dumps(data), legacy_attributes(data)),
+             lambda: envelope.decode_message(json_message)),
+            ('envelope', env_message, lambda: envelope.encode(data),
+             lambda: envelope.decode_message(env_message)),
+        ]
+        for fmt, message, enc, dec in rows:
+            enc_us = timeit.timeit(enc, number=runs) / runs * 1e6
+            dec_us = timeit.timeit(dec, number=runs) / runs * 1e6
+            size = message_size(message['Body'], message['MessageAttributes'])
+            print(f"{name:<8} {fmt:<9} {size:>7} {enc_us:>10.2f} {dec_us:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""
+Unit tests for the message envelope codec
+"""
+
+import json
+import pytest
+from app import envelope
+
+
+@pytest.fixture
+def email_data():
+    """Sample email data"""
+    return {
+        "email_subject": "Test Email",
+        "email_sender": "test@example.com",
+        "email_timestamp": "1693561101",
+        "email_content": "This is a test email content"
+    }
+
+
+class TestEnvelope:
+    """Test envelope encode/decode and negotiation"""
+    
+    def test_round_trip(self, email_data):
+        """Test small bodies are compact JSON and decode to the original data"""
+        body, attributes = envelope.encode(email_data)
+        assert body == json.dumps(email_data, separators=(',', ':'))
+        decoded = envelope.decode_message({'Body': body, 'MessageAttributes': attributes})
+        assert decoded.version == envelope.SCHEMA_VERSION
+        assert decoded.data == email_data
+        assert decoded.payload == body.encode('utf-8')
+    
+    def test_large_payload_compressed(self, email_data):
+        """Test payloads above the threshold are compressed and smaller than JSON"""
+        email_data['email_content'] = "Happy new year! " * 500
+        body, attributes = envelope.encode(email_data, compress_min_bytes=1024)
+        assert attributes[envelope.CONTENT_TYPE_ATTRIBUTE]['StringValue'] == envelope.ZLIB_CONTENT_TYPE
+        assert len(body) < len(json.dumps(email_data))
+        decoded = envelope.decode(body, envelope.ZLIB_CONTENT_TYPE)
+        assert decoded.data == email_data
+        assert json.loads(decoded.payload) == email_data
+    
+    def test_below_threshold_not_compressed(self, email_data):
+        """Test bodies under the threshold skip compression"""
+        email_data['email_content'] = "Happy new year! " * 500
+        _, attributes = envelope.encode(email_data)
+        assert attributes[envelope.CONTENT_TYPE_ATTRIBUTE]['StringValue'] == envelope.JSON_CONTENT_TYPE
+    
+    def test_unsupported_content_type(self, email_data):
+        """Test unknown versions/encodings are rejected"""
+        with pytest.raises(envelope.EnvelopeError):
+            envelope.decode(json.dumps(email_data), 'application/x-email-envelope')
+    
+    def test_malformed_body(self):
+        """Test garbage bodies raise EnvelopeError"""
+        with pytest.raises(envelope.EnvelopeError):
+            envelope.decode("not an envelope {")
+        with pytest.raises(envelope.EnvelopeError):
+            envelope.decode("not base64", envelope.ZLIB_CONTENT_TYPE)
+    
+    def test_decode_message_negotiates_format(self, email_data):
+        """Test envelope and legacy JSON messages are both read"""
+        body, attributes = envelope.encode(email_data)
+        legacy = {'Body': json.dumps(email_data)}
+        assert envelope.decode_message({'Body': body, 'MessageAttributes': attributes}).data == email_data
+        decoded = envelope.decode_message(legacy)
+        assert (decoded.version, decoded.data) == (0, email_data)
+        assert decoded.payload == legacy['Body'].encode('utf-8')
+        with pytest.raises(json.JSONDecodeError):
+            envelope.decode_message({'Body': '[1, 2]'})
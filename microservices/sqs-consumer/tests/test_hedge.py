@@ -0,0 +1,137 @@
+"""
+Unit tests for hedged S3 requests
+"""
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import patch
+from app.hedge import LatencyTracker, HedgeBudget, hedged_call
+
+
+def warmed_tracker(latency=0.01, samples=20):
+    tracker = LatencyTracker(percentile=95, min_samples=samples, refresh_every=1)
+    for _ in range(samples):
+        tracker.record(latency)
+    return tracker
+
+
+class TestLatencyTracker:
+    """Test percentile tracking"""
+    
+    def test_no_threshold_until_min_samples(self):
+        """Test threshold is unset before enough samples"""
+        tracker = LatencyTracker(min_samples=5)
+        for _ in range(4):
+            tracker.record(0.1)
+        assert tracker.threshold() is None
+    
+    def test_percentile(self):
+        """Test percentile picks the tail sample"""
+        tracker = LatencyTracker(percentile=90, min_samples=10, refresh_every=1)
+        for i in range(1, 101):
+            tracker.record(i / 100.0)
+        assert 0.89 <= tracker.threshold() <= 0.92
+
+
+class TestHedgeBudget:
+    """Test hedge budget"""
+    
+    def test_budget_caps_hedges(self):
+        """Test hedges are limited to the burst plus earned ratio"""
+        budget = HedgeBudget(ratio=0.25, burst=2)
+        assert budget.try_spend() is True
+        assert budget.try_spend() is True
+        assert budget.try_spend() is False
+        for _ in range(4):
+            budget.on_request()
+        assert budget.try_spend() is True
+        assert budget.try_spend() is False
+
+
+class TestHedgedCall:
+    """Test hedged execution"""
+    
+    def test_fast_call_not_hedged(self):
+        """Test a call finishing under the threshold is not duplicated"""
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            result, fired, won = hedged_call(
+                executor, warmed_tracker(latency=1.0), HedgeBudget(), lambda x: x * 2, x=21
+            )
+        assert (result, fired, won) == (42, False, False)
+    
+    def test_slow_call_hedged(self):
+        """Test the hedge wins when the original stalls"""
+        calls = []
+        release = threading.Event()
+        
+        def put(**kwargs):
+            calls.append(kwargs)
+            if len(calls) == 1:
+                release.wait(2)
+                return 'primary'
+            return 'hedge'
+        
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            result, fired, won = hedged_call(
+                executor, warmed_tracker(latency=0.01), HedgeBudget(), put, Key='k'
+            )
+            release.set()
+        assert (result, fired, won) == ('hedge', True, True)
+        assert len(calls) == 2
+    
+    def test_no_hedge_without_budget(self):
+        """Test exhausted budget disables hedging"""
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            result, fired, _ = hedged_call(
+                executor, warmed_tracker(latency=0.001), HedgeBudget(ratio=0, burst=0),
+                lambda: time.sleep(0.05) or 'done'
+            )
+        assert (result, fired) == ('done', False)
+
+
+class TestPutObjectHedged:
+    """Test S3 hedging integration"""
+    
+    @patch('app.main.S3_HEDGE_ENABLED', True)
+    @patch('app.main.s3_client')
+    def test_hedged_upload(self, mock_s3):
+        """Test hedged mode still uploads through put_object"""
+        from app.main import upload_to_s3
+        mock_s3.put_object.return_value = {}
+        assert upload_to_s3({'a': 1}, 'emails/test/key.json') is True
+        mock_s3.put_object.assert_called_once()
+    
+    @patch('app.main.S3_HEDGE_ENABLED', True)
+    @patch('app.main.hedged_call')
+    @patch('app.main.s3_client')
+    def test_no_hedge_while_throttled(self, mock_s3, mock_hedged):
+        """Test a recent throttle sends plain PUTs, and hedging resumes afterwards"""
+        from app import main
+        mock_s3.put_object.return_value = {}
+        mock_hedged.return_value = ({}, False, False)
+        with patch.object(main, 's3_last_throttle', time.monotonic()):
+            main.put_object_hedged(Bucket='b', Key='k')
+        mock_hedged.assert_not_called()
+        with patch.object(main, 's3_last_throttle', time.monotonic() - main.S3_HEDGE_THROTTLE_PAUSE - 1):
+            main.put_object_hedged(Bucket='b', Key='k')
+        mock_hedged.assert_called_once()
+    
+    @patch('app.main.S3_HEDGE_ENABLED', True)
+    @patch('app.main.s3_client')
+    def test_hedge_runs_inside_limiter_slot(self, mock_s3):
+        """Test the hedged PUT is one attempt under the limiter"""
+        from app import main
+        seen = []
+        mock_s3.put_object.side_effect = lambda **kw: seen.append(main.s3_limiter.in_flight) or {}
+        main.put_object_adaptive(Bucket='b', Key='k', Body=b'{}')
+        assert seen == [1]
+
+
+def test_latency_excludes_executor_queueing():
+    """Test samples time the call itself, not the wait for a worker"""
+    tracker = LatencyTracker(min_samples=1, refresh_every=1)
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        executor.submit(time.sleep, 0.1)
+        hedged_call(executor, tracker, HedgeBudget(), lambda: None)
+    assert tracker.threshold() < 0.05
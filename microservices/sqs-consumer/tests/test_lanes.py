@@ -0,0 +1,65 @@
+"""
+Unit tests for priority lanes and weighted fair polling
+"""
+
+import json
+import pytest
+from collections import Counter
+from unittest.mock import patch
+from app.lanes import Lane, load_lanes, WeightedLaneScheduler
+from app.main import handle_message
+
+
+class TestLoadLanes:
+    """Test lane configuration"""
+    
+    def test_default_lane_added(self):
+        """Test SQS_QUEUE_URL becomes the default lane"""
+        lanes = load_lanes(json.dumps([{'name': 'high', 'queue_url': 'q-high', 'weight': 5}]), 'q-default')
+        assert [(l.name, l.queue_url, l.weight) for l in lanes] == [('high', 'q-high', 5), ('default', 'q-default', 1)]
+    
+    def test_invalid_weight(self):
+        """Test non-positive weights are rejected"""
+        with pytest.raises(ValueError):
+            Lane('bad', 'q', 0)
+
+
+class TestWeightedLaneScheduler:
+    """Test weighted fair scheduling"""
+    
+    def test_round_follows_weights_and_interleaves(self):
+        """Test each round polls lanes in proportion to weight, smoothly"""
+        scheduler = WeightedLaneScheduler([Lane('high', 'h', 3), Lane('low', 'l', 1)])
+        order = [lane.name for lane in scheduler.round()]
+        assert Counter(order) == {'high': 3, 'low': 1}
+        assert order == ['high', 'high', 'low', 'high']
+    
+    def test_low_priority_progresses(self):
+        """Test the low lane is polled every round even when high is busy"""
+        scheduler = WeightedLaneScheduler([Lane('high', 'h', 9), Lane('low', 'l', 1)])
+        for _ in range(5):
+            assert 'low' in [lane.name for lane in scheduler.round()]
+    
+    def test_empty_lane_skipped_for_round(self):
+        """Test an empty lane's share of the round goes to lanes with work"""
+        scheduler = WeightedLaneScheduler([Lane('high', 'h', 3), Lane('low', 'l', 1)])
+        polled = []
+        for lane in scheduler.round():
+            polled.append(lane.name)
+            if lane.name == 'high':
+                scheduler.mark_empty(lane)
+        assert polled == ['high', 'low', 'low', 'low']
+
+
+class TestLaneHandling:
+    """Test lane-aware message handling"""
+    
+    @patch('app.main.delete_message')
+    @patch('app.main.process_message', return_value=True)
+    def test_deletes_from_lane_queue(self, mock_process, mock_delete):
+        """Test messages are deleted from the queue they came from"""
+        lane = Lane('high', 'https://sqs.us-west-1.amazonaws.com/123456789/high', 3)
+        message = {'MessageId': 'id', 'ReceiptHandle': 'rh', 'Body': '{}'}
+        assert handle_message(message, lane=lane) is True
+        mock_process.assert_called_once_with(message, 'high')
+        mock_delete.assert_called_once_with('rh', lane.queue_url)
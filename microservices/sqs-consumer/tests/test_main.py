@@ -11,7 +11,8 @@ from app.main import (
     upload_to_s3,
     process_message,
     delete_message,
-    poll_sqs
+    poll_sqs,
+    REGISTRY
 )
 
 
@@ -99,7 +100,7 @@ class TestProcessMessage:
     """Test message processing"""
     
     @patch('app.main.upload_to_s3')
-    @patch('app.main.generate_s3_key')
+    @patch('app.main.generate_record_s3_key')
     def test_process_message_success(
         self,
         mock_generate_key,
@@ -123,6 +124,38 @@ class TestProcessMessage:
         
         result = process_message(invalid_message)
         assert result is False
+    
+    @patch('app.main.upload_to_s3')
+    def test_process_message_envelope(self, mock_upload, sample_email_data):
+        """Test processing an envelope-encoded message"""
+        from app import envelope
+        mock_upload.return_value = True
+        body, attributes = envelope.encode(sample_email_data)
+        message = {
+            "MessageId": "test-id",
+            "ReceiptHandle": "test-receipt-handle",
+            "Body": body,
+            "MessageAttributes": attributes
+        }
+        
+        assert process_message(message) is True
+        assert mock_upload.call_args.args[0] == sample_email_data
+    
+    @patch('app.main.put_object_hedged')
+    def test_replayed_message_is_not_archived_again(self, mock_put, sample_email_data):
+        """Test a message re-published by app.replay does not create a new archive object"""
+        from app.replay import build_entry
+        entry = build_entry(json.dumps(sample_email_data).encode('utf-8'),
+                            'https://sqs.us-west-1.amazonaws.com/123456789/test-queue')
+        message = {
+            "MessageId": "test-id",
+            "ReceiptHandle": "test-receipt-handle",
+            "Body": entry['MessageBody'],
+            "MessageAttributes": entry['MessageAttributes']
+        }
+        
+        assert process_message(message) is True
+        mock_put.assert_not_called()
 
 
 class TestDeleteMessage:
@@ -172,6 +205,8 @@ class TestPollSQS:
         messages = poll_sqs()
         assert len(messages) == 1
         assert messages[0]['MessageId'] == 'test-message-id'
+        call_kwargs = mock_sqs.receive_message.call_args.kwargs
+        assert 'SentTimestamp' in call_kwargs['AttributeNames']
     
     @patch('app.main.sqs_client')
     def test_poll_sqs_no_messages(self, mock_sqs):
@@ -184,6 +219,20 @@ class TestPollSQS:
         messages = poll_sqs()
         assert len(messages) == 0
     
+    @patch('app.main.sqs_client')
+    def test_empty_polls_timed_separately(self, mock_sqs, sample_sqs_message):
+        """Test long-poll waits with no messages are kept out of the receive stage"""
+        def count(stage):
+            return REGISTRY.get_sample_value('message_stage_duration_seconds_count', {'stage': stage}) or 0
+        
+        receive_before, empty_before = count('receive'), count('receive_empty')
+        mock_sqs.receive_message.return_value = {}
+        poll_sqs()
+        assert (count('receive'), count('receive_empty')) == (receive_before, empty_before + 1)
+        mock_sqs.receive_message.return_value = {'Messages': [sample_sqs_message]}
+        poll_sqs()
+        assert (count('receive'), count('receive_empty')) == (receive_before + 1, empty_before + 1)
+    
     @patch('app.main.sqs_client')
     def test_poll_sqs_error(self, mock_sqs):
         """Test polling SQS with error"""
@@ -198,3 +247,31 @@ class TestPollSQS:
         
         messages = poll_sqs()
         assert len(messages) == 0
+
+
+class TestStageMetrics:
+    """Test per-stage and end-to-end lag metrics"""
+    
+    @patch('app.main.upload_to_s3')
+    def test_process_message_records_stages_and_lag(self, mock_upload, sample_sqs_message):
+        """Test stage histograms and lag are observed on success"""
+        mock_upload.return_value = True
+        sample_sqs_message['Attributes'] = {
+            'SentTimestamp': str(int((time.time() - 2) * 1000))
+        }
+        
+        def sample(name, labels=None):
+            return REGISTRY.get_sample_value(name, labels) or 0
+        
+        parse_before = sample('message_stage_duration_seconds_count', {'stage': 'parse'})
+        upload_before = sample('message_stage_duration_seconds_count', {'stage': 'upload'})
+        lag_before = sample('message_end_to_end_lag_seconds_count', {'lane': 'default'})
+        lag_sum_before = sample('message_end_to_end_lag_seconds_sum', {'lane': 'default'})
+        
+        assert process_message(sample_sqs_message) is True
+        
+        assert sample('message_stage_duration_seconds_count', {'stage': 'parse'}) == parse_before + 1
+        assert sample('message_stage_duration_seconds_count', {'stage': 'upload'}) == upload_before + 1
+        assert sample('message_end_to_end_lag_seconds_count', {'lane': 'default'}) == lag_before + 1
+        assert sample('message_end_to_end_lag_seconds_sum', {'lane': 'default'}) - lag_sum_before >= 2
+        assert sample('sqs_messages_in_flight') == 0
@@ -0,0 +1,222 @@
+"""
+Unit tests for the manifest index writer and lookup
+"""
+
+import io
+import json
+from unittest.mock import patch
+from botocore.exceptions import ClientError
+import signal
+from app.manifest import ManifestWriter, default_writer_id, head_key, partition_for, sender_hash
+from app.lookup import find, list_writers, partitions_between
+
+BUCKET = 'test-bucket'
+DAY = 1693561101  # 2023-09-01
+
+
+class FakePaginator:
+    def __init__(self, objects):
+        self.objects = objects
+
+    def paginate(self, Bucket, Prefix, Delimiter):
+        prefixes = sorted({Prefix + k[len(Prefix):].split(Delimiter, 1)[0] + Delimiter
+                           for k in self.objects if k.startswith(Prefix) and Delimiter in k[len(Prefix):]})
+        yield {'CommonPrefixes': [{'Prefix': p} for p in prefixes]}
+
+
+class FakeS3:
+    """In-memory S3 with the calls the manifest uses (listing only by delimiter)"""
+
+    def __init__(self):
+        self.objects = {}
+        self.fail_puts = False
+
+    def put_object(self, Bucket, Key, Body, **kwargs):
+        if self.fail_puts:
+            raise ClientError({'Error': {'Code': 'SlowDown'}}, 'PutObject')
+        self.objects[Key] = Body
+
+    def get_object(self, Bucket, Key):
+        if Key not in self.objects:
+            raise ClientError({'Error': {'Code': 'NoSuchKey'}}, 'GetObject')
+        return {'Body': io.BytesIO(self.objects[Key])}
+
+    def get_paginator(self, name):
+        assert name == 'list_objects_v2'
+        return FakePaginator(self.objects)
+
+    def delete_objects(self, Bucket, Delete):
+        for obj in Delete['Objects']:
+            self.objects.pop(obj['Key'], None)
+
+
+def make_writer(s3, **kwargs):
+    return ManifestWriter(s3, BUCKET, 'consumer', **kwargs)
+
+
+class TestManifestWriter:
+    """Test incremental writes and compaction"""
+
+    def test_flush_writes_delta_and_head(self):
+        """Test buffered entries become a delta referenced by HEAD"""
+        s3 = FakeS3()
+        writer = make_writer(s3)
+        writer.record('emails/a.json', 'a@example.com', DAY, 10)
+        writer.record('emails/b.json', 'b@example.com', DAY + 1, 20)
+        assert writer.pending() == 2
+        writer.flush()
+        assert writer.pending() == 0
+        head = json.loads(s3.objects[head_key(partition_for(DAY), 'consumer')])
+        assert head == {'index': -1, 'next': 1}
+
+    def test_flush_due_on_entries_or_age(self):
+        """Test flushing triggers on buffer size and on age"""
+        now = [0.0]
+        writer = make_writer(FakeS3(), flush_entries=2, flush_seconds=30, clock=lambda: now[0])
+        writer.record('k1', 'a', DAY, 1)
+        assert not writer.flush_due()
+        now[0] = 31
+        assert writer.flush_due()
+        now[0] = 0
+        writer.record('k2', 'a', DAY, 1)
+        assert writer.flush_due()
+
+    def test_compaction_merges_and_deletes(self):
+        """Test deltas are merged into one index and removed"""
+        s3 = FakeS3()
+        writer = make_writer(s3, compact_every=3)
+        for i in range(3):
+            writer.record(f'emails/{i}.json', 'a@example.com', DAY + i, i)
+            writer.flush()
+        partition = partition_for(DAY)
+        head = json.loads(s3.objects[head_key(partition, 'consumer')])
+        assert head == {'index': 2, 'next': 3}
+        assert sorted(k.rsplit('/', 1)[1] for k in s3.objects if k.startswith('manifests/')) == \
+            ['HEAD.json', 'index-000002.jsonl']
+        assert [e['k'] for e in find(s3, BUCKET, DAY, DAY + 10)] == [f'emails/{i}.json' for i in range(3)]
+
+    def test_failed_flush_keeps_entries(self):
+        """Test a failed delta write is retried on the next flush"""
+        s3 = FakeS3()
+        writer = make_writer(s3)
+        writer.record('emails/a.json', 'a@example.com', DAY, 10)
+        s3.fail_puts = True
+        writer.flush()
+        assert writer.pending() == 1
+        s3.fail_puts = False
+        writer.flush()
+        assert [e['k'] for e in find(s3, BUCKET, DAY, DAY)] == ['emails/a.json']
+
+    def test_resumes_sequence_after_restart(self):
+        """Test a new writer continues after the existing deltas"""
+        s3 = FakeS3()
+        first = make_writer(s3)
+        first.record('emails/a.json', 'a@example.com', DAY, 1)
+        first.flush()
+        second = make_writer(s3)
+        second.record('emails/b.json', 'a@example.com', DAY + 5, 1)
+        second.flush()
+        assert [e['k'] for e in find(s3, BUCKET, DAY, DAY + 5)] == ['emails/a.json', 'emails/b.json']
+
+
+class TestLookup:
+    """Test range and sender queries"""
+
+    def test_range_and_sender_filter(self):
+        """Test entries are filtered by time range and sender"""
+        s3 = FakeS3()
+        writer = make_writer(s3)
+        for i, sender in enumerate(['a@example.com', 'b@example.com', 'A@example.com']):
+            writer.record(f'emails/{i}.json', sender, DAY + i * 100, 1)
+        writer.record('emails/next-day.json', 'a@example.com', DAY + 86400, 1)
+        writer.record('emails/1.json', 'b@example.com', DAY + 100, 2)  # redelivery
+        writer.flush()
+
+        assert [e['k'] for e in find(s3, BUCKET, DAY, DAY + 86400, sender='a@example.com')] == \
+            ['emails/0.json', 'emails/2.json', 'emails/next-day.json']
+        hits = list(find(s3, BUCKET, DAY + 50, DAY + 150))
+        assert [(e['k'], e['s'], e['h']) for e in hits] == [('emails/1.json', 2, sender_hash('b@example.com'))]
+
+    def test_writers_are_discovered(self):
+        """Test entries from every writer of a partition are found without naming them"""
+        s3 = FakeS3()
+        for writer_id in ('task-a', 'task-b'):
+            writer = ManifestWriter(s3, BUCKET, writer_id)
+            writer.record(f'emails/{writer_id}.json', 'a@example.com', DAY, 1)
+            writer.flush()
+        assert list_writers(s3, BUCKET, partition_for(DAY)) == ['task-a', 'task-b']
+        assert [e['k'] for e in find(s3, BUCKET, DAY, DAY)] == ['emails/task-a.json', 'emails/task-b.json']
+        assert [e['k'] for e in find(s3, BUCKET, DAY, DAY, writers=['task-b'])] == ['emails/task-b.json']
+
+    def test_missing_partitions_are_empty(self):
+        """Test days without a manifest return nothing"""
+        assert list(find(FakeS3(), BUCKET, DAY, DAY + 3 * 86400)) == []
+
+    def test_partitions_between(self):
+        """Test every day in the range is covered"""
+        assert len(partitions_between(DAY, DAY + 2 * 86400)) == 3
+        assert partitions_between(DAY, DAY) == [partition_for(DAY)]
+
+
+@patch('app.main.MANIFEST_ENABLED', True)
+@patch('app.main.put_object_hedged')
+def test_upload_records_manifest_entry(mock_put):
+    """Test successful uploads are added to the manifest"""
+    from app import main
+    writer = make_writer(FakeS3())
+    with patch.object(main, 'manifest_writer', writer):
+        data = {'email_sender': 'a@example.com', 'email_timestamp': str(DAY)}
+        assert main.upload_to_s3(data, 'emails/x.json')
+    assert writer.pending() == 1
+
+
+@patch('app.main.MANIFEST_ENABLED', True)
+@patch('app.main.put_object_hedged')
+def test_manifest_error_does_not_fail_upload(mock_put):
+    """Test an out-of-range timestamp skips the manifest entry, not the upload"""
+    from app import main
+    writer = make_writer(FakeS3())
+    with patch.object(main, 'manifest_writer', writer):
+        data = {'email_sender': 'a@example.com', 'email_timestamp': '9' * 30}
+        assert main.upload_to_s3(data, 'emails/x.json')
+    mock_put.assert_called_once()
+    assert writer.pending() == 0
+
+
+def test_default_writer_id_uses_ecs_task_id(monkeypatch):
+    """Test the writer id is the ECS task id, or the hostname outside ECS"""
+    monkeypatch.delenv('ECS_CONTAINER_METADATA_URI_V4', raising=False)
+    with patch('app.manifest.socket.gethostname', return_value='host-1'):
+        assert default_writer_id() == 'host-1'
+    monkeypatch.setenv('ECS_CONTAINER_METADATA_URI_V4', 'http://169.254.170.2/v4/abc')
+    task = io.BytesIO(json.dumps({'TaskARN': 'arn:aws:ecs:us-west-1:123:task/cluster/0f1e2d'}).encode())
+    with patch('app.manifest.urllib.request.urlopen', return_value=task) as urlopen:
+        assert default_writer_id() == '0f1e2d'
+    assert urlopen.call_args.args[0] == 'http://169.254.170.2/v4/abc/task'
+
+
+@patch('app.main.MANIFEST_ENABLED', True)
+@patch('app.main.SQS_QUEUE_URL', 'https://sqs.us-west-1.amazonaws.com/123456789/emails')
+@patch('app.main.S3_BUCKET_NAME', BUCKET)
+@patch('app.main.SQS_POLL_INTERVAL', 0)
+@patch('app.main.prewarm_clients')
+@patch('app.main.get_queue_attributes', return_value={})
+def test_sigterm_flushes_manifest(mock_attrs, mock_prewarm):
+    """Test SIGTERM stops the loop and flushes buffered manifest entries"""
+    from app import main
+    s3 = FakeS3()
+    writer = make_writer(s3)
+    writer.record('emails/a.json', 'a@example.com', DAY, 1)
+    previous = signal.getsignal(signal.SIGTERM)
+
+    def poll(queue_url, wait_time_seconds):
+        signal.raise_signal(signal.SIGTERM)
+        return []
+
+    try:
+        with patch.object(main, 'manifest_writer', writer), patch('app.main.poll_sqs', side_effect=poll):
+            main.process_messages()
+    finally:
+        signal.signal(signal.SIGTERM, previous)
+    assert writer.pending() == 0
+    assert head_key(partition_for(DAY), 'consumer') in s3.objects
@@ -0,0 +1,74 @@
+"""
+Unit tests for FIFO partition-aware scheduling
+"""
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from app.lanes import Lane
+from app.partitions import PartitionScheduler
+
+
+class TestPartitionScheduler:
+    """Test per-group ordering and isolation"""
+    
+    def test_groups_keep_order(self):
+        """Test items of a group are handled in submission order"""
+        seen = {'a': [], 'b': []}
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            scheduler = PartitionScheduler(executor, lambda item: seen[item[0]].append(item[1]) or True)
+            for i in range(50):
+                scheduler.submit('a', ('a', i))
+                scheduler.submit('b', ('b', i))
+            assert scheduler.wait_for_capacity(0, timeout=5)
+        assert seen == {'a': list(range(50)), 'b': list(range(50))}
+        assert scheduler.active_groups() == 0
+    
+    def test_blocked_group_does_not_block_others(self):
+        """Test a stuck group leaves other groups running"""
+        release = threading.Event()
+        done = []
+        
+        def handler(item):
+            if item == 'slow':
+                release.wait(5)
+            done.append(item)
+            return True
+        
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            scheduler = PartitionScheduler(executor, handler)
+            scheduler.submit('a', 'slow')
+            scheduler.submit('a', 'after-slow')
+            for i in range(5):
+                scheduler.submit('b', i)
+            assert scheduler.wait_for_capacity(2, timeout=5)
+            assert done == [0, 1, 2, 3, 4]
+            release.set()
+            assert scheduler.wait_for_capacity(0, timeout=5)
+        assert done[-2:] == ['slow', 'after-slow']
+    
+    def test_failure_defers_rest_of_group(self):
+        """Test a failed item drops the group's remaining items for redelivery"""
+        handled = []
+        
+        def handler(item):
+            handled.append(item)
+            if item == 'a1':
+                raise RuntimeError("boom")
+            return item != 'b0'
+        
+        gate = threading.Event()
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            executor.submit(gate.wait, 5)
+            scheduler = PartitionScheduler(executor, handler)
+            for item in ('a0', 'a1', 'a2', 'b0', 'b1'):
+                scheduler.submit(item[0], item)
+            gate.set()
+            assert scheduler.wait_for_capacity(0, timeout=5)
+        assert handled == ['a0', 'a1', 'b0']
+        assert scheduler.pending() == 0
+
+
+def test_fifo_lane_detection():
+    """Test FIFO lanes are recognised from the queue URL"""
+    assert Lane('orders', 'https://sqs.us-west-1.amazonaws.com/1/orders.fifo').fifo
+    assert not Lane('default', 'https://sqs.us-west-1.amazonaws.com/1/emails').fifo
@@ -0,0 +1,89 @@
+"""
+Unit tests for the sampling profiler and metrics-port trigger
+"""
+
+import threading
+import pytest
+from unittest.mock import patch
+from wsgiref.util import setup_testing_defaults
+from app import profiler
+from app.main import make_metrics_app
+
+
+def busy_loop(stop):
+    while not stop.is_set():
+        sum(range(100))
+
+
+def call_app(app, path, query='', headers=None):
+    environ = {'PATH_INFO': path, 'QUERY_STRING': query}
+    environ.update(headers or {})
+    setup_testing_defaults(environ)
+    captured = {}
+    
+    def start_response(status, response_headers):
+        captured['status'] = status
+    
+    body = b''.join(app(environ, start_response))
+    return captured['status'], body.decode('utf-8')
+
+
+class TestProfiler:
+    """Test stack sampling"""
+    
+    def test_profile_captures_busy_thread(self):
+        """Test a busy thread shows up in collapsed stacks"""
+        stop = threading.Event()
+        worker = threading.Thread(target=busy_loop, args=(stop,), name='busy-worker')
+        worker.start()
+        try:
+            output = profiler.profile(0.1, interval=0.001)
+        finally:
+            stop.set()
+            worker.join()
+        lines = [line for line in output.splitlines() if line.startswith('busy-worker;')]
+        assert lines
+        assert 'busy_loop' in lines[0]
+        assert lines[0].rsplit(' ', 1)[1].isdigit()
+    
+    def test_rejects_bad_duration(self):
+        """Test out-of-range durations are rejected"""
+        with pytest.raises(ValueError):
+            profiler.profile(0)
+        with pytest.raises(ValueError):
+            profiler.profile(profiler.MAX_SECONDS + 1)
+    
+    def test_single_profile_at_a_time(self):
+        """Test concurrent profiles are refused"""
+        with profiler._profile_lock:
+            with pytest.raises(profiler.ProfilerBusy):
+                profiler.profile(0.01)
+
+
+class TestDebugProfileRoute:
+    """Test /debug/profile on the metrics port"""
+    
+    def test_metrics_still_served(self):
+        """Test /metrics is still served by the combined app"""
+        status, body = call_app(make_metrics_app(), '/metrics')
+        assert status.startswith('200')
+        assert 'sqs_messages_processed_total' in body
+    
+    @patch('app.main.SSM_ADMIN_TOKEN_PARAMETER', None)
+    def test_disabled_without_admin_parameter(self):
+        """Test the route is hidden when no admin parameter is configured"""
+        status, _ = call_app(make_metrics_app(), '/debug/profile')
+        assert status.startswith('404')
+    
+    @patch('app.main.SSM_ADMIN_TOKEN_PARAMETER', '/test/admin')
+    @patch('app.main.validate_admin_token')
+    def test_admin_required(self, mock_validate):
+        """Test invalid admin values are rejected and valid ones profile"""
+        mock_validate.return_value = False
+        status, _ = call_app(make_metrics_app(), '/debug/profile', 'seconds=0.01')
+        assert status.startswith('403')
+        
+        mock_validate.return_value = True
+        status, _ = call_app(make_metrics_app(), '/debug/profile', 'seconds=0.01',
+                             {'HTTP_X_ADMIN_TOKEN': 'mock-admin'})
+        assert status.startswith('200')
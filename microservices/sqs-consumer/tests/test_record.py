@@ -0,0 +1,86 @@
+"""
+Unit tests for the compact message record and cached date partitions
+"""
+
+import json
+import pytest
+from datetime import datetime
+from unittest.mock import patch
+from app import envelope
+from app.record import DatePartitionCache, EmailRecord, build_s3_key
+from app.main import generate_record_s3_key, generate_s3_key, process_message
+
+EMAIL = {
+    "email_subject": "Test Email",
+    "email_sender": "test@example.com",
+    "email_timestamp": "1693561101",
+    "email_content": "This is a test email content"
+}
+
+
+class TestDatePartitionCache:
+    """Test cached date paths match datetime formatting"""
+    
+    def test_matches_strftime_across_days(self):
+        """Test paths around and between midnights"""
+        cache = DatePartitionCache()
+        start = int(datetime(2023, 9, 1).timestamp())
+        for ts in list(range(start - 5, start + 5)) + list(range(start, start + 40 * 86400, 3607)):
+            assert cache.path(ts) == datetime.fromtimestamp(ts).strftime('%Y/%m/%d')
+    
+    def test_build_s3_key(self):
+        """Test the key layout"""
+        key = build_s3_key("1693561101", "test@example.com")
+        assert key.startswith(f"emails/{datetime.fromtimestamp(1693561101).strftime('%Y/%m/%d')}/email-1693561101-")
+        assert key.endswith(".json")
+
+
+class TestEmailRecord:
+    """Test single parse and payload passthrough"""
+    
+    def test_json_body_is_uploaded_as_received(self):
+        """Test JSON bodies are carried through without re-serializing"""
+        body = json.dumps(EMAIL)
+        record = EmailRecord.from_message({
+            "MessageId": "m1", "Body": body, "Attributes": {"SentTimestamp": "1693561101000"}
+        })
+        assert record.data == EMAIL
+        assert record.payload == body.encode('utf-8')
+        assert (record.message_id, record.sent_timestamp) == ("m1", "1693561101000")
+        assert (record.timestamp, record.sender) == ("1693561101", "test@example.com")
+    
+    def test_envelope_body_is_uploaded_as_received(self):
+        """Test envelope bodies are stored as received, and compressed ones as their JSON"""
+        body, attributes = envelope.encode(EMAIL)
+        record = EmailRecord.from_message({"MessageId": "m1", "Body": body, "MessageAttributes": attributes})
+        assert record.payload == body.encode('utf-8')
+        assert record.sent_timestamp is None
+        body, attributes = envelope.encode(EMAIL, compress_min_bytes=1)
+        record = EmailRecord.from_message({"MessageId": "m1", "Body": body, "MessageAttributes": attributes})
+        assert json.loads(record.payload) == EMAIL
+    
+    def test_non_object_body_rejected(self):
+        """Test bodies that are not JSON objects are parse errors"""
+        with pytest.raises(json.JSONDecodeError):
+            EmailRecord.from_message({"MessageId": "m1", "Body": "[1, 2]"})
+    
+    def test_key_matches_generate_s3_key(self):
+        """Test keys built from the record's slots match the dict path, with its defaults"""
+        for data in (EMAIL, {"email_timestamp": "1693561101"}):
+            record = EmailRecord.from_message({"Body": json.dumps(data)})
+            assert generate_record_s3_key(record) == generate_s3_key(data)
+        record = EmailRecord.from_message({"Body": json.dumps({"email_sender": "a@example.com"})})
+        assert record.timestamp is None
+        assert generate_record_s3_key(record).startswith("emails/")
+    
+    def test_slots(self):
+        """Test records carry no per-instance dict"""
+        assert not hasattr(EmailRecord.from_message({"Body": "{}"}), '__dict__')
+
+
+@patch('app.main.put_object_hedged')
+def test_process_message_uploads_original_body(mock_put):
+    """Test the stored object is the body as received"""
+    body = json.dumps(EMAIL)
+    assert process_message({"MessageId": "m1", "ReceiptHandle": "r", "Body": body}) is True
+    assert mock_put.call_args.kwargs['Body'] == body.encode('utf-8')
@@ -0,0 +1,148 @@
+"""
+Unit tests for the S3 archive replay tool
+"""
+
+import io
+import json
+import pytest
+from botocore.exceptions import ClientError
+from app.fifo import deduplication_id, message_group_id
+from app.replay import Checkpoint, RatePacer, ReplayError, build_entry, replay
+
+BUCKET = 'test-bucket'
+QUEUE_URL = 'https://sqs.us-west-1.amazonaws.com/123456789/emails'
+FIFO_QUEUE_URL = f'{QUEUE_URL}.fifo'
+PARTITIONS = ['2023/09/01', '2023/09/02']
+
+
+class FakePaginator:
+    def __init__(self, objects):
+        self.objects = objects
+
+    def paginate(self, Bucket, Prefix, StartAfter=''):
+        keys = sorted(k for k in self.objects if k.startswith(Prefix) and k > StartAfter)
+        for i in range(0, len(keys), 3):
+            yield {'Contents': [{'Key': k} for k in keys[i:i + 3]]}
+
+
+class FakeS3:
+    def __init__(self, objects):
+        self.objects = objects
+
+    def get_paginator(self, name):
+        assert name == 'list_objects_v2'
+        return FakePaginator(self.objects)
+
+    def get_object(self, Bucket, Key):
+        if Key not in self.objects:
+            raise ClientError({'Error': {'Code': 'NoSuchKey'}}, 'GetObject')
+        return {'Body': io.BytesIO(self.objects[Key])}
+
+
+class FakeSQS:
+    def __init__(self, fail_after=None):
+        self.sent = []
+        self.calls = 0
+        self.fail_after = fail_after
+
+    def send_message_batch(self, QueueUrl, Entries):
+        self.calls += 1
+        if self.fail_after is not None and self.calls > self.fail_after:
+            return {'Failed': [{'Id': e['Id'], 'SenderFault': True, 'Message': 'bad'} for e in Entries]}
+        assert len(Entries) <= 10
+        assert len({e['Id'] for e in Entries}) == len(Entries)
+        self.sent.extend(json.loads(e['MessageBody'])['email_timestamp'] for e in Entries)
+        return {'Successful': [{'Id': e['Id']} for e in Entries]}
+
+
+def make_archive(per_day=12):
+    objects = {}
+    for day in PARTITIONS:
+        for i in range(per_day):
+            ts = f"{day.replace('/', '')}{i:03d}"
+            data = {'email_subject': 's', 'email_sender': 'a@example.com',
+                    'email_timestamp': ts, 'email_content': 'c'}
+            objects[f"emails/{day}/email-{ts}-1.json"] = json.dumps(data, indent=2).encode('utf-8')
+    return objects
+
+
+class TestReplay:
+    """Test streaming, batching and checkpointing"""
+
+    def test_replays_all_objects_in_order(self, tmp_path):
+        """Test every archived email is published once, in key order"""
+        objects = make_archive()
+        sqs = FakeSQS()
+        checkpoint = Checkpoint(str(tmp_path / 'ckpt.json'))
+        reporter = replay(FakeS3(objects), sqs, BUCKET, QUEUE_URL, PARTITIONS, checkpoint,
+                          concurrency=4, send_concurrency=2)
+        expected = [json.loads(v)['email_timestamp'] for _, v in sorted(objects.items())]
+        assert sorted(sqs.sent) == expected
+        assert reporter.published == len(objects)
+        assert sqs.calls == 3  # batches of 10 span days
+        saved = json.loads((tmp_path / 'ckpt.json').read_text())
+        assert saved['after'] == max(objects)
+        assert saved['published'] == len(objects)
+
+    def test_resume_after_failure(self, tmp_path):
+        """Test a failed replay resumes after the last acknowledged batch"""
+        objects = make_archive()
+        path = str(tmp_path / 'ckpt.json')
+        failing = FakeSQS(fail_after=2)
+        with pytest.raises(ReplayError):
+            replay(FakeS3(objects), failing, BUCKET, QUEUE_URL, PARTITIONS, Checkpoint(path),
+                   concurrency=2, send_concurrency=1)
+        assert len(failing.sent) == 20
+
+        sqs = FakeSQS()
+        replay(FakeS3(objects), sqs, BUCKET, QUEUE_URL, PARTITIONS, Checkpoint(path), concurrency=2)
+        assert failing.sent + sorted(sqs.sent) == [json.loads(v)['email_timestamp'] for _, v in sorted(objects.items())]
+        assert Checkpoint(path).published == len(objects)
+
+    def test_missing_objects_are_skipped(self):
+        """Test objects deleted after listing are skipped"""
+
+        class VanishingS3(FakeS3):
+            def get_object(self, Bucket, Key):
+                if Key.endswith('000-1.json'):
+                    raise ClientError({'Error': {'Code': 'NoSuchKey'}}, 'GetObject')
+                return super().get_object(Bucket, Key)
+
+        sqs = FakeSQS()
+        reporter = replay(VanishingS3(make_archive(3)), sqs, BUCKET, QUEUE_URL, PARTITIONS, Checkpoint(None))
+        assert reporter.skipped == 2
+        assert len(sqs.sent) == 4
+
+
+def test_build_entry_fifo():
+    """Test FIFO targets get the api-service's group and deduplication ids"""
+    data = {'email_sender': 'A@example.com', 'email_subject': 's'}
+    raw = json.dumps(data).encode('utf-8')
+    assert 'MessageGroupId' not in build_entry(raw, QUEUE_URL)
+    entry = build_entry(raw, FIFO_QUEUE_URL)
+    assert entry['MessageGroupId'] == message_group_id('a@example.com')
+    assert entry['MessageDeduplicationId'] == deduplication_id(data)
+    assert entry['MessageAttributes']['replay']['StringValue'] == 'true'
+
+
+def test_build_entry_fifo_partitions():
+    """Test senders are hashed onto SQS_FIFO_PARTITIONS groups like the api-service"""
+    raw = json.dumps({'email_sender': 'a@example.com'}).encode('utf-8')
+    entry = build_entry(raw, FIFO_QUEUE_URL, partitions=8)
+    assert entry['MessageGroupId'] == message_group_id('a@example.com', 8)
+    assert entry['MessageGroupId'].startswith('p-')
+
+
+def test_rate_pacer():
+    """Test the pacer sleeps to hold the configured rate"""
+    now = [0.0]
+    sleeps = []
+
+    def sleep(seconds):
+        sleeps.append(seconds)
+        now[0] += seconds
+
+    pacer = RatePacer(100, clock=lambda: now[0], sleep=sleep)
+    for _ in range(5):
+        pacer.acquire(10)
+    assert sum(sleeps) == pytest.approx(0.4)
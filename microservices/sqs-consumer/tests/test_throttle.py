@@ -0,0 +1,136 @@
+"""
+Unit tests for adaptive S3 concurrency control
+"""
+
+import pytest
+from unittest.mock import patch
+from botocore.exceptions import ClientError, EndpointConnectionError
+from app.throttle import AIMDLimiter, backoff_delay
+from app.main import put_object_adaptive, upload_to_s3, is_throttle_error
+
+
+def slow_down_error():
+    return ClientError(
+        {'Error': {'Code': 'SlowDown'}, 'ResponseMetadata': {'HTTPStatusCode': 503}},
+        'PutObject'
+    )
+
+
+class TestAIMDLimiter:
+    """Test AIMD limit adjustments"""
+    
+    def test_throttle_halves_limit(self):
+        """Test multiplicative decrease on throttle"""
+        limiter = AIMDLimiter(initial=8, minimum=1, maximum=16)
+        limiter.on_throttle()
+        assert limiter.limit == 4
+        limiter.on_throttle()
+        limiter.on_throttle()
+        limiter.on_throttle()
+        assert limiter.limit == 1
+    
+    def test_throttle_burst_decreases_once(self):
+        """Test concurrent throttles from one window halve the limit once"""
+        limiter = AIMDLimiter(initial=10, minimum=1, maximum=16)
+        epochs = [limiter.acquire() for _ in range(10)]
+        decreased = [limiter.on_throttle(epoch) for epoch in epochs]
+        assert decreased.count(True) == 1
+        assert limiter.limit == 5
+        for _ in range(10):
+            limiter.release()
+        # A request sent after the decrease can shrink it again
+        with limiter.slot() as epoch:
+            assert limiter.on_throttle(epoch) is True
+        assert limiter.limit == 2
+    
+    def test_success_increases_additively(self):
+        """Test limit grows by about one per window of successes"""
+        limiter = AIMDLimiter(initial=4, minimum=1, maximum=16)
+        for _ in range(4):
+            limiter.on_success()
+        assert limiter.limit == 4 or limiter.limit == 5
+        for _ in range(100):
+            limiter.on_success()
+        assert 5 < limiter.limit <= 16
+    
+    def test_limit_capped_at_maximum(self):
+        """Test limit never exceeds maximum"""
+        limiter = AIMDLimiter(initial=2, minimum=1, maximum=3)
+        for _ in range(1000):
+            limiter.on_success()
+        assert limiter.limit == 3
+    
+    def test_slot_tracks_in_flight(self):
+        """Test slot context manager acquires and releases"""
+        limiter = AIMDLimiter(initial=2)
+        with limiter.slot():
+            assert limiter.in_flight == 1
+        assert limiter.in_flight == 0
+    
+    def test_invalid_bounds(self):
+        """Test invalid configuration is rejected"""
+        with pytest.raises(ValueError):
+            AIMDLimiter(initial=1, minimum=0)
+    
+    def test_backoff_delay_bounded(self):
+        """Test jittered backoff stays within the cap"""
+        for attempt in range(10):
+            assert 0 <= backoff_delay(attempt, 0.1, 1.0) <= 1.0
+
+
+class TestPutObjectAdaptive:
+    """Test throttle-aware S3 writes"""
+    
+    def test_is_throttle_error(self):
+        """Test throttle classification"""
+        assert is_throttle_error(slow_down_error()) is True
+        assert is_throttle_error(ClientError({'Error': {'Code': 'AccessDenied'}}, 'PutObject')) is False
+    
+    @patch('app.main.s3_limiter', AIMDLimiter(initial=8, maximum=8))
+    @patch('app.main.time.sleep')
+    @patch('app.main.s3_client')
+    def test_retries_after_throttle(self, mock_s3, mock_sleep):
+        """Test throttled PUT is retried and shrinks the limit"""
+        import app.main
+        mock_s3.put_object.side_effect = [slow_down_error(), {}]
+        
+        put_object_adaptive(Bucket='b', Key='k', Body=b'{}')
+        assert mock_s3.put_object.call_count == 2
+        assert app.main.s3_limiter.limit == 4
+        mock_sleep.assert_called_once()
+    
+    @patch('app.main.s3_limiter', AIMDLimiter(initial=8, maximum=8))
+    @patch('app.main.time.sleep')
+    @patch('app.main.s3_client')
+    def test_gives_up_after_max_attempts(self, mock_s3, mock_sleep):
+        """Test persistent throttling fails the upload"""
+        import app.main
+        mock_s3.put_object.side_effect = slow_down_error()
+        
+        assert upload_to_s3({'a': 1}, 'emails/test/key.json') is False
+        assert mock_s3.put_object.call_count == app.main.S3_MAX_ATTEMPTS
+    
+    @patch('app.main.s3_limiter', AIMDLimiter(initial=8, maximum=8))
+    @patch('app.main.time.sleep')
+    @patch('app.main.s3_client')
+    def test_transient_errors_retried_without_throttling(self, mock_s3, mock_sleep):
+        """Test 5xx and connection errors are retried and leave the limit alone"""
+        import app.main
+        mock_s3.put_object.side_effect = [
+            ClientError({'Error': {'Code': 'InternalError'}, 'ResponseMetadata': {'HTTPStatusCode': 500}}, 'PutObject'),
+            EndpointConnectionError(endpoint_url='https://s3.amazonaws.com'),
+            {}
+        ]
+        
+        put_object_adaptive(Bucket='b', Key='k', Body=b'{}')
+        assert mock_s3.put_object.call_count == 3
+        assert app.main.s3_limiter.limit == 8
+        assert mock_sleep.call_count == 2
+    
+    @patch('app.main.s3_client')
+    def test_non_throttle_error_not_retried(self, mock_s3):
+        """Test other client errors fail immediately"""
+        mock_s3.put_object.side_effect = ClientError({'Error': {'Code': 'AccessDenied'}}, 'PutObject')
+        with pytest.raises(ClientError):
+            put_object_adaptive(Bucket='b', Key='k', Body=b'{}')
+        assert mock_s3.put_object.call_count == 1
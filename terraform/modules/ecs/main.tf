@@ -161,6 +161,26 @@ resource "aws_iam_role_policy" "sqs_consumer_access" {
           "s3:PutObjectAcl"
         ]
         Resource = "${var.s3_bucket_arn}/*"
+      },
+      {
+        # Manifest index: read HEAD/deltas back and delete compacted objects
+        Effect = "Allow"
+        Action = [
+          "s3:GetObject",
+          "s3:DeleteObject"
+        ]
+        Resource = "${var.s3_bucket_arn}/manifests/*"
+      },
+      {
+        # Lets a missing manifest HEAD return 404 instead of 403
+        Effect   = "Allow"
+        Action   = "s3:ListBucket"
+        Resource = var.s3_bucket_arn
+        Condition = {
+          StringLike = {
+            "s3:prefix" = ["manifests/*"]
+          }
+        }
       }
     ]
   })